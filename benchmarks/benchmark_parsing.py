@@ -0,0 +1,77 @@
+# Compares the streaming and BeautifulSoup AWWS page parsers.
+# Run from the main level with: python -m benchmarks.benchmark_parsing
+import timeit
+
+import src.data.scraping as scraping
+
+
+FIXTURE_SOURCE_PATHS = {
+    "vancouver": "test/known_awws_metar_van_source.html",
+    "abbotsford": "test/known_awws_metar_abbotsford_source.html",
+}
+
+
+def build_synthetic_pagesource(station_sections: int) -> str:
+    """
+    Builds a multi-station page by repeating the station sections
+    of the saved fixtures, like a batched request for many stations.
+
+    Parameters
+    ----------
+    station_sections : int
+        Number of station sections to include in the page.
+
+    Returns
+    -------
+    str
+        HTML page source with the requested number of station sections.
+    """
+    sources = []
+    for path in FIXTURE_SOURCE_PATHS.values():
+        with open(path) as f:
+            sources.append(f.read())
+    sections = [
+        source[source.index("<h2") : source.index("</body>")] for source in sources
+    ]
+    header, footer = sources[0][: sources[0].index("<h2")], "</body></html>"
+    repeated_sections = (sections * station_sections)[:station_sections]
+    return header + "".join(repeated_sections) + footer
+
+
+def benchmark_parsers(source: str, repeats: int = 5) -> dict:
+    """
+    Times each parser on the page source, returning the best
+    seconds per parse for each.
+    """
+    timings = {}
+    for parser in ("soup", "streaming"):
+        number = max(1, 200 // source.count("<h2"))
+        best = min(
+            timeit.repeat(
+                lambda: scraping.parse_awws_pagesource(source, parser=parser),
+                number=number,
+                repeat=repeats,
+            )
+        )
+        timings[parser] = best / number
+    return timings
+
+
+if __name__ == "__main__":
+    pages = {
+        f"fixture:{name}": open(path).read()
+        for name, path in FIXTURE_SOURCE_PATHS.items()
+    }
+    for station_sections in (10, 100):
+        pages[f"synthetic:{station_sections}-stations"] = build_synthetic_pagesource(
+            station_sections
+        )
+
+    print(f"{'page':<28}{'soup ms':>10}{'streaming ms':>14}{'speedup':>10}")
+    for name, source in pages.items():
+        timings = benchmark_parsers(source)
+        print(
+            f"{name:<28}{timings['soup'] * 1000:>10.2f}"
+            f"{timings['streaming'] * 1000:>14.2f}"
+            f"{timings['soup'] / timings['streaming']:>9.1f}x"
+        )
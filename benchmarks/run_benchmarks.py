@@ -0,0 +1,226 @@
+# Benchmarks the scrape, parse and write hot paths against a stored baseline.
+# Run from the main level with: python -m benchmarks.run_benchmarks
+# Save a baseline first with --save-baseline, on the machine that compares.
+# Timings only compare on the same machine, so no baseline is committed:
+# pull requests save one from their base commit and compare against it on
+# the same runner (see .github/workflows/lint-test.yml), failing on regressions.
+import argparse
+import json
+import os
+import statistics
+import sys
+import timeit
+from typing import Callable, Optional
+
+import botocore
+
+import src.data.scraping as scraping
+import src.data.database as database
+from src import config
+from benchmarks.benchmark_parsing import (
+    FIXTURE_SOURCE_PATHS,
+    build_synthetic_pagesource,
+)
+
+
+BASELINE_PATH = "benchmarks/baseline.json"
+# Fail when a benchmark is this much slower than its baseline.
+REGRESSION_THRESHOLD = 0.25
+WRITE_DOCUMENT_COUNT = 200
+
+
+def time_per_call(
+    function: Callable, repeats: int = 5, min_seconds: float = 0.2
+) -> float:
+    """
+    Times the function, returning the median seconds per call
+    over the repeats, each running for at least min_seconds.
+    """
+    number, elapsed = 1, 0.0
+    while elapsed < min_seconds:
+        elapsed = timeit.timeit(function, number=number)
+        if elapsed < min_seconds:
+            number *= 2
+    timings = timeit.repeat(function, number=number, repeat=repeats)
+    return statistics.median(timings) / number
+
+
+def parsing_benchmarks() -> dict:
+    """Benchmarks parse_awws_pagesource() on fixture and synthetic pages."""
+    pages = {}
+    for name, path in FIXTURE_SOURCE_PATHS.items():
+        with open(path) as f:
+            pages[f"parse:fixture-{name}"] = f.read()
+    for station_sections in (10, 100):
+        pages[
+            f"parse:synthetic-{station_sections}-stations"
+        ] = build_synthetic_pagesource(station_sections)
+    return {
+        name: lambda source=source: scraping.parse_awws_pagesource(source)
+        for name, source in pages.items()
+    }
+
+
+def datetime_benchmarks() -> dict:
+    """
+    Benchmarks format_utc_datetime() on repeated (memoized) and
+    distinct strings, and format_utc_datetimes() on a batch.
+    """
+    distinct_strings = [
+        f"{day} OCTOBER 2022 - {hour:02d}{minute:02d} UTC"
+        for day in range(1, 29)
+        for hour in range(24)
+        for minute in (0, 30)
+    ]
+
+    def format_distinct():
+        scraping._convert_utc_datetime.cache_clear()
+        for utc_string in distinct_strings[:100]:
+            scraping.format_utc_datetime(utc_string, "America/Vancouver")
+
+    return {
+        "format_utc_datetime:repeated": lambda: scraping.format_utc_datetime(
+            "28 OCTOBER 2022 - 0300 UTC", "America/Vancouver"
+        ),
+        "format_utc_datetime:distinct-100": format_distinct,
+        "format_utc_datetimes:batch-1344": lambda: scraping.format_utc_datetimes(
+            distinct_strings, "America/Vancouver"
+        ),
+    }
+
+
+def write_benchmarks() -> dict:
+    """
+    Benchmarks the AWWS document writers against DynamoDB Local
+    (the test environment in config/data.yml), if it is running.
+    """
+    endpoint_url = config.load_config("config/data.yml")["dynamodb"]["test"][
+        "endpoint-url"
+    ]
+    # Connections share the environment's client, so this one stays
+    # usable by the returned benchmarks after the with block.
+    with database.dynamodb_connection("test") as db:
+        try:
+            db.meta.client.list_tables()
+        except botocore.exceptions.EndpointConnectionError:
+            print(f"DynamoDB Local unavailable at {endpoint_url}, skipping writes.")
+            return {}
+    # Provisioned with its time index, so writes pay for maintaining it.
+    database.provision_awws_table(db)
+    data_documents = _synthetic_data_documents(WRITE_DOCUMENT_COUNT)
+    return {
+        f"write:put-item-{WRITE_DOCUMENT_COUNT}": lambda: (
+            database.write_data_documents_to_awws_database(db, data_documents)
+        ),
+        f"write:batch-{WRITE_DOCUMENT_COUNT}": lambda: (
+            database.batch_write_data_documents_to_awws_database(db, data_documents)
+        ),
+    }
+
+
+def compare_to_baseline(
+    results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD
+) -> list:
+    """
+    Compares benchmark results (seconds per call) to the baseline.
+
+    Returns
+    -------
+    list
+        Names of the benchmarks slower than their baseline by more than
+        the threshold (eg 0.25 for 25%). Benchmarks without a baseline
+        are never regressions.
+    """
+    return [
+        name
+        for name, seconds in results.items()
+        if name in baseline and seconds > baseline[name] * (1 + threshold)
+    ]
+
+
+def run_benchmarks(groups: Optional[list] = None, repeats: int = 5) -> dict:
+    """
+    Runs the benchmark groups (by default all of BENCHMARK_GROUPS),
+    returning the seconds per call of each benchmark.
+    """
+    benchmarks = {}
+    for group in groups or BENCHMARK_GROUPS:
+        benchmarks.update(BENCHMARK_GROUPS[group]())
+    return {
+        name: time_per_call(benchmark, repeats=repeats)
+        for name, benchmark in benchmarks.items()
+    }
+
+
+BENCHMARK_GROUPS = {
+    "parse": parsing_benchmarks,
+    "datetime": datetime_benchmarks,
+    "write": write_benchmarks,
+}
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the AWWS hot paths.")
+    parser.add_argument(
+        "--group",
+        action="append",
+        choices=list(BENCHMARK_GROUPS),
+        help="Benchmark group to run, repeatable (default: all).",
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store these results as the baseline instead of comparing.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        help="Allowed slowdown before failing, eg 0.25 for 25%%.",
+    )
+    return parser.parse_args()
+
+
+def _synthetic_data_documents(document_count: int) -> dict:
+    with open(FIXTURE_SOURCE_PATHS["vancouver"]) as f:
+        page_data = scraping.parse_awws_pagesource(f.read())
+    template_documents = [
+        document for document in page_data.values() if document.get("datetime")
+    ]
+    data_documents = {}
+    for document_number in range(document_count):
+        document = dict(template_documents[document_number % len(template_documents)])
+        document["location"] = f"{document['location']} #{document_number}"
+        data_documents[document_number] = document
+    return data_documents
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    results = run_benchmarks(arguments.group, arguments.repeats)
+
+    baseline = {}
+    if os.path.exists(arguments.baseline):
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)
+    print(f"{'benchmark':<42}{'us/call':>12}{'baseline':>12}{'change':>9}")
+    for name, seconds in results.items():
+        baseline_text, change_text = "-", "-"
+        if name in baseline:
+            baseline_text = f"{baseline[name] * 1e6:.1f}"
+            change_text = f"{seconds / baseline[name] - 1:+.0%}"
+        print(f"{name:<42}{seconds * 1e6:>12.1f}{baseline_text:>12}{change_text:>9}")
+
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w") as f:
+            json.dump(dict(baseline, **results), f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {arguments.baseline}.")
+    elif not baseline:
+        print(f"No baseline at {arguments.baseline}, run with --save-baseline.")
+    else:
+        regressions = compare_to_baseline(results, baseline, arguments.threshold)
+        if regressions:
+            print(f"Regressed beyond {arguments.threshold:.0%}: {regressions}")
+            sys.exit(1)
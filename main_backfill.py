@@ -0,0 +1,48 @@
+# Re-parses archived AWWS page sources with backfill.py at top level.
+import argparse
+import logging
+
+from src.orchestration import backfill
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Re-parse archived AWWS page sources into data documents."
+    )
+    parser.add_argument(
+        "archive", help="Directory or tarball of archived .html page sources."
+    )
+    parser.add_argument("--output", default=None, help="JSONL file to append to.")
+    parser.add_argument(
+        "--write-to-database",
+        action="store_true",
+        help="Also write documents with the batched DynamoDB writer.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="Checkpoint file of finished pages (default: <output>.checkpoint).",
+    )
+    parser.add_argument(
+        "--processes", type=int, default=None, help="Parsing processes."
+    )
+    parser.add_argument(
+        "--pages-per-task",
+        type=int,
+        default=None,
+        help="Pages sent to a parsing process at once.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arguments = parse_arguments()
+    backfill.awws_metar_backfill(
+        arguments.archive,
+        output_path=arguments.output,
+        write_to_database=arguments.write_to_database,
+        checkpoint_path=arguments.checkpoint,
+        processes=arguments.processes,
+        pages_per_task=arguments.pages_per_task,
+    )
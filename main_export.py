@@ -0,0 +1,61 @@
+# Exports backfilled AWWS METAR documents with export.py at top level.
+import argparse
+import itertools
+import logging
+
+from src.data import database, export
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export AWWS METAR documents to a columnar file for training."
+    )
+    parser.add_argument(
+        "documents",
+        nargs="*",
+        help="JSONL files of documents, eg backfill output.",
+    )
+    parser.add_argument(
+        "--from-table",
+        action="store_true",
+        help="Export every document with a parallel segmented table scan instead.",
+    )
+    parser.add_argument(
+        "--output", required=True, help="File to write (.parquet, .arrow or .npz)."
+    )
+    parser.add_argument(
+        "--format",
+        default=None,
+        choices=sorted(set(export.EXPORT_FORMATS.values())),
+        help="Export format (default: from the output suffix).",
+    )
+    parser.add_argument(
+        "--include-tafs",
+        action="store_true",
+        help="Also export TAF forecasts (default: METAR and SPECI observations only).",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arguments = parse_arguments()
+    if arguments.from_table:
+        with database.dynamodb_connection() as db:
+            row_count = export.export_awws_documents(
+                database.scan_awws_documents(db),
+                arguments.output,
+                export_format=arguments.format,
+                observations_only=not arguments.include_tafs,
+            )
+    else:
+        documents = itertools.chain.from_iterable(
+            export.iter_jsonl_documents(path) for path in arguments.documents
+        )
+        row_count = export.export_awws_documents(
+            documents,
+            arguments.output,
+            export_format=arguments.format,
+            observations_only=not arguments.include_tafs,
+        )
+    logging.info(f"Exported {row_count} documents to {arguments.output}.")
@@ -1,8 +1,84 @@
 # Executes ingestion pipeline from ingestion.py at top level.
+import argparse
 import logging
 
 from src.orchestration import ingestion
+from src.orchestration import async_ingestion
+from src.orchestration.scheduler import IngestionScheduler
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Ingest AWWS METAR-TAF reports into DynamoDB."
+    )
+    parser.add_argument(
+        "--stations",
+        nargs="+",
+        default=None,
+        help="Locations from config/scraping.yml to ingest (default: all).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Stations submitted per page request.",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Run the asyncio pipeline with bounded stage queues.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running, polling stations on the schedules in "
+        "config/ingestion.yml until SIGTERM.",
+    )
+    parser.add_argument(
+        "--fetch-concurrency",
+        type=int,
+        default=None,
+        help="Concurrent page fetches (scrape workers for the default pipeline).",
+    )
+    parser.add_argument(
+        "--parse-concurrency",
+        type=int,
+        default=None,
+        help="Parsing processes (--async only).",
+    )
+    parser.add_argument(
+        "--write-concurrency",
+        type=int,
+        default=None,
+        help="Concurrent DynamoDB writers (--async only).",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=None,
+        help="Items allowed to wait between stages (--async only).",
+    )
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    ingestion.awws_metar_ingestion_pipeline()
+    arguments = parse_arguments()
+    if arguments.daemon:
+        IngestionScheduler().run()
+    elif arguments.use_async:
+        async_ingestion.run_awws_metar_async_ingestion_pipeline(
+            locations=arguments.stations,
+            batch_size=arguments.batch_size,
+            fetch_concurrency=arguments.fetch_concurrency,
+            parse_concurrency=arguments.parse_concurrency,
+            write_concurrency=arguments.write_concurrency,
+            queue_size=arguments.queue_size,
+        )
+    else:
+        ingestion.awws_metar_ingestion_pipeline(
+            locations=arguments.stations,
+            max_workers=arguments.fetch_concurrency,
+            batch_size=arguments.batch_size,
+        )
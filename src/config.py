@@ -1,5 +1,20 @@
+import os
+import threading
+from typing import Callable
+
 import yaml
 
+# The C (libyaml) loader parses several times faster when PyYAML was
+# built against libyaml, so prefer it for the cached loads.
+try:
+    from yaml import CSafeLoader as CachedConfigLoader
+except ImportError:
+    from yaml import SafeLoader as CachedConfigLoader
+
+
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+
 
 def read_yaml_from(filepath: str) -> dict:
     """
@@ -19,3 +34,106 @@ def read_yaml_from(filepath: str) -> dict:
     with open(filepath, "r") as f:
         yaml_text = f.read()
     return yaml.full_load(yaml_text)
+
+
+def load_config(filepath: str) -> dict:
+    """
+    Returns the parsed yaml file at the filepath from a process-wide
+    cache, only re-reading the file when its modification time or
+    size has changed.
+
+    The returned dictionary is shared between callers, so treat it
+    as read-only. Use read_yaml_from() for a private, mutable copy.
+
+    Parameters
+    ----------
+    filepath : str
+        Path (from main level) to the yaml file.
+
+    Returns
+    -------
+    dict
+        Dictionary of YAML contents.
+    """
+    return _cached_config_entry(filepath)["document"]
+
+
+def config_view(filepath: str, view: Callable, *view_args):
+    """
+    Returns a derived, precomputed view of the yaml file at the filepath,
+    cached alongside the parsed file and rebuilt when the file changes.
+
+    Parameters
+    ----------
+    filepath : str
+        Path (from main level) to the yaml file.
+    view : Callable
+        Function taking the parsed document (and view_args)
+        and returning the derived value.
+    *view_args
+        Extra hashable arguments passed to the view function.
+
+    Returns
+    -------
+    Any
+        The value returned by view for the current file contents.
+    """
+    entry = _cached_config_entry(filepath)
+    view_key = (view, view_args)
+    views = entry["views"]
+    if view_key not in views:
+        views[view_key] = view(entry["document"], *view_args)
+    return views[view_key]
+
+
+def clear_config_cache() -> None:
+    """Drops every cached config file and view."""
+    with _config_cache_lock:
+        _config_cache.clear()
+
+
+def known_fields(awws_report: str = "metar-taf") -> frozenset:
+    """
+    Returns the lowercase known field labels for the AWWS report
+    in config/scraping.yml, as a set for fast membership checks.
+    """
+    return config_view("config/scraping.yml", _known_fields_view, awws_report)
+
+
+def station_codes(awws_report: str = "metar-taf") -> dict:
+    """
+    Returns the station code for each plain-language location
+    of the AWWS report in config/scraping.yml, eg {"vancouver": "CYVR"}.
+    """
+    return config_view("config/scraping.yml", _station_codes_view, awws_report)
+
+
+def _known_fields_view(document: dict, awws_report: str) -> frozenset:
+    return frozenset(document["awws"][awws_report]["known-fields"])
+
+
+def _station_codes_view(document: dict, awws_report: str) -> dict:
+    return {
+        location: location_config["code"]
+        for location, location_config in document["awws"][awws_report][
+            "locations"
+        ].items()
+    }
+
+
+def _cached_config_entry(filepath: str) -> dict:
+    """
+    Returns the cache entry for the filepath, (re)loading the file
+    when it is missing from the cache or has changed on disk.
+    """
+    path = os.path.abspath(filepath)
+    file_stat = os.stat(path)
+    file_stamp = (file_stat.st_mtime_ns, file_stat.st_size)
+    with _config_cache_lock:
+        entry = _config_cache.get(path)
+        if entry is None or entry["stamp"] != file_stamp:
+            with open(path, "r") as f:
+                document = yaml.load(f, Loader=CachedConfigLoader)
+            entry = {"stamp": file_stamp, "document": document, "views": {}}
+            _config_cache[path] = entry
+    return entry
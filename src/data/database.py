@@ -1,37 +1,147 @@
+from __future__ import annotations
+
 import contextlib
+import datetime
+import decimal
+import hashlib
+import json
 import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Iterator, Literal, Optional, Union
+
+from src import config, instrumentation
+from src.data import item_codec
+
+# boto3 is imported where a connection is made or a request built,
+# so parse-only jobs importing this module don't load it.
+if TYPE_CHECKING:
+    import boto3
+
+
+# Callables run with (report_type, data_documents) after documents
+# are written, eg to invalidate cached reads. See add_write_listener().
+_write_listeners = []
+
+# The shared (resource mode) client and resource class of each
+# environment, see dynamodb_client().
+_dynamodb_clients = {}
+_dynamodb_clients_lock = threading.Lock()
+
+
+def _forget_clients_in_child() -> None:
+    # Forked processes (eg parsing pools) must not share the parent's
+    # sockets, and may have copied its lock while held.
+    global _dynamodb_clients_lock
+    _dynamodb_clients.clear()
+    _dynamodb_clients_lock = threading.Lock()
 
-import boto3
 
-from src import config
+os.register_at_fork(after_in_child=_forget_clients_in_child)
+
+
+def dynamodb_client(environment: Optional[str] = None):
+    """
+    Returns the long-lived DynamoDB client of an environment in
+    config/data.yml, creating it on first use.
+
+    The client resolves credentials once and keeps a pool of keep-alive
+    connections (with the pool size, timeouts and retry mode from
+    config/data.yml), so every connection, writer and reader thread
+    reuses its sockets. boto3 clients are thread safe.
+
+    It is always the client of the environment's resource connections,
+    with boto3's DynamoDB resource handlers registered: requests and
+    responses hold Python values (eg "CYVR", Decimal("1")), never
+    AttributeValue dicts (eg {"S": "CYVR"}).
+
+    Parameters
+    ----------
+    environment : str, optional
+        "production" or "test" (DynamoDB Local), by default
+        the connection environment in config/data.yml.
+
+    Returns
+    -------
+    botocore.client.DynamoDB
+        The environment's shared DynamoDB client, in resource mode.
+    """
+    return _shared_dynamodb_client(environment)[0]
 
 
-# Using the boto3 client interface instead of the
-# boto3 resource interface allows us to access
-# the local DynamoDB database by URL for testing.
 @contextlib.contextmanager
-def dynamodb_connection(**boto_client_kwargs):
+def dynamodb_connection(environment: Optional[str] = None, **boto_client_kwargs):
     """
-    Creates a resource connection to AWS DynamoDB with
-    the passed in keyword arguments.
+    Creates a resource connection to AWS DynamoDB at the endpoint
+    of an environment in config/data.yml, sharing the environment's
+    long-lived client from dynamodb_client().
 
-    Notably, use endpoint_url = http://localhost:8000
-    to connect to local DynamoDB instance.
+    Resources are not thread safe, so each thread should enter its own
+    connection. They are cheap to create, as they share the client.
 
     Parameters
     ------
+    environment : str, optional
+        "production" or "test" (DynamoDB Local, eg http://localhost:8000),
+        by default the connection environment in config/data.yml.
     boto_client_kwargs: dictionary
-        Keyword arguments for Boto3's resource connection.
+        Keyword arguments for Boto3's resource connection. If passed,
+        a separate resource with its own client is created instead,
+        eg with endpoint_url for an unconfigured endpoint.
 
     Yields
     ------
     botocore.ServiceResource
         A boto3 resource connection to a DynamoDB instance.
     """
-    db_client = boto3.resource("dynamodb", **boto_client_kwargs)
-    yield db_client
+    if boto_client_kwargs:
+        import boto3
+
+        yield boto3.resource("dynamodb", **boto_client_kwargs)
+        return
+    client, resource_class = _shared_dynamodb_client(environment)
+    yield resource_class(client=client)
+
+
+def _shared_dynamodb_client(environment: Optional[str]) -> tuple:
+    dynamodb_config = config.load_config("config/data.yml")["dynamodb"]
+    connection_config = dynamodb_config["connection"]
+    environment = environment or connection_config["environment"]
+    with _dynamodb_clients_lock:
+        if environment not in _dynamodb_clients:
+            import boto3
+            from botocore.config import Config
 
+            environment_config = dynamodb_config[environment]
+            client_config = Config(
+                max_pool_connections=connection_config["max-pool-connections"],
+                connect_timeout=connection_config["connect-timeout"],
+                read_timeout=connection_config["read-timeout"],
+                tcp_keepalive=connection_config["tcp-keepalive"],
+                retries={
+                    "mode": connection_config["retry-mode"],
+                    "max_attempts": connection_config["max-attempts"],
+                },
+            )
+            session = boto3.session.Session(region_name=environment_config["region"])
+            connection_kwargs = {
+                "endpoint_url": environment_config["endpoint-url"],
+                "config": client_config,
+            }
+            # Creating the resource registers its (de)serialization
+            # handlers on its client, so the shared client is the same
+            # before and after any connection is made. Connections are
+            # more resources built around it, see dynamodb_connection().
+            resource = session.resource("dynamodb", **connection_kwargs)
+            _dynamodb_clients[environment] = (resource.meta.client, type(resource))
+            logging.debug(f"Created shared {environment} DynamoDB client.")
+        return _dynamodb_clients[environment]
 
+
+@instrumentation.timed("write")
 def write_data_documents_to_awws_database(
     db: boto3.resources.factory, data_documents: dict
 ) -> None:
@@ -54,7 +164,7 @@ def write_data_documents_to_awws_database(
         return
 
     # Get Config.
-    data_config = config.read_yaml_from("config/data.yml")
+    data_config = config.load_config("config/data.yml")
     report_type = data_documents[0]["report"]
     table_config = data_config["dynamodb"]["awws"][report_type]
     table_name = table_config["table-name"]
@@ -65,25 +175,774 @@ def write_data_documents_to_awws_database(
     # If not, log warnings.
     table = db.Table(table_name)
     document_skip_count = 0
+    written_documents = {}
     for data_document in data_documents.values():
-        if data_document.get(partition_key, None) and data_document.get(sort_key, None):
-            table.put_item(Item=data_document)
+        if _has_document_keys(data_document, partition_key, sort_key):
+            table.put_item(Item=_storage_item(data_document, data_config))
+            written_documents[len(written_documents)] = data_document
         else:
             document_skip_count += 1
-            if data_document.get(partition_key, None):
-                logging.warning(
-                    "AWS Report skipped because Sort Key (Date) is missing from data."
-                )
-            elif data_document.get(sort_key, None):
-                logging.warning(
-                    "AWS Report skipped because Partition Key (Location) is missing from data."
-                )
-            else:
-                logging.warning(
-                    "AWS report skipped because both Sort Key (Date) "
-                    "and Partition Key (Location) are missing from data."
-                )
+    _notify_write_listeners(report_type, written_documents)
+    instrumentation.count("documents-written", len(written_documents))
     if document_skip_count:
         logging.warning(
             f"{document_skip_count} / {len(data_documents.values())} documents skipped."
         )
+
+
+@instrumentation.timed("write")
+def batch_write_data_documents_to_awws_database(
+    db: boto3.resources.factory, data_documents: dict
+) -> dict:
+    """
+    Takes the input data dictionary and writes it to the database
+    at the respective report_type in BatchWriteItem requests,
+    retrying unprocessed (throttled) items with exponential backoff.
+
+    Parameters
+    ----------
+    db: boto3.resources.factory
+        A boto3 resource connection connecting to a DynamoDB
+        database, ideally created with dynamodb_connection().
+    data_documents : dict
+        Dictionary of data values, ideally the
+        collection of documents from the
+        parse_awws_pagesource() function.
+
+    Returns
+    -------
+    dict
+        Counts of documents "written", "skipped" (missing or duplicate keys),
+        "throttled" (returned unprocessed at least once) and
+        "unprocessed" (still unwritten after the last retry).
+    """
+    write_counts = {"written": 0, "skipped": 0, "throttled": 0, "unprocessed": 0}
+    # Handle empty case.
+    if not data_documents:
+        return write_counts
+
+    # Get Config.
+    data_config = config.load_config("config/data.yml")
+    report_type = data_documents[0]["report"]
+    table_config = data_config["dynamodb"]["awws"][report_type]
+    batch_config = data_config["dynamodb"]["batch-write"]
+    table_name = table_config["table-name"]
+    partition_key = table_config["partition-key"]
+    sort_key = table_config["sort-key"]
+
+    # DynamoDB rejects a batch holding the same key twice, so keep
+    # only the last document for each key, as sequential puts would.
+    keyed_documents = {}
+    for data_document in data_documents.values():
+        if _has_document_keys(data_document, partition_key, sort_key):
+            document_key = (data_document[partition_key], data_document[sort_key])
+            if document_key in keyed_documents:
+                write_counts["skipped"] += 1
+                logging.debug(f"Duplicate document key skipped: {document_key}.")
+            keyed_documents[document_key] = data_document
+        else:
+            write_counts["skipped"] += 1
+    documents = list(keyed_documents.values())
+
+    client = db.meta.client
+    batch_size = batch_config["batch-size"]
+    throttled_keys, unprocessed_keys = set(), set()
+    for start in range(0, len(documents), batch_size):
+        stop = start + batch_size
+        request_items = {
+            table_name: [
+                {"PutRequest": {"Item": _storage_item(document, data_config)}}
+                for document in documents[start:stop]
+            ]
+        }
+        for attempt in range(batch_config["max-retries"] + 1):
+            if attempt:
+                instrumentation.count("db-retries")
+                _sleep_with_backoff(attempt, batch_config)
+            batch_size_sent = len(request_items[table_name])
+            response = client.batch_write_item(RequestItems=request_items)
+            request_items = response.get("UnprocessedItems", {})
+            unprocessed_batch_keys = {
+                (
+                    put_request["PutRequest"]["Item"][partition_key],
+                    put_request["PutRequest"]["Item"][sort_key],
+                )
+                for put_request in request_items.get(table_name, [])
+            }
+            write_counts["written"] += batch_size_sent - len(unprocessed_batch_keys)
+            if not unprocessed_batch_keys:
+                break
+            throttled_keys |= unprocessed_batch_keys
+            logging.debug(
+                f"{len(unprocessed_batch_keys)} documents unprocessed, retrying."
+            )
+        else:
+            unprocessed_keys |= unprocessed_batch_keys
+            logging.warning(
+                f"{len(unprocessed_batch_keys)} documents still unprocessed after "
+                f"{batch_config['max-retries']} retries."
+            )
+    write_counts["throttled"] = len(throttled_keys)
+    write_counts["unprocessed"] = len(unprocessed_keys)
+
+    instrumentation.count("documents-written", write_counts["written"])
+    written_documents = [
+        document
+        for document_key, document in keyed_documents.items()
+        if document_key not in unprocessed_keys
+    ]
+    _notify_write_listeners(report_type, dict(enumerate(written_documents)))
+    if write_counts["skipped"]:
+        logging.warning(
+            f"{write_counts['skipped']} / {len(data_documents.values())} documents skipped."
+        )
+    return write_counts
+
+
+@instrumentation.timed("write")
+def conditionally_write_data_documents_to_awws_database(
+    db: boto3.resources.factory, data_documents: dict
+) -> dict:
+    """
+    Takes the input data dictionary and idempotently writes it to the
+    database at the respective report_type.
+
+    Each document is stored with a content hash and a revision (its page
+    request time), and only written if the item is new, or if its content
+    changed and the document is a newer revision than the stored item.
+    Retried jobs and overlapping pollers therefore never rewrite unchanged
+    items, and a stale page can never replace a newer amendment.
+
+    Parameters
+    ----------
+    db: boto3.resources.factory
+        A boto3 resource connection connecting to a DynamoDB
+        database, ideally created with dynamodb_connection().
+    data_documents : dict
+        Dictionary of data values, ideally the
+        collection of documents from the
+        parse_awws_pagesource() function.
+
+    Returns
+    -------
+    dict
+        Counts of documents "written", "skipped" (missing keys
+        or an unreadable report timestamp) and
+        "conditional-check-failed" (unchanged or older than stored).
+    """
+    from botocore.exceptions import ClientError
+
+    write_counts = {"written": 0, "skipped": 0, "conditional-check-failed": 0}
+    # Handle empty case.
+    if not data_documents:
+        return write_counts
+
+    # Get Config.
+    data_config = config.load_config("config/data.yml")
+    report_type = data_documents[0]["report"]
+    table_config = data_config["dynamodb"]["awws"][report_type]
+    table_name = table_config["table-name"]
+    partition_key = table_config["partition-key"]
+    sort_key = table_config["sort-key"]
+
+    table = db.Table(table_name)
+    written_documents = {}
+    for data_document in data_documents.values():
+        if not _has_document_keys(data_document, partition_key, sort_key):
+            write_counts["skipped"] += 1
+            continue
+        try:
+            revision = document_revision(data_document)
+        except (KeyError, ValueError):
+            logging.warning(
+                "Skipped document with unreadable report_timestamp "
+                f"{data_document.get('report_timestamp')!r}."
+            )
+            write_counts["skipped"] += 1
+            continue
+        item = _storage_item(data_document, data_config)
+        item["content_hash"] = document_content_hash(data_document)
+        item["revision"] = revision
+        try:
+            table.put_item(
+                Item=item,
+                # Items written by the other writers have no revision,
+                # so any revision replaces them.
+                ConditionExpression=(
+                    "attribute_not_exists(#partition_key) OR "
+                    "attribute_not_exists(revision) OR "
+                    "(content_hash <> :content_hash AND revision < :revision)"
+                ),
+                ExpressionAttributeNames={"#partition_key": partition_key},
+                ExpressionAttributeValues={
+                    ":content_hash": item["content_hash"],
+                    ":revision": item["revision"],
+                },
+            )
+            write_counts["written"] += 1
+            written_documents[len(written_documents)] = data_document
+        except ClientError as error:
+            if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            write_counts["conditional-check-failed"] += 1
+    _notify_write_listeners(report_type, written_documents)
+    instrumentation.count("documents-written", write_counts["written"])
+
+    if write_counts["skipped"]:
+        logging.warning(
+            f"{write_counts['skipped']} / {len(data_documents.values())} documents skipped."
+        )
+    return write_counts
+
+
+def document_content_hash(data_document: dict) -> str:
+    """
+    Hashes the report content of a data document, leaving out the
+    page request timestamp and the attributes added when writing.
+    """
+    content = {
+        field: value
+        for field, value in data_document.items()
+        if field not in ("report_timestamp", "content_hash", "revision")
+    }
+    content_json = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content_json.encode("utf-8")).hexdigest()
+
+
+def document_revision(data_document: dict) -> str:
+    """
+    Returns the page request time of a data document as a sortable
+    "YYYY-MM-DDTHH:MM:SS" string, used to order revisions of a report.
+    Raises ValueError if the report_timestamp isn't in the AWWS format.
+    """
+    return datetime.datetime.strptime(
+        data_document["report_timestamp"], "%m/%d/%Y %H:%M:%S"
+    ).isoformat()
+
+
+def get_awws_document_writer(
+    write_mode: Optional[Literal["batch", "conditional"]] = None,
+) -> Callable:
+    """
+    Returns the AWWS document writer function for the write mode.
+
+    Parameters
+    ----------
+    write_mode : Literal["batch", "conditional"], optional
+        "batch" for batch_write_data_documents_to_awws_database(),
+        "conditional" for conditionally_write_data_documents_to_awws_database().
+        By default the write-mode in config/data.yml.
+
+    Returns
+    -------
+    Callable
+        Writer taking (db, data_documents) and returning write counts.
+    """
+    if write_mode is None:
+        write_mode = config.load_config("config/data.yml")["dynamodb"]["write-mode"]
+    if write_mode == "batch":
+        return batch_write_data_documents_to_awws_database
+    if write_mode == "conditional":
+        return conditionally_write_data_documents_to_awws_database
+    raise ValueError(f"Unknown DynamoDB write mode: {write_mode}.")
+
+
+def query_awws_documents(
+    db: boto3.resources.factory,
+    location: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    report_type: str = "metar-taf",
+    projection: Optional[list] = None,
+    page_size: Optional[int] = None,
+    newest_first: bool = False,
+) -> Iterator[dict]:
+    """
+    Queries the documents of one location over a datetime range,
+    following LastEvaluatedKey so every page is read lazily.
+
+    Parameters
+    ----------
+    db: boto3.resources.factory
+        A boto3 resource connection connecting to a DynamoDB
+        database, ideally created with dynamodb_connection().
+    location : str
+        The partition key value, eg "CYVR - VANCOUVER INTL/BC".
+    start, end : str, optional
+        Inclusive sort key (datetime) bounds, eg "2022-10-19 20:00".
+        Either may be left out for an open-ended range.
+    report_type : str
+        The AWWS report table to read, by default "metar-taf".
+    projection : list, optional
+        Document fields to return, by default every field.
+    page_size : int, optional
+        Items read per request, by default the page-size in
+        config/data.yml (or DynamoDB's 1 MB page if that is empty).
+    newest_first : bool
+        If True, documents are read in descending sort key order.
+        By default False.
+
+    Yields
+    ------
+    dict
+        Each matching document, in sort key order.
+    """
+    data_config = config.load_config("config/data.yml")
+    table_config = data_config["dynamodb"]["awws"][report_type]
+    page_size = page_size or data_config["dynamodb"]["read"]["page-size"]
+
+    from boto3.dynamodb.conditions import Key
+
+    key_condition = Key(table_config["partition-key"]).eq(location)
+    sort_key = Key(table_config["sort-key"])
+    if start is not None and end is not None:
+        key_condition &= sort_key.between(start, end)
+    elif start is not None:
+        key_condition &= sort_key.gte(start)
+    elif end is not None:
+        key_condition &= sort_key.lte(end)
+    request_kwargs = {
+        "KeyConditionExpression": key_condition,
+        "ScanIndexForward": not newest_first,
+    }
+    request_kwargs.update(_read_request_kwargs(projection, page_size, table_config))
+
+    yield from _query_documents(
+        db, request_kwargs, report_type, projection, table_config
+    )
+
+
+def query_awws_time_slice(
+    db: boto3.resources.factory,
+    hour: Union[str, datetime.datetime],
+    report_type: str = "metar-taf",
+    projection: Optional[list] = None,
+    page_size: Optional[int] = None,
+) -> Iterator[dict]:
+    """
+    Queries the documents of every location for one hour through the
+    table's hour bucket time index, following LastEvaluatedKey so every
+    page is read lazily. See provision_awws_table() for the index.
+
+    Parameters
+    ----------
+    db: boto3.resources.factory
+        A boto3 resource connection connecting to a DynamoDB
+        database, ideally created with dynamodb_connection().
+    hour : str or datetime
+        A sort key datetime within the hour, eg "2022-10-19 21:00 PDT",
+        or a datetime (taken as UTC if naive). See hour_bucket().
+    report_type : str
+        The AWWS report table to read, by default "metar-taf".
+    projection : list, optional
+        Document fields to return, by default every field.
+    page_size : int, optional
+        Items read per request, by default the page-size in
+        config/data.yml (or DynamoDB's 1 MB page if that is empty).
+
+    Yields
+    ------
+    dict
+        Each document reported in the hour, ordered by location.
+    """
+    data_config = config.load_config("config/data.yml")
+    table_config = data_config["dynamodb"]["awws"][report_type]
+    time_index = table_config["time-index"]
+    page_size = page_size or data_config["dynamodb"]["read"]["page-size"]
+
+    from boto3.dynamodb.conditions import Key
+
+    request_kwargs = {
+        "IndexName": time_index["index-name"],
+        "KeyConditionExpression": Key(time_index["attribute"]).eq(hour_bucket(hour)),
+    }
+    request_kwargs.update(_read_request_kwargs(projection, page_size, table_config))
+    yield from _query_documents(
+        db, request_kwargs, report_type, projection, table_config
+    )
+
+
+def hour_bucket(hour: Union[str, datetime.datetime]) -> str:
+    """
+    Returns the hour bucket of the time index: the UTC hour of a
+    document's sort key datetime or of a datetime (taken as UTC if naive).
+
+    Raises
+    ------
+    ValueError
+        If the sort key datetime can't be read.
+
+    Examples
+    --------
+    >> hour_bucket("2022-10-19 21:00 PDT")
+    "2022-10-20T04"
+    """
+    if isinstance(hour, str):
+        from src.data import scraping
+
+        utc_hour = scraping.sort_key_utc_datetime(hour)
+        if utc_hour is None:
+            raise ValueError(f"Unknown time zone in sort key datetime: {hour}.")
+    elif hour.tzinfo is None:
+        utc_hour = hour
+    else:
+        utc_hour = hour.astimezone(datetime.timezone.utc)
+    return utc_hour.strftime("%Y-%m-%dT%H")
+
+
+def provision_awws_table(
+    db: boto3.resources.factory, report_type: str = "metar-taf"
+) -> dict:
+    """
+    Creates the AWWS report table from config/data.yml (billed per
+    request) with its hour bucket time index, or adds the index to an
+    existing table, then waits until both are active.
+
+    Parameters
+    ----------
+    db: boto3.resources.factory
+        A boto3 resource connection connecting to a DynamoDB
+        database, ideally created with dynamodb_connection().
+    report_type : str
+        The AWWS report table to provision, by default "metar-taf".
+
+    Returns
+    -------
+    dict
+        Whether the "table" and "time-index" were created.
+    """
+    table_config = config.load_config("config/data.yml")["dynamodb"]["awws"][
+        report_type
+    ]
+    table_name = table_config["table-name"]
+    time_index = table_config["time-index"]
+    partition_key, sort_key = table_config["partition-key"], table_config["sort-key"]
+    client = db.meta.client
+    index_definition = {
+        "IndexName": time_index["index-name"],
+        "KeySchema": [
+            {"AttributeName": time_index["attribute"], "KeyType": "HASH"},
+            {"AttributeName": partition_key, "KeyType": "RANGE"},
+        ],
+        "Projection": {"ProjectionType": "ALL"},
+    }
+    attribute_definitions = [
+        {"AttributeName": attribute, "AttributeType": "S"}
+        for attribute in (partition_key, sort_key, time_index["attribute"])
+    ]
+    created = {"table": False, "time-index": False}
+
+    if table_name not in client.list_tables()["TableNames"]:
+        client.create_table(
+            TableName=table_name,
+            KeySchema=[
+                {"AttributeName": partition_key, "KeyType": "HASH"},
+                {"AttributeName": sort_key, "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=attribute_definitions,
+            GlobalSecondaryIndexes=[index_definition],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        created["table"] = created["time-index"] = True
+        logging.info(f"Creating table {table_name} with its time index.")
+    else:
+        table_description = client.describe_table(TableName=table_name)["Table"]
+        index_names = {
+            index["IndexName"]
+            for index in table_description.get("GlobalSecondaryIndexes", [])
+        }
+        if time_index["index-name"] not in index_names:
+            billing_mode = table_description.get("BillingModeSummary", {}).get(
+                "BillingMode", "PROVISIONED"
+            )
+            if billing_mode == "PROVISIONED":
+                throughput = table_description["ProvisionedThroughput"]
+                index_definition["ProvisionedThroughput"] = {
+                    "ReadCapacityUnits": throughput["ReadCapacityUnits"],
+                    "WriteCapacityUnits": throughput["WriteCapacityUnits"],
+                }
+            client.update_table(
+                TableName=table_name,
+                AttributeDefinitions=attribute_definitions,
+                GlobalSecondaryIndexUpdates=[{"Create": index_definition}],
+            )
+            created["time-index"] = True
+            logging.info(f"Adding time index to table {table_name}.")
+
+    client.get_waiter("table_exists").wait(TableName=table_name)
+    _wait_for_index(client, table_name, time_index["index-name"])
+    return created
+
+
+def scan_awws_documents(
+    db: boto3.resources.factory,
+    report_type: str = "metar-taf",
+    segments: Optional[int] = None,
+    projection: Optional[list] = None,
+    page_size: Optional[int] = None,
+) -> Iterator[dict]:
+    """
+    Scans a whole AWWS report table as parallel segments, one thread
+    per segment, yielding documents as pages arrive.
+
+    Only a few pages per segment are held at once, so large exports
+    read with several threads without holding the table in memory.
+    Documents come in no particular order.
+
+    Parameters
+    ----------
+    db: boto3.resources.factory
+        A boto3 resource connection connecting to a DynamoDB
+        database, ideally created with dynamodb_connection().
+    report_type : str
+        The AWWS report table to read, by default "metar-taf".
+    segments : int, optional
+        Number of segments (and threads), by default
+        the scan-segments in config/data.yml.
+    projection : list, optional
+        Document fields to return, by default every field.
+    page_size : int, optional
+        Items read per request, by default the page-size in config/data.yml.
+
+    Yields
+    ------
+    dict
+        Each document in the table.
+    """
+    data_config = config.load_config("config/data.yml")
+    table_config = data_config["dynamodb"]["awws"][report_type]
+    table_name = table_config["table-name"]
+    read_config = data_config["dynamodb"]["read"]
+    segments = segments or read_config["scan-segments"]
+    page_size = page_size or read_config["page-size"]
+    request_kwargs = {"TableName": table_name, "TotalSegments": segments}
+    request_kwargs.update(_read_request_kwargs(projection, page_size, table_config))
+
+    # The low level client is thread safe, unlike resources and tables.
+    client = db.meta.client
+    pages = queue.Queue(maxsize=segments * 2)
+    stopped = threading.Event()
+    scanners = [
+        threading.Thread(
+            target=_scan_segment,
+            args=(client, dict(request_kwargs, Segment=segment), pages, stopped),
+            daemon=True,
+        )
+        for segment in range(segments)
+    ]
+    for scanner in scanners:
+        scanner.start()
+    try:
+        finished_segments = 0
+        while finished_segments < segments:
+            page = pages.get()
+            if isinstance(page, Exception):
+                raise page
+            if page is None:
+                finished_segments += 1
+                continue
+            for item in page:
+                yield _read_document(item, report_type, projection, table_config)
+    finally:
+        # Also reached when the caller stops iterating early.
+        stopped.set()
+        for scanner in scanners:
+            scanner.join()
+
+
+def add_write_listener(listener: Callable) -> None:
+    """
+    Registers a callable to run with (report_type, data_documents)
+    whenever the AWWS document writers store documents.
+    """
+    _write_listeners.append(listener)
+
+
+def remove_write_listener(listener: Callable) -> None:
+    """Unregisters a callable added with add_write_listener()."""
+    if listener in _write_listeners:
+        _write_listeners.remove(listener)
+
+
+def _notify_write_listeners(report_type: str, written_documents: dict) -> None:
+    if not written_documents:
+        return
+    for listener in list(_write_listeners):
+        try:
+            listener(report_type, written_documents)
+        except Exception:
+            logging.exception(f"Write listener {listener} failed.")
+
+
+def _scan_segment(
+    client, request_kwargs: dict, pages: queue.Queue, stopped: threading.Event
+) -> None:
+    """
+    Scans one segment onto the pages queue, then puts None. Errors are
+    put on the queue instead, to be raised by scan_awws_documents().
+    The client is a resource's, so items are read as Python values.
+    """
+
+    def put(page) -> bool:
+        # Wait for space in small steps, to notice the scan being stopped.
+        while not stopped.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        while True:
+            response = client.scan(**request_kwargs)
+            if not put(response["Items"]) or "LastEvaluatedKey" not in response:
+                break
+            request_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    except Exception as error:
+        put(error)
+        return
+    put(None)
+
+
+def _storage_item(data_document: dict, data_config: dict) -> dict:
+    """
+    Returns the DynamoDB item storing a data document, compacted with
+    item_codec.encode_awws_item() if that is the item-encoding in
+    config/data.yml (else the "plain" document), with its hour bucket
+    for the table's time index.
+    """
+    item_encoding = data_config["dynamodb"]["item-encoding"]
+    table_config = data_config["dynamodb"]["awws"][data_document["report"]]
+    if item_encoding == "compact":
+        item = item_codec.encode_awws_item(data_document, table_config)
+    elif item_encoding == "plain":
+        item = dict(data_document)
+    else:
+        raise ValueError(f"Unknown DynamoDB item encoding: {item_encoding}.")
+    if "time-index" in table_config:
+        try:
+            bucket = hour_bucket(data_document[table_config["sort-key"]])
+            item[table_config["time-index"]["attribute"]] = bucket
+        except ValueError:
+            logging.warning(
+                f"No hour bucket for {data_document[table_config['sort-key']]}."
+            )
+    return _dynamodb_item(item)
+
+
+def _dynamodb_item(value):
+    """
+    Returns a copy of a data document with its floats (eg from a decoded
+    record) as Decimals, the only number type boto3 writes to DynamoDB.
+    """
+    if isinstance(value, float):
+        return decimal.Decimal(str(value))
+    if isinstance(value, dict):
+        return {field: _dynamodb_item(item) for field, item in value.items()}
+    if isinstance(value, list):
+        return [_dynamodb_item(item) for item in value]
+    return value
+
+
+def _read_request_kwargs(
+    projection: Optional[list], page_size: Optional[int], table_config: dict
+) -> dict:
+    """
+    Builds the projection and page size arguments shared by Query and
+    Scan. Fields are aliased as document fields hold spaces and slashes.
+    """
+    request_kwargs = {}
+    if projection:
+        attribute_names = {
+            f"#field{number}": attribute
+            for number, attribute in enumerate(
+                item_codec.item_projection(projection, table_config)
+            )
+        }
+        request_kwargs["ProjectionExpression"] = ", ".join(attribute_names)
+        request_kwargs["ExpressionAttributeNames"] = attribute_names
+    if page_size:
+        request_kwargs["Limit"] = page_size
+    return request_kwargs
+
+
+def _read_document(
+    item: dict, report_type: str, projection: Optional[list], table_config: dict
+) -> dict:
+    """Restores the data document of a read item, see _storage_item()."""
+    if "time-index" in table_config:
+        item.pop(table_config["time-index"]["attribute"], None)
+    return item_codec.project_document(
+        item_codec.decode_awws_item(item, report_type), projection
+    )
+
+
+def _query_documents(
+    db, request_kwargs: dict, report_type: str, projection, table_config: dict
+) -> Iterator[dict]:
+    """Runs a Query page by page, yielding the documents of its items."""
+    table = db.Table(table_config["table-name"])
+    while True:
+        response = table.query(**request_kwargs)
+        for item in response["Items"]:
+            yield _read_document(item, report_type, projection, table_config)
+        if "LastEvaluatedKey" not in response:
+            return
+        request_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def _wait_for_index(
+    client, table_name: str, index_name: str, timeout: float = 600
+) -> None:
+    """
+    Waits for a global secondary index to finish creating (backfilling),
+    including for it to be listed at all, which can lag update_table().
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        table_description = client.describe_table(TableName=table_name)["Table"]
+        index_status = next(
+            (
+                index.get("IndexStatus", "ACTIVE")
+                for index in table_description.get("GlobalSecondaryIndexes", [])
+                if index["IndexName"] == index_name
+            ),
+            None,
+        )
+        if index_status == "ACTIVE":
+            return
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Index {index_name} not active after {timeout}s.")
+        time.sleep(5)
+
+
+def _sleep_with_backoff(attempt: int, batch_config: dict) -> None:
+    """Sleeps for an exponentially growing, fully jittered delay."""
+    backoff_ceiling = min(
+        batch_config["max-backoff"], batch_config["base-backoff"] * 2**attempt
+    )
+    time.sleep(random.uniform(0, backoff_ceiling))
+
+
+def _has_document_keys(data_document: dict, partition_key: str, sort_key: str) -> bool:
+    """
+    Checks that the document has both database keys,
+    logging a warning for the ones that are missing.
+    """
+    if data_document.get(partition_key, None) and data_document.get(sort_key, None):
+        return True
+    if data_document.get(partition_key, None):
+        logging.warning(
+            "AWS Report skipped because Sort Key (Date) is missing from data."
+        )
+    elif data_document.get(sort_key, None):
+        logging.warning(
+            "AWS Report skipped because Partition Key (Location) is missing from data."
+        )
+    else:
+        logging.warning(
+            "AWS report skipped because both Sort Key (Date) "
+            "and Partition Key (Location) are missing from data."
+        )
+    return False
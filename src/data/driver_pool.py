@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import os
+import queue
+import threading
+from typing import TYPE_CHECKING, Callable, Optional
+
+from src import config, instrumentation
+
+# selenium and webdriver_manager are imported when a driver is first
+# needed, so runs served over HTTP never load them.
+if TYPE_CHECKING:
+    from selenium import webdriver
+
+_chromedriver_paths = {}
+_chromedriver_lock = threading.Lock()
+
+
+@instrumentation.timed("driver-startup")
+def create_chrome_driver(page_load_timeout: Optional[float] = None) -> webdriver.Chrome:
+    """
+    Starts a new headless Chromium WebDriver session.
+
+    Parameters
+    ----------
+    page_load_timeout : float, optional
+        Seconds a page load may take before the driver raises a
+        TimeoutException, by default the value in config/scraping.yml.
+
+    Returns
+    -------
+    webdriver.Chrome
+        A running headless Chromium driver.
+    """
+    from selenium import webdriver
+    import selenium.webdriver.chrome.options
+    import selenium.webdriver.chrome.service
+
+    selenium_config = config.load_config("config/scraping.yml")["selenium"]
+    if page_load_timeout is None:
+        page_load_timeout = selenium_config["page-load-timeout"]
+
+    chrome_options = selenium.webdriver.chrome.options.Options()
+    chrome_options.add_argument("--headless")
+    chrome_service = selenium.webdriver.chrome.service.Service(
+        chromedriver_path(selenium_config["chromedriver-version"])
+    )
+    driver = webdriver.Chrome(
+        service=chrome_service,
+        options=chrome_options,
+    )
+    # A hung page load raises instead of blocking the lease forever,
+    # which lets the pool recycle the driver.
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+def chromedriver_path(version: str, cache_path: Optional[str] = None) -> str:
+    """
+    Returns the path of the chromedriver binary for the version.
+
+    ChromeDriverManager().install() is only run when the path isn't
+    cached on disk or the cached binary is gone, as resolving it checks
+    the network. Paths are also kept in memory for the process.
+
+    Parameters
+    ----------
+    version : str
+        The chromedriver version, eg "108.0.5359.71".
+    cache_path : str, optional
+        JSON file of resolved paths by version, by default the
+        chromedriver-path-cache in config/scraping.yml.
+    """
+    with _chromedriver_lock:
+        if version in _chromedriver_paths:
+            return _chromedriver_paths[version]
+        cache_path = (
+            cache_path
+            or config.load_config("config/scraping.yml")["selenium"][
+                "chromedriver-path-cache"
+            ]
+        )
+        cached_paths = {}
+        if os.path.exists(cache_path):
+            with open(cache_path) as f:
+                cached_paths = json.load(f)
+        path = cached_paths.get(version)
+        if not path or not os.path.exists(path):
+            from webdriver_manager.chrome import ChromeDriverManager
+            from webdriver_manager.core.utils import ChromeType
+
+            path = ChromeDriverManager(
+                version=version, chrome_type=ChromeType.CHROMIUM
+            ).install()
+            cached_paths[version] = path
+            if os.path.dirname(cache_path):
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, "w") as f:
+                json.dump(cached_paths, f, indent=2)
+            logging.info(f"Cached chromedriver {version} path {path}.")
+        _chromedriver_paths[version] = path
+        return path
+
+
+class WebDriverPool:
+    """
+    A bounded pool of warm WebDriver sessions.
+
+    Drivers are created lazily up to the pool size, leased out one
+    at a time, reset between leases and reused. Drivers that raise a
+    WebDriverException (crashes, page load timeouts) or exceed their
+    maximum number of uses are quit and replaced on the next lease.
+
+    Parameters
+    ----------
+    size : int, optional
+        Maximum number of concurrent driver sessions,
+        by default the value in config/scraping.yml.
+    max_uses : int, optional
+        Number of leases before a driver is recycled,
+        by default the value in config/scraping.yml.
+    lease_timeout : float, optional
+        Seconds to wait for a free driver before raising TimeoutError,
+        by default waits indefinitely.
+    driver_factory : Callable, optional
+        Callable returning a new driver, by default create_chrome_driver.
+
+    Examples
+    --------
+    >> with WebDriverPool(size=2) as pool:
+    >>     with pool.lease() as driver:
+    >>         driver.get(url)
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        max_uses: Optional[int] = None,
+        lease_timeout: Optional[float] = None,
+        driver_factory: Optional[Callable] = None,
+    ):
+        selenium_config = config.load_config("config/scraping.yml")["selenium"]
+        self.size = size or selenium_config["pool-size"]
+        self.max_uses = max_uses or selenium_config["max-driver-uses"]
+        self.lease_timeout = lease_timeout
+        self.driver_factory = driver_factory or create_chrome_driver
+
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle_drivers = queue.LifoQueue()
+        self._driver_uses = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextlib.contextmanager
+    def lease(self):
+        """
+        Leases a warm driver from the pool, creating one if none are idle.
+
+        Yields
+        ------
+        webdriver.Chrome
+            A driver reserved for the caller until the context exits.
+        """
+        from selenium.common.exceptions import WebDriverException
+
+        if self._closed:
+            raise RuntimeError("Cannot lease a driver from a closed WebDriverPool.")
+        if not self._slots.acquire(timeout=self.lease_timeout):
+            raise TimeoutError(
+                f"No WebDriver became available within {self.lease_timeout} seconds."
+            )
+        driver = None
+        healthy = False
+        try:
+            try:
+                driver = self._idle_drivers.get_nowait()
+            except queue.Empty:
+                driver = self.driver_factory()
+                logging.debug("Started new WebDriver session for pool.")
+            try:
+                yield driver
+                healthy = True
+            except WebDriverException:
+                logging.warning("WebDriver failed during lease, recycling driver.")
+                raise
+        finally:
+            if driver is not None:
+                self._release(driver, healthy)
+            self._slots.release()
+
+    def _release(self, driver, healthy: bool) -> None:
+        """Resets and returns a driver to the pool, or quits it."""
+        from selenium.common.exceptions import WebDriverException
+
+        with self._lock:
+            uses = self._driver_uses.get(id(driver), 0) + 1
+            self._driver_uses[id(driver)] = uses
+        if healthy and uses < self.max_uses and not self._closed:
+            try:
+                self._reset(driver)
+                self._idle_drivers.put(driver)
+                return
+            except WebDriverException:
+                logging.warning("WebDriver failed to reset, recycling driver.")
+        self._quit(driver)
+
+    @staticmethod
+    def _reset(driver) -> None:
+        """Clears session state so the next lease starts fresh."""
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    def _quit(self, driver) -> None:
+        from selenium.common.exceptions import WebDriverException
+
+        with self._lock:
+            self._driver_uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except WebDriverException:
+            logging.warning("WebDriver failed to quit cleanly.")
+
+    def close(self) -> None:
+        """Quits all idle drivers. Leased drivers are quit on release."""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle_drivers.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
@@ -0,0 +1,355 @@
+import functools
+import itertools
+import json
+import math
+import os
+import re
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from src.data.scraping import AWWS_UTC_FORMAT
+
+
+# Decoded measurement columns, in export order, with their dtype.
+NUMERIC_COLUMNS = {
+    "wind_direction_deg": np.float32,
+    "wind_speed_kt": np.float32,
+    "wind_gust_kt": np.float32,
+    "visibility_sm": np.float32,
+    "ceiling_ft": np.float32,
+    "temperature_c": np.float32,
+    "dewpoint_c": np.float32,
+    "altimeter_inhg": np.float32,
+}
+# Report kinds exported by default: observations, not forecasts (TAFs).
+OBSERVATION_REPORT_KINDS = ("METAR", "SPECI")
+EXPORT_FORMATS = {
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".npz": "npz",
+}
+
+_WIND = re.compile(
+    r"(?:(?P<direction>\d{1,3})\s+TRUE|VRB)\s+@\s+(?P<speed>\d+)\s+KNOTS?"
+    r"(?:.*?GUST\w*\s+(?:TO\s+)?(?P<gust>\d+))?"
+)
+_VISIBILITY = re.compile(
+    r"(?P<whole>\d+(?!/))?\s*(?:(?P<numerator>\d+)/(?P<denominator>\d+))?\s+STAT"
+)
+_CEILING_LAYER = re.compile(
+    r"^(?:BROKEN|OVERCAST|VERTICAL VISIBILITY).*?(?P<height>\d+)\s+FT"
+)
+_CLOUD_LAYER = re.compile(r"\d+\s+FT")
+_TEMPERATURE = re.compile(r"(?P<sign>-|MINUS\s+)?(?P<degrees>\d+(?:\.\d+)?)\s+C\b")
+_ALTIMETER = re.compile(r"(?P<inches>\d+(?:\.\d+)?)\s+IN\s+HG")
+
+
+def decode_awws_document(data_document: dict) -> dict:
+    """
+    Decodes the measurement strings of an AWWS METAR data document
+    into numbers, one value per column of NUMERIC_COLUMNS.
+
+    Missing or unreadable measurements are NaN. Calm wind has a speed
+    and direction of 0, variable wind a NaN direction, and a sky with
+    cloud layers but no broken or overcast layer an infinite ceiling.
+
+    Documents decoded at ingestion (with a "decoded" record, see
+    metar_decoding.attach_decoded_records()) are read from that record.
+
+    Parameters
+    ----------
+    data_document : dict
+        A data document, ideally from parse_awws_pagesource().
+
+    Returns
+    -------
+    dict
+        The decoded value of each numeric column.
+
+    Examples
+    --------
+    >> decode_awws_document({"wind": ["160 TRUE @ 5 KNOTS"], ...})
+    {"wind_direction_deg": 160.0, "wind_speed_kt": 5.0, ...}
+    """
+    if data_document.get("decoded") is not None:
+        return _decoded_record_values(data_document["decoded"])
+    values = dict.fromkeys(NUMERIC_COLUMNS, math.nan)
+    values.update(_decode_wind(data_document.get("wind")))
+    values["visibility_sm"] = _decode_visibility(data_document.get("visibility"))
+    values["ceiling_ft"] = _decode_ceiling(data_document.get("cloudiness"))
+    values["temperature_c"], values["dewpoint_c"] = _decode_temperatures(
+        data_document.get("temp / dewpoint")
+    )
+    values["altimeter_inhg"] = _decode_altimeter(data_document.get("altimeter"))
+    return values
+
+
+def awws_documents_to_columns(
+    data_documents: Union[dict, Iterable[dict]], observations_only: bool = True
+) -> dict:
+    """
+    Converts AWWS METAR data documents into typed columns.
+
+    Parameters
+    ----------
+    data_documents : dict or iterable of dict
+        Data documents, ideally from parse_awws_pagesource()
+        or read back from a backfill JSONL file.
+
+    observations_only : bool
+        If True, only METAR and SPECI observations are converted, leaving
+        out TAFs (which have no observation time or measurements).
+        By default True.
+
+    Returns
+    -------
+    dict
+        NumPy arrays keyed by column name: "location" (str),
+        "observed_at" (datetime64[s], UTC) and each of NUMERIC_COLUMNS.
+    """
+    if isinstance(data_documents, dict):
+        data_documents = data_documents.values()
+    locations, observation_times = [], []
+    numeric_values = {column: [] for column in NUMERIC_COLUMNS}
+    for data_document in data_documents:
+        if observations_only and not is_observation(data_document):
+            continue
+        locations.append(data_document.get("location", ""))
+        observation_times.append(
+            _observation_time(data_document.get("date - time", [""])[0])
+        )
+        for column, value in decode_awws_document(data_document).items():
+            numeric_values[column].append(value)
+
+    columns = {
+        "location": np.array(locations, dtype=str),
+        "observed_at": np.array(observation_times, dtype="datetime64[s]"),
+    }
+    for column, dtype in NUMERIC_COLUMNS.items():
+        columns[column] = np.array(numeric_values[column], dtype=dtype)
+    return columns
+
+
+def is_observation(data_document: dict) -> bool:
+    """Checks whether a data document is a METAR or SPECI observation."""
+    report_kind = (data_document.get("decoded") or {}).get("report_kind")
+    if report_kind is None:
+        report_kind = data_document.get("encodedreport", "").split(" ", 1)[0]
+    return report_kind in OBSERVATION_REPORT_KINDS
+
+
+def export_awws_documents(
+    data_documents: Union[dict, Iterable[dict]],
+    path: str,
+    export_format: Optional[str] = None,
+    chunk_size: int = 65536,
+    observations_only: bool = True,
+) -> int:
+    """
+    Writes AWWS METAR data documents to a columnar file for training.
+
+    Parquet and Arrow files are written chunk by chunk as record
+    batches, so exports larger than memory only hold one chunk of
+    documents at a time. NumPy .npz files are written in one go.
+
+    Parameters
+    ----------
+    data_documents : dict or iterable of dict
+        Data documents, ideally from parse_awws_pagesource()
+        or iter_jsonl_documents().
+
+    path : str
+        File to write.
+
+    export_format : str, optional
+        "parquet", "arrow" or "npz", by default inferred from
+        the path's suffix (.parquet, .arrow / .feather or .npz).
+
+    chunk_size : int
+        Documents converted per record batch, by default 65536.
+
+    observations_only : bool
+        If True, TAFs are left out, see awws_documents_to_columns().
+        By default True.
+
+    Returns
+    -------
+    int
+        Number of documents (rows) exported.
+    """
+    export_format = export_format or EXPORT_FORMATS.get(os.path.splitext(path)[1])
+    if export_format not in EXPORT_FORMATS.values():
+        raise ValueError(f"Unknown export format for {path}: {export_format}.")
+    if isinstance(data_documents, dict):
+        data_documents = data_documents.values()
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if export_format == "npz":
+        columns = awws_documents_to_columns(data_documents, observations_only)
+        np.savez(path, **columns)
+        return len(columns["location"])
+
+    pyarrow = _import_pyarrow(f"{export_format} exports")
+    schema = _arrow_schema(pyarrow)
+    row_count = 0
+    documents = iter(data_documents)
+    if export_format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(path, schema)
+    else:
+        writer = pyarrow.ipc.new_file(path, schema)
+    with writer:
+        while chunk := list(itertools.islice(documents, chunk_size)):
+            columns = awws_documents_to_columns(chunk, observations_only)
+            writer.write_batch(
+                pyarrow.record_batch(list(columns.values()), schema=schema)
+            )
+            row_count += len(columns["location"])
+    return row_count
+
+
+def read_awws_columns(path: str) -> dict:
+    """
+    Reads a file written by export_awws_documents() back into
+    NumPy arrays keyed by column name.
+    """
+    if path.endswith(".npz"):
+        with np.load(path) as columns:
+            return {column: columns[column] for column in columns.files}
+    pyarrow = _import_pyarrow(f"Reading {path}")
+    if path.endswith(".parquet"):
+        table = pyarrow.parquet.read_table(path)
+    else:
+        table = pyarrow.feather.read_table(path)
+    return {
+        column: table.column(column).to_numpy(zero_copy_only=False).astype(dtype)
+        for column, dtype in _column_dtypes().items()
+    }
+
+
+def iter_jsonl_documents(path: str) -> Iterator[dict]:
+    """Streams data documents from a JSONL file, eg a backfill's output."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _import_pyarrow(purpose: str):
+    # pyarrow is optional, only Parquet and Arrow exports need it, and
+    # it is imported on first use as it is slow to import.
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError(f"{purpose} needs pyarrow.") from error
+    return pyarrow
+
+
+def _arrow_schema(pyarrow):
+    return pyarrow.schema(
+        [
+            ("location", pyarrow.string()),
+            ("observed_at", pyarrow.timestamp("s", tz="UTC")),
+        ]
+        + [
+            (column, pyarrow.from_numpy_dtype(dtype))
+            for column, dtype in NUMERIC_COLUMNS.items()
+        ]
+    )
+
+
+def _column_dtypes() -> dict:
+    return {"location": str, "observed_at": "datetime64[s]", **NUMERIC_COLUMNS}
+
+
+@functools.lru_cache(maxsize=4096)
+def _observation_time(utc_string: str) -> Optional[datetime]:
+    # Naive UTC, as numpy datetime64 has no timezones.
+    try:
+        return datetime.strptime(utc_string.strip(), AWWS_UTC_FORMAT)
+    except ValueError:
+        return None
+
+
+def _decoded_record_values(decoded: dict) -> dict:
+    values = {
+        column: float(decoded[column]) if column in decoded else math.nan
+        for column in NUMERIC_COLUMNS
+    }
+    cloud_layers = decoded.get("cloud_layers")
+    if cloud_layers is not None:
+        values["ceiling_ft"] = min(
+            (
+                float(layer["height_ft"])
+                for layer in cloud_layers
+                if layer["cover"] in ("BKN", "OVC", "VV")
+            ),
+            default=math.inf,
+        )
+    return values
+
+
+def _decode_wind(wind: Optional[list]) -> dict:
+    wind_string = " ".join(wind or [])
+    if wind_string.startswith("CALM"):
+        return {"wind_direction_deg": 0.0, "wind_speed_kt": 0.0, "wind_gust_kt": 0.0}
+    match = _WIND.search(wind_string)
+    if not match:
+        return {}
+    return {
+        "wind_direction_deg": _to_float(match["direction"]),
+        "wind_speed_kt": float(match["speed"]),
+        # Reports without a gust have no gust above the steady wind.
+        "wind_gust_kt": _to_float(match["gust"]) if match["gust"] else 0.0,
+    }
+
+
+def _decode_visibility(visibility: Optional[list]) -> float:
+    match = _VISIBILITY.search(" ".join(visibility or []))
+    if not match or not (match["whole"] or match["numerator"]):
+        return math.nan
+    statute_miles = float(match["whole"] or 0)
+    if match["numerator"]:
+        statute_miles += int(match["numerator"]) / int(match["denominator"])
+    return statute_miles
+
+
+def _decode_ceiling(cloudiness: Optional[list]) -> float:
+    if not cloudiness:
+        return math.nan
+    ceiling_heights = [
+        float(match["height"])
+        for layer in cloudiness
+        if (match := _CEILING_LAYER.search(layer))
+    ]
+    if ceiling_heights:
+        return min(ceiling_heights)
+    if any(_CLOUD_LAYER.search(layer) for layer in cloudiness):
+        return math.inf
+    return math.nan
+
+
+def _decode_temperatures(temperatures: Optional[list]) -> tuple:
+    # Scraped as ["11 C /", "10 C"], temperature then dewpoint.
+    decoded = [math.nan, math.nan]
+    for position, temperature in enumerate((temperatures or [])[:2]):
+        match = _TEMPERATURE.search(temperature)
+        if match:
+            sign = -1 if match["sign"] else 1
+            decoded[position] = sign * float(match["degrees"])
+    return tuple(decoded)
+
+
+def _decode_altimeter(altimeter: Optional[list]) -> float:
+    match = _ALTIMETER.search(" ".join(altimeter or []))
+    return float(match["inches"]) if match else math.nan
+
+
+def _to_float(value: Optional[str]) -> float:
+    return float(value) if value is not None else math.nan
@@ -0,0 +1,417 @@
+import contextlib
+import fcntl
+import json
+import logging
+import math
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+import src.data.scraping as scraping
+from src import config
+from src.data import export
+
+
+# Per-hour aggregates kept for each station, one ring slot per hour of
+# the longest window. Times are POSIX seconds, ceilings in feet.
+SLOT_FIELDS = (
+    "hour",
+    "report_time",
+    "visibility_sm",
+    "spread_c",
+    "visibility_min_sm",
+    "peak_wind_max_kt",
+    "spread_min_c",
+    "ceiling_first_time",
+    "ceiling_first_ft",
+    "ceiling_last_time",
+    "ceiling_last_ft",
+)
+_SLOT = {field: column for column, field in enumerate(SLOT_FIELDS)}
+# Features of the latest report, after the rolling window features.
+LATEST_FEATURES = ("visibility_sm", "ceiling_ft", "spread_c", "report_time")
+
+# Files of a store directory: the station index, then raw float64
+# arrays of every station's slots and feature row, in index order.
+INDEX_FILENAME = "stations.json"
+SLOTS_FILENAME = "slots.f64"
+FEATURES_FILENAME = "features.f64"
+LOCK_FILENAME = "update.lock"
+
+# The process-wide store, see get_feature_store().
+_store = None
+_store_lock = threading.Lock()
+
+
+def _forget_store_in_child() -> None:
+    global _store, _store_lock
+    _store = None
+    _store_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_store_in_child)
+
+
+class FeatureStore:
+    """
+    Rolling-window flyability features per station (AWWS location),
+    updated incrementally as reports are ingested, so predictions read
+    one precomputed row instead of scanning the report history.
+
+    Each station keeps a ring of hourly slots covering the longest
+    window, holding the hour's minimum visibility, peak wind (the gust,
+    or the sustained speed without one), minimum temperature / dewpoint
+    spread and first and last ceiling. A report updates one slot, and the
+    station's feature row is recomputed from its fixed number of slots,
+    so an update costs the same however long the history. Windows end
+    at the hour of the station's latest report; reports older than the
+    longest window are ignored, and repeated reports change nothing.
+
+    The slots and feature rows are raw float64 arrays memory-mapped
+    from the store directory, so an update writes only the rows of the
+    stations it changed. Adding a station rewrites the arrays (and the
+    station index) whole, which is rare. Processes sharing the directory
+    take turns updating it, and remap it when another adds a station.
+    A row read while another process updates it may mix both versions.
+
+    Parameters
+    ----------
+    path : str, optional
+        The store directory,
+        by default the feature-store path in config/data.yml.
+
+    Examples
+    --------
+    >> store = FeatureStore()
+    >> store.update(page_data)
+    >> store.features("CYVR - VANCOUVER INTL/BC")
+    {"visibility_min_sm_3h": 6.0, "peak_wind_max_kt_3h": 12.0, ...}
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        store_config = config.load_config("config/data.yml")["local"]["feature-store"]
+        self.path = path or store_config["path"]
+        self.windows = sorted(store_config["windows"])
+        self.unlimited_ceiling_ft = float(store_config["unlimited-ceiling-ft"])
+        self.slot_hours = self.windows[-1]
+        self.feature_names = [
+            f"{feature}_{window}h"
+            for window in self.windows
+            for feature in (
+                "visibility_min_sm",
+                "peak_wind_max_kt",
+                "ceiling_trend_ft",
+                "spread_min_c",
+            )
+        ] + list(LATEST_FEATURES)
+        os.makedirs(self.path, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._index_mtime = None
+        self._reset()
+        self._load()
+
+    def update(self, data_documents: dict) -> int:
+        """
+        Adds a batch of reports to their stations' slots, recomputes the
+        stations' features and writes the stations' rows to the store.
+
+        Parameters
+        ----------
+        data_documents : dict
+            Documents from parse_awws_pagesource(), ideally with
+            "decoded" records. TAFs and documents without a datetime
+            are skipped.
+
+        Returns
+        -------
+        int
+            Number of reports added.
+        """
+        with self._lock, _store_lock_file(self.path):
+            self._reload_if_changed()
+            station_count = len(self._rows)
+            updated_rows = set()
+            report_count = 0
+            for data_document in data_documents.values():
+                row = self._add_report(data_document)
+                if row is not None:
+                    updated_rows.add(row)
+                    report_count += 1
+            for row in updated_rows:
+                self._features[row] = self._station_features(self._slots[row])
+            if self._rewrite_needed or len(self._rows) != station_count:
+                self._write_arrays()
+            elif updated_rows:
+                # The rows were written in place to the mapped files.
+                self._slots.flush()
+                self._features.flush()
+        return report_count
+
+    def features(self, location: str) -> Optional[dict]:
+        """
+        Returns the location's feature row by feature name,
+        or None if no reports were added for it.
+        """
+        row = self.feature_row(location)
+        if row is None:
+            return None
+        return dict(zip(self.feature_names, row.tolist()))
+
+    def feature_row(self, location: str) -> Optional[np.ndarray]:
+        """Returns the location's feature row, ordered as feature_names."""
+        with self._lock:
+            self._reload_if_changed()
+            if location not in self._rows:
+                return None
+            return self._features[self._rows[location]].copy()
+
+    def stations(self) -> list:
+        """Returns the locations with features, in row order."""
+        with self._lock:
+            self._reload_if_changed()
+            return list(self._rows)
+
+    def _add_report(self, data_document: dict) -> Optional[int]:
+        """
+        Adds a report to its station's hourly slot,
+        returning the station's row, or None if skipped.
+        """
+        sort_key_datetime = data_document.get("datetime")
+        decoded = data_document.get("decoded") or {}
+        if not sort_key_datetime or decoded.get("report_kind") == "TAF":
+            return None
+        utc_datetime = scraping.sort_key_utc_datetime(sort_key_datetime)
+        if utc_datetime is None:
+            return None
+        report_time = utc_datetime.timestamp()
+        hour = report_time // 3600
+
+        location = data_document["location"]
+        row = self._rows.get(location)
+        if row is None:
+            row = self._add_station(location)
+        station_slots = self._slots[row]
+        latest_hour = np.fmax.reduce(station_slots[:, _SLOT["hour"]])
+        if hour <= latest_hour - self.slot_hours:
+            return None
+        slot = station_slots[int(hour) % self.slot_hours]
+        if slot[_SLOT["hour"]] != hour:
+            slot[:] = math.nan
+            slot[_SLOT["hour"]] = hour
+
+        values = export.decode_awws_document(data_document)
+        spread = values["temperature_c"] - values["dewpoint_c"]
+        peak_wind = np.fmax(values["wind_gust_kt"], values["wind_speed_kt"])
+        _fold(slot, "visibility_min_sm", values["visibility_sm"], np.fmin)
+        _fold(slot, "peak_wind_max_kt", peak_wind, np.fmax)
+        _fold(slot, "spread_min_c", spread, np.fmin)
+        # Comparisons with an empty (NaN) slot field are False.
+        if not report_time < slot[_SLOT["report_time"]]:
+            slot[_SLOT["report_time"]] = report_time
+            slot[_SLOT["visibility_sm"]] = values["visibility_sm"]
+            slot[_SLOT["spread_c"]] = spread
+        ceiling = min(values["ceiling_ft"], self.unlimited_ceiling_ft)
+        if not math.isnan(ceiling):
+            if not report_time >= slot[_SLOT["ceiling_first_time"]]:
+                slot[_SLOT["ceiling_first_time"]] = report_time
+                slot[_SLOT["ceiling_first_ft"]] = ceiling
+            if not report_time < slot[_SLOT["ceiling_last_time"]]:
+                slot[_SLOT["ceiling_last_time"]] = report_time
+                slot[_SLOT["ceiling_last_ft"]] = ceiling
+        return row
+
+    def _station_features(self, station_slots: np.ndarray) -> np.ndarray:
+        """Computes a station's feature row from its hourly slots."""
+        hours = station_slots[:, _SLOT["hour"]]
+        latest_hour = np.fmax.reduce(hours)
+        features = []
+        for window in self.windows:
+            window_slots = station_slots[hours > latest_hour - window]
+            features.extend(
+                [
+                    np.fmin.reduce(window_slots[:, _SLOT["visibility_min_sm"]]),
+                    np.fmax.reduce(window_slots[:, _SLOT["peak_wind_max_kt"]]),
+                    _ceiling_trend(window_slots),
+                    np.fmin.reduce(window_slots[:, _SLOT["spread_min_c"]]),
+                ]
+            )
+
+        latest_slot = station_slots[int(latest_hour) % self.slot_hours]
+        ceiling_slots = station_slots[
+            ~np.isnan(station_slots[:, _SLOT["ceiling_last_time"]])
+        ]
+        latest_ceiling = math.nan
+        if len(ceiling_slots):
+            latest_ceiling = ceiling_slots[
+                np.argmax(ceiling_slots[:, _SLOT["ceiling_last_time"]]),
+                _SLOT["ceiling_last_ft"],
+            ]
+        features.extend(
+            [
+                latest_slot[_SLOT["visibility_sm"]],
+                latest_ceiling,
+                latest_slot[_SLOT["spread_c"]],
+                latest_slot[_SLOT["report_time"]],
+            ]
+        )
+        return np.array(features)
+
+    def _add_station(self, location: str) -> int:
+        row = len(self._rows)
+        self._rows[location] = row
+        self._slots = np.concatenate(
+            [self._slots, np.full((1, self.slot_hours, len(SLOT_FIELDS)), math.nan)]
+        )
+        self._features = np.concatenate(
+            [self._features, np.full((1, len(self.feature_names)), math.nan)]
+        )
+        return row
+
+    def _reset(self) -> None:
+        self._rows = {}
+        self._slots = np.empty((0, self.slot_hours, len(SLOT_FIELDS)))
+        self._features = np.empty((0, len(self.feature_names)))
+        # Set when the arrays in memory must replace the stored files.
+        self._rewrite_needed = False
+
+    def _load(self) -> None:
+        """Maps the stored arrays, as listed by the station index."""
+        index_path = os.path.join(self.path, INDEX_FILENAME)
+        try:
+            index_mtime = os.stat(index_path).st_mtime_ns
+            with open(index_path) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return
+        self._reset()
+        self._index_mtime = index_mtime
+        station_count = len(index["stations"])
+        slots_shape = (station_count, self.slot_hours, len(SLOT_FIELDS))
+        stored_features_shape = (station_count, len(index["feature-names"]))
+        if (
+            index["slot-fields"] != list(SLOT_FIELDS)
+            or index["slot-hours"] != self.slot_hours
+            or self._stored_size(SLOTS_FILENAME) != _array_bytes(slots_shape)
+            or self._stored_size(FEATURES_FILENAME)
+            != _array_bytes(stored_features_shape)
+        ):
+            logging.warning(
+                f"Feature store {self.path} doesn't match the configured "
+                "windows, starting it empty."
+            )
+            self._rewrite_needed = True
+            return
+        self._rows = {location: row for row, location in enumerate(index["stations"])}
+        if index["feature-names"] == self.feature_names:
+            self._map_arrays()
+            return
+        # The windows changed within the slots kept, so recompute.
+        self._slots = np.array(self._map(SLOTS_FILENAME, slots_shape))
+        self._features = np.array(
+            [self._station_features(station_slots) for station_slots in self._slots]
+        ).reshape(station_count, len(self.feature_names))
+        self._rewrite_needed = True
+
+    def _reload_if_changed(self) -> None:
+        try:
+            index_mtime = os.stat(os.path.join(self.path, INDEX_FILENAME)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if index_mtime != self._index_mtime:
+            self._load()
+
+    def _write_arrays(self) -> None:
+        """
+        Replaces the stored arrays and station index with those in
+        memory, then maps them. Each file is written whole then renamed,
+        the index last, so readers see either the old or new store.
+        """
+        for filename, array in (
+            (SLOTS_FILENAME, self._slots),
+            (FEATURES_FILENAME, self._features),
+        ):
+            temporary_path = os.path.join(self.path, f"{filename}.tmp")
+            np.ascontiguousarray(array, dtype=np.float64).tofile(temporary_path)
+            os.replace(temporary_path, os.path.join(self.path, filename))
+        index = {
+            "stations": list(self._rows),
+            "feature-names": self.feature_names,
+            "slot-fields": list(SLOT_FIELDS),
+            "slot-hours": self.slot_hours,
+        }
+        index_path = os.path.join(self.path, INDEX_FILENAME)
+        with open(f"{index_path}.tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(f"{index_path}.tmp", index_path)
+        self._index_mtime = os.stat(index_path).st_mtime_ns
+        self._rewrite_needed = False
+        self._map_arrays()
+
+    def _map_arrays(self) -> None:
+        station_count = len(self._rows)
+        if not station_count:
+            # Empty files can't be mapped.
+            return
+        self._slots = self._map(
+            SLOTS_FILENAME, (station_count, self.slot_hours, len(SLOT_FIELDS))
+        )
+        self._features = self._map(
+            FEATURES_FILENAME, (station_count, len(self.feature_names))
+        )
+
+    def _map(self, filename: str, shape: tuple) -> np.memmap:
+        return np.memmap(
+            os.path.join(self.path, filename), dtype=np.float64, mode="r+", shape=shape
+        )
+
+    def _stored_size(self, filename: str) -> Optional[int]:
+        try:
+            return os.path.getsize(os.path.join(self.path, filename))
+        except FileNotFoundError:
+            return None
+
+
+def get_feature_store() -> FeatureStore:
+    """Returns the process-wide feature store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FeatureStore()
+        return _store
+
+
+def _fold(slot: np.ndarray, field: str, value: float, combine) -> None:
+    # fmin / fmax ignore NaN, so missing measurements never win.
+    slot[_SLOT[field]] = combine(slot[_SLOT[field]], value)
+
+
+def _ceiling_trend(window_slots: np.ndarray) -> float:
+    """
+    The change in ceiling (feet, negative when lowering) from the first
+    to the last report with a known sky condition in the window.
+    """
+    first_times = window_slots[:, _SLOT["ceiling_first_time"]]
+    if np.isnan(first_times).all():
+        return math.nan
+    first = window_slots[np.nanargmin(first_times), _SLOT["ceiling_first_ft"]]
+    last_times = window_slots[:, _SLOT["ceiling_last_time"]]
+    last = window_slots[np.nanargmax(last_times), _SLOT["ceiling_last_ft"]]
+    return last - first
+
+
+def _array_bytes(shape: tuple) -> int:
+    return int(np.prod(shape)) * np.dtype(np.float64).itemsize
+
+
+@contextlib.contextmanager
+def _store_lock_file(path: str):
+    """Holds an exclusive lock in the store directory while updating it."""
+    with open(os.path.join(path, LOCK_FILENAME), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import TYPE_CHECKING, Literal, Optional, Union
+
+from src import config, instrumentation
+
+if TYPE_CHECKING:
+    import requests
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Returns the process-wide HTTP session, creating it on first use.
+
+    The session keeps a pool of keep-alive connections (sized from
+    config/scraping.yml) so repeated fetches reuse sockets instead of
+    paying for a new TCP/TLS handshake per station.
+
+    Returns
+    -------
+    requests.Session
+        A shared session with connection pooling and retries mounted.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            http_config = config.load_config("config/scraping.yml")["http"]
+            retries = Retry(
+                total=http_config["retries"],
+                backoff_factor=http_config["backoff-factor"],
+                status_forcelist=[500, 502, 503, 504],
+                allowed_methods=None,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=http_config["pool-size"],
+                pool_maxsize=http_config["pool-size"],
+                max_retries=retries,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def station_codes_for(location: Union[str, list], awws_config: dict) -> str:
+    """
+    Looks up the station code(s) for the plain-language location(s),
+    joined the way the AWWS Stations field expects for batched requests.
+
+    Parameters
+    ----------
+    location : str or list
+        A plain-language location, or a list of them, from config/scraping.yml.
+
+    awws_config : dict
+        The AWWS report section of config/scraping.yml.
+
+    Returns
+    -------
+    str
+        Station code(s) to enter in the Stations field, eg "CYVR CYXX".
+    """
+    locations = [location] if isinstance(location, str) else location
+    return awws_config["form"]["stations-separator"].join(
+        awws_config["locations"][name]["code"] for name in locations
+    )
+
+
+@instrumentation.timed("fetch")
+def fetch_awws_metar_pagesource(
+    location: Union[Literal["vancouver", "abbotsford"], list] = "vancouver",
+    session: Optional[requests.Session] = None,
+    url: Optional[str] = None,
+) -> str:
+    """
+    Fetches the plain-text METAR - TAF page for the given location by
+    submitting the AWWS manual entry form directly over HTTP,
+    without starting a browser.
+
+    Parameters
+    ----------
+    location : str or list, optional
+        The plain-language location for the airspace data you want to fetch.
+        Currently 'vancouver' and 'abbotsford' are supported,
+        by default 'vancouver'. A list of locations is submitted as a
+        single batched request.
+
+    session : requests.Session, optional
+        HTTP session to send the form with, by default the shared
+        session from get_http_session().
+
+    url : str, optional
+        URL to submit the form to, by default the AWWS METAR - TAF
+        url in config/scraping.yml.
+
+    Returns
+    -------
+    str
+        A string representing the entire HTML webpage containing the fetched data,
+        matching the page source produced by scrape_awws_metar_pagesource().
+
+    Raises
+    ------
+    requests.RequestException
+        If the request fails or returns an error status.
+    ValueError
+        If the response is not a METAR - TAF report page.
+    """
+    scraping_config = config.load_config("config/scraping.yml")
+    awws_config = scraping_config["awws"]["metar-taf"]
+    form_config = awws_config["form"]
+    location_code = station_codes_for(location, awws_config)
+
+    form_data = dict(form_config["fields"])
+    form_data[form_config["stations-field"]] = location_code
+    session = session or get_http_session()
+    response = session.post(
+        url or awws_config["url"],
+        data=form_data,
+        timeout=scraping_config["http"]["timeout"],
+    )
+    response.raise_for_status()
+    instrumentation.count("bytes-fetched", len(response.content))
+    logging.debug(f"Fetched {location} page with status {response.status_code}.")
+
+    # The site answers unknown forms with its landing page rather than
+    # an error status, so check we actually got a report back.
+    page_source = response.text
+    if 'class="corps"' not in page_source:
+        raise ValueError(
+            f"AWWS response for {location_code} does not contain a METAR - TAF report."
+        )
+    return page_source
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+from typing import Optional
+
+from src import config
+
+
+# The page stamps every response with the time it was generated,
+# so leave that span out when deciding if a page changed.
+REQUEST_TIMESTAMP_SPAN = re.compile(
+    r'<span class="corps">\s*Request Generated.*?</span>', re.DOTALL
+)
+
+
+class IngestionIndex:
+    """
+    A local SQLite index of what previous ingestion runs have written,
+    used to skip unchanged pages and reports on frequent polling.
+
+    Reports are tracked by (location, datetime) with a hash of their
+    encoded report, so amended reports are treated as changed. Pages
+    are tracked by a key (eg the locations requested) with a hash of
+    their content, excluding the request timestamp.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path to the SQLite database file,
+        by default the ingestion-index path in config/data.yml.
+
+    Examples
+    --------
+    >> with IngestionIndex() as index:
+    >>     new_documents = index.filter_new_documents(page_data)
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = (
+            path or config.load_config("config/data.yml")["local"]["ingestion-index"]
+        )
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS reports ("
+                "location TEXT NOT NULL, datetime TEXT NOT NULL, "
+                "report_hash TEXT NOT NULL, PRIMARY KEY (location, datetime))"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "page_key TEXT PRIMARY KEY, content_hash TEXT NOT NULL)"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def page_unchanged(self, page_key: str, source: str) -> bool:
+        """
+        Checks whether the page source matches the last one
+        recorded for the page key with record_page().
+        """
+        row = self._connection.execute(
+            "SELECT content_hash FROM pages WHERE page_key = ?", (page_key,)
+        ).fetchone()
+        return row is not None and row[0] == page_content_hash(source)
+
+    def record_page(self, page_key: str, source: str) -> None:
+        """Records the page source as the latest seen for the page key."""
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pages (page_key, content_hash) VALUES (?, ?)",
+                (page_key, page_content_hash(source)),
+            )
+
+    def filter_new_documents(
+        self, data_documents: dict, partition_key: str = "location"
+    ) -> dict:
+        """
+        Returns only the documents that are new or whose encoded report
+        changed since they were recorded with mark_documents_written().
+
+        Parameters
+        ----------
+        data_documents : dict
+            Dictionary of data documents, ideally from parse_awws_pagesource().
+        partition_key : str
+            The document key naming the location, by default "location".
+
+        Returns
+        -------
+        dict
+            The new or changed documents, renumbered from 0 in their
+            original order. Documents without location or datetime
+            are kept so the writer can report them.
+        """
+        new_documents = {}
+        for data_document in data_documents.values():
+            location = data_document.get(partition_key)
+            report_datetime = data_document.get("datetime")
+            if location and report_datetime:
+                row = self._connection.execute(
+                    "SELECT report_hash FROM reports "
+                    "WHERE location = ? AND datetime = ?",
+                    (location, report_datetime),
+                ).fetchone()
+                if row is not None and row[0] == report_hash(data_document):
+                    continue
+            new_documents[len(new_documents)] = data_document
+        logging.debug(
+            f"{len(new_documents)} / {len(data_documents)} documents new or changed."
+        )
+        return new_documents
+
+    def mark_documents_written(
+        self, data_documents: dict, partition_key: str = "location"
+    ) -> None:
+        """Records the documents as written to the database."""
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO reports (location, datetime, report_hash) "
+                "VALUES (?, ?, ?)",
+                [
+                    (
+                        data_document[partition_key],
+                        data_document["datetime"],
+                        report_hash(data_document),
+                    )
+                    for data_document in data_documents.values()
+                    if data_document.get(partition_key)
+                    and data_document.get("datetime")
+                ],
+            )
+
+    def forget_documents(
+        self, data_documents: dict, partition_key: str = "location"
+    ) -> None:
+        """
+        Forgets that the documents were written (eg when their write was
+        abandoned), along with every recorded page, so the next run
+        reparses its pages and writes the documents again.
+        """
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM reports WHERE location = ? AND datetime = ?",
+                [
+                    (data_document[partition_key], data_document["datetime"])
+                    for data_document in data_documents.values()
+                    if data_document.get(partition_key)
+                    and data_document.get("datetime")
+                ],
+            )
+            self._connection.execute("DELETE FROM pages")
+
+
+def report_hash(data_document: dict) -> str:
+    """Hashes the encoded report of a data document."""
+    encoded_report = data_document.get("encodedreport", "")
+    return hashlib.sha256(encoded_report.encode("utf-8")).hexdigest()
+
+
+def page_content_hash(source: str) -> str:
+    """Hashes a page source, ignoring its request timestamp."""
+    content = REQUEST_TIMESTAMP_SPAN.sub("", source, count=1)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
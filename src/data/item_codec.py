@@ -0,0 +1,179 @@
+import json
+import zlib
+from typing import Optional
+
+import src.data.scraping as scraping
+
+
+# Version of the compact item layout, stored with each item under "v".
+# Bump it (keeping the old decoder) when the layout, field codes
+# or compression dictionary change.
+ITEM_CODEC_VERSION = 1
+VERSION_ATTRIBUTE = "v"
+FIELDS_ATTRIBUTE = "f"
+
+# Document fields stored as their own short attributes.
+_ATTRIBUTE_CODES = {
+    "report_timestamp": "ts",
+    "encodedreport": "er",
+}
+# Document fields packed (with their short code) into the compressed
+# FIELDS_ATTRIBUTE. Fields not listed are packed under their own name.
+_FIELD_CODES = {
+    "metar": "m",
+    "date - time": "dt",
+    "wind": "w",
+    "visibility": "vi",
+    "runway visible range": "rv",
+    "weather": "wx",
+    "cloudiness": "c",
+    "temp / dewpoint": "td",
+    "altimeter": "a",
+    "recent weather": "rw",
+    "wind shear": "ws",
+    "decoded": "dc",
+}
+_FIELD_NAMES = {code: field for field, code in _FIELD_CODES.items()}
+_ATTRIBUTE_NAMES = {code: field for field, code in _ATTRIBUTE_CODES.items()}
+# Preset zlib dictionary of text common to the packed fields, so even
+# a single small item compresses well. Part of the codec version.
+_COMPRESSION_DICTIONARY = (
+    b'"dt": ["OCTOBER 2022 - UTC"], "w": [" @ KNOTS", "GUSTS"], '
+    b'"vi": ["STAT. MILES"], "c": ["FEW CLOUDS (1/8 - 2/8) FT", '
+    b'"SCATTERED CLOUDS (3/8 - 4/8) FT", "BROKEN CLOUDS (5/8 - 7/8) FT", '
+    b'"OVERCAST (8/8) FT"], "td": [" C /", " C"], "a": ["IN HG"], '
+    b'"wx": ["LIGHT RAIN", "MIST"], "dc": {"station": "C", "report_kind": '
+    b'"METAR", "day": , "hour": , "minute": , "wind_direction_deg": , '
+    b'"wind_speed_kt": , "wind_gust_kt": , "visibility_sm": , '
+    b'"cloud_layers": [{"cover": "BKN", "height_ft": }], "temperature_c": , '
+    b'"dewpoint_c": , "altimeter_inhg": }'
+)
+
+
+def encode_awws_item(data_document: dict, table_config: dict) -> dict:
+    """
+    Encodes a data document as a compact DynamoDB item.
+
+    The table keys and any extra attributes (eg a conditional write's
+    content hash) are stored as they are, the report timestamp and
+    encoded report under short attribute names, and the remaining fields
+    packed under short codes into one compressed binary attribute. The
+    "report" field (the same for every item in a table) is dropped, as is
+    the "date - time" list when it can be rebuilt from the sort key.
+
+    Parameters
+    ----------
+    data_document : dict
+        A document from parse_awws_pagesource().
+    table_config : dict
+        The report's table config from config/data.yml,
+        with its "partition-key" and "sort-key".
+
+    Returns
+    -------
+    dict
+        The item, to be written with decode_awws_item() reading it back.
+    """
+    key_fields = (table_config["partition-key"], table_config["sort-key"])
+    item = {VERSION_ATTRIBUTE: ITEM_CODEC_VERSION}
+    packed_fields = {}
+    for field, value in data_document.items():
+        if field in key_fields:
+            item[field] = value
+        elif field == "report":
+            continue
+        elif field in _ATTRIBUTE_CODES:
+            item[_ATTRIBUTE_CODES[field]] = value
+        elif field == "date - time" and value == _rebuild_date_time(
+            data_document.get("datetime")
+        ):
+            continue
+        else:
+            packed_fields[_FIELD_CODES.get(field, field)] = value
+    if packed_fields:
+        item[FIELDS_ATTRIBUTE] = _compress(
+            json.dumps(packed_fields, separators=(",", ":"), default=float)
+        )
+    return item
+
+
+def decode_awws_item(item: dict, report_type: str = "metar-taf") -> dict:
+    """
+    Restores the data document of an item written by encode_awws_item(),
+    in the document's original shape. Items without a codec version
+    (written as plain documents) are returned unchanged.
+    """
+    if VERSION_ATTRIBUTE not in item:
+        return item
+    version = int(item[VERSION_ATTRIBUTE])
+    if version != ITEM_CODEC_VERSION:
+        raise ValueError(f"Unknown AWWS item codec version: {version}.")
+
+    data_document = {"report": report_type}
+    for attribute, value in item.items():
+        if attribute in (VERSION_ATTRIBUTE, FIELDS_ATTRIBUTE):
+            continue
+        data_document[_ATTRIBUTE_NAMES.get(attribute, attribute)] = value
+    if FIELDS_ATTRIBUTE in item:
+        packed_fields = json.loads(_decompress(item[FIELDS_ATTRIBUTE]))
+        for code, value in packed_fields.items():
+            data_document[_FIELD_NAMES.get(code, code)] = value
+    if "date - time" not in data_document:
+        date_time = _rebuild_date_time(data_document.get("datetime"))
+        if date_time:
+            data_document["date - time"] = date_time
+    return data_document
+
+
+def item_projection(projection: list, table_config: dict) -> list:
+    """
+    Returns the item attributes holding the projected document fields,
+    for both compact and plain items.
+    """
+    key_fields = (table_config["partition-key"], table_config["sort-key"])
+    attributes = {VERSION_ATTRIBUTE}
+    for field in projection:
+        attributes.add(field)
+        if field in _ATTRIBUTE_CODES:
+            attributes.add(_ATTRIBUTE_CODES[field])
+        elif field != "report" and field not in key_fields:
+            attributes.add(FIELDS_ATTRIBUTE)
+        if field == "date - time":
+            # Rebuilt from the sort key when not packed.
+            attributes.add(table_config["sort-key"])
+    return sorted(attributes)
+
+
+def project_document(data_document: dict, projection: Optional[list]) -> dict:
+    """Keeps only the projected fields of a decoded document."""
+    if not projection:
+        return data_document
+    return {
+        field: value for field, value in data_document.items() if field in projection
+    }
+
+
+def _rebuild_date_time(sort_key_datetime: Optional[str]) -> Optional[list]:
+    """
+    Rebuilds a document's "date - time" list from its sort key datetime,
+    eg "2022-10-19 21:00 PDT" to ["20 OCTOBER 2022 - 0400 UTC"].
+    """
+    if not sort_key_datetime:
+        return None
+    utc_datetime = scraping.sort_key_utc_datetime(sort_key_datetime)
+    if utc_datetime is None:
+        return None
+    return [utc_datetime.strftime(scraping.AWWS_UTC_FORMAT).upper()]
+
+
+def _compress(text: str) -> bytes:
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=_COMPRESSION_DICTIONARY)
+    return compressor.compress(text.encode("utf-8")) + compressor.flush()
+
+
+def _decompress(value) -> str:
+    # boto3 reads binary attributes back as Binary, wrapping the bytes.
+    decompressor = zlib.decompressobj(-15, zdict=_COMPRESSION_DICTIONARY)
+    return (decompressor.decompress(bytes(value)) + decompressor.flush()).decode(
+        "utf-8"
+    )
@@ -0,0 +1,338 @@
+import math
+import re
+from typing import Optional
+
+import numpy as np
+
+from src.data import export
+
+
+# Grammar of the encoded report groups, compiled once.
+_REPORT_KIND = re.compile(r"^(?P<kind>METAR|SPECI|TAF)$")
+_STATION = re.compile(r"^(?P<station>[A-Z][A-Z0-9]{3})$")
+_ISSUE_TIME = re.compile(r"^(?P<day>\d{2})(?P<hour>\d{2})(?P<minute>\d{2})Z$")
+_WIND = re.compile(
+    r"^(?P<direction>\d{3}|VRB)(?P<speed>\d{2,3})(?:G(?P<gust>\d{2,3}))?"
+    r"(?P<unit>KT|MPS|KMH)$"
+)
+_VISIBILITY = re.compile(
+    r"^(?P<bound>[MP])?(?:(?P<whole>\d{1,2})|(?P<numerator>\d)/(?P<denominator>\d{1,2}))SM$"
+)
+_VISIBILITY_WHOLE = re.compile(r"^\d$")
+_CLOUD_LAYER = re.compile(
+    r"^(?P<cover>FEW|SCT|BKN|OVC|VV)(?P<height>\d{3})(?:CB|TCU)?$"
+)
+_CLEAR_SKY = re.compile(r"^(?:SKC|CLR|NSC|NCD|CAVOK)$")
+_TEMPERATURES = re.compile(r"^(?P<temperature>M?\d{2})/(?P<dewpoint>M?\d{2})?$")
+_ALTIMETER = re.compile(r"^(?P<unit>[AQ])(?P<value>\d{4})$")
+_PLAIN_TEXT_CLOUD_LAYER = re.compile(
+    r"^(?P<cover>FEW|SCATTERED|BROKEN|OVERCAST|VERTICAL)\b.*?(?P<height>\d+)\s+FT"
+)
+# Remarks and TAF change groups end the part of the report decoded.
+_END_OF_BODY = re.compile(r"^(?:RMK|FM\d{6}|BECMG|TEMPO|PROB\d{2})$")
+
+_CEILING_COVERS = ("BKN", "OVC", "VV")
+_PLAIN_TEXT_COVERS = {
+    "FEW": "FEW",
+    "SCATTERED": "SCT",
+    "BROKEN": "BKN",
+    "OVERCAST": "OVC",
+    "VERTICAL": "VV",
+}
+_WIND_TO_KNOTS = {"KT": 1.0, "MPS": 1.943844, "KMH": 0.539957}
+# Visibility beyond (P) or under (M) what the report can express.
+_VISIBILITY_BOUNDS = {"P": "above", "M": "below"}
+_HECTOPASCALS_TO_INHG = 0.02953
+
+# NumPy structured dtype for decoding batches of reports into arrays.
+METAR_RECORD_DTYPE = np.dtype(
+    [
+        ("station", "U4"),
+        ("report_kind", "U5"),
+        ("day", np.int8),
+        ("hour", np.int8),
+        ("minute", np.int8),
+        ("wind_direction_deg", np.float32),
+        ("wind_speed_kt", np.float32),
+        ("wind_gust_kt", np.float32),
+        ("visibility_sm", np.float32),
+        ("visibility_bound", "U5"),
+        ("ceiling_ft", np.float32),
+        ("cloud_layer_count", np.int8),
+        ("temperature_c", np.float32),
+        ("dewpoint_c", np.float32),
+        ("altimeter_inhg", np.float32),
+    ]
+)
+
+
+class MetarRecord:
+    """
+    A decoded METAR, SPECI or TAF report.
+
+    Measurements the report doesn't hold are None. A calm wind has a
+    direction and speed of 0, a variable wind a None direction.
+    visibility_bound is "above" when the visibility is greater than
+    visibility_sm (eg "P6SM"), "below" when less (eg "M1/4SM"), and
+    None when visibility_sm is the visibility itself.
+    cloud_layers is a tuple of (cover, height in feet), empty for a clear
+    sky and None when the report gives no sky condition.
+    """
+
+    __slots__ = (
+        "station",
+        "report_kind",
+        "day",
+        "hour",
+        "minute",
+        "wind_direction_deg",
+        "wind_speed_kt",
+        "wind_gust_kt",
+        "visibility_sm",
+        "visibility_bound",
+        "cloud_layers",
+        "temperature_c",
+        "dewpoint_c",
+        "altimeter_inhg",
+    )
+
+    def __init__(self, **fields):
+        for field in self.__slots__:
+            setattr(self, field, fields.get(field))
+
+    def __eq__(self, other):
+        return isinstance(other, MetarRecord) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{field}={value!r}" for field, value in self.to_dict().items()
+        )
+        return f"MetarRecord({fields})"
+
+    @property
+    def ceiling_ft(self) -> Optional[float]:
+        """
+        The lowest broken, overcast or vertical visibility layer,
+        inf without one, or None when the sky condition is unknown.
+        """
+        if self.cloud_layers is None:
+            return None
+        return min(
+            (height for cover, height in self.cloud_layers if cover in _CEILING_COVERS),
+            default=math.inf,
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Returns the record as a dictionary of plain values, leaving out
+        missing measurements, to store alongside a data document.
+        """
+        record_dict = {}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if field == "cloud_layers" and value is not None:
+                value = [
+                    {"cover": cover, "height_ft": height} for cover, height in value
+                ]
+            if value is not None:
+                record_dict[field] = value
+        return record_dict
+
+    @classmethod
+    def from_dict(cls, record_dict: dict) -> "MetarRecord":
+        """Rebuilds a record from to_dict(), eg as read back from DynamoDB."""
+        fields = {}
+        for field, value in record_dict.items():
+            if field == "cloud_layers":
+                value = tuple(
+                    (layer["cover"], int(layer["height_ft"])) for layer in value
+                )
+            elif field in ("station", "report_kind", "visibility_bound"):
+                value = str(value)
+            elif field in ("day", "hour", "minute"):
+                value = int(value)
+            else:
+                # DynamoDB reads numbers back as Decimals.
+                value = float(value)
+            fields[field] = value
+        return cls(**fields)
+
+
+def decode_encoded_report(encoded_report: str) -> MetarRecord:
+    """
+    Decodes the groups of an encoded METAR, SPECI or TAF report,
+    up to its remarks (or a TAF's first change group).
+
+    Parameters
+    ----------
+    encoded_report : str
+        The encoded report, eg "METAR CYVR 200400Z VRB02KT 15SM ...".
+
+    Returns
+    -------
+    MetarRecord
+        The decoded record, with None for groups not found.
+
+    Examples
+    --------
+    >> decode_encoded_report("METAR CYXX 280500Z 16005KT 5SM -RA OVC066 10/10 A2989")
+    MetarRecord(station='CYXX', report_kind='METAR', day=28, ..., altimeter_inhg=29.89)
+    """
+    record = MetarRecord()
+    tokens = encoded_report.replace("=", " ").split()
+    position = 0
+    if tokens and (match := _REPORT_KIND.match(tokens[0])):
+        record.report_kind = match["kind"]
+        position = 1
+    while position < len(tokens) and tokens[position] in ("AMD", "COR", "CCA"):
+        position += 1
+    if position < len(tokens) and (match := _STATION.match(tokens[position])):
+        record.station = match["station"]
+        position += 1
+
+    cloud_layers = []
+    for token_number in range(position, len(tokens)):
+        token = tokens[token_number]
+        if _END_OF_BODY.match(token):
+            break
+        if record.day is None and (match := _ISSUE_TIME.match(token)):
+            record.day, record.hour, record.minute = (
+                int(match["day"]),
+                int(match["hour"]),
+                int(match["minute"]),
+            )
+        elif record.wind_speed_kt is None and (match := _WIND.match(token)):
+            to_knots = _WIND_TO_KNOTS[match["unit"]]
+            record.wind_speed_kt = round(int(match["speed"]) * to_knots, 1)
+            if match["direction"] != "VRB":
+                record.wind_direction_deg = float(match["direction"])
+            record.wind_gust_kt = (
+                round(int(match["gust"]) * to_knots, 1) if match["gust"] else 0.0
+            )
+        elif record.visibility_sm is None and (match := _VISIBILITY.match(token)):
+            if match["whole"]:
+                visibility = float(match["whole"])
+            else:
+                visibility = int(match["numerator"]) / int(match["denominator"])
+                # A whole number before a fraction, eg "1 1/2SM".
+                previous_token = tokens[token_number - 1]
+                if _VISIBILITY_WHOLE.match(previous_token):
+                    visibility += int(previous_token)
+            record.visibility_sm = visibility
+            record.visibility_bound = _VISIBILITY_BOUNDS.get(match["bound"])
+        elif match := _CLOUD_LAYER.match(token):
+            cloud_layers.append((match["cover"], int(match["height"]) * 100))
+        elif _CLEAR_SKY.match(token):
+            record.cloud_layers = ()
+        elif record.temperature_c is None and (match := _TEMPERATURES.match(token)):
+            record.temperature_c = _decode_temperature(match["temperature"])
+            record.dewpoint_c = _decode_temperature(match["dewpoint"])
+        elif record.altimeter_inhg is None and (match := _ALTIMETER.match(token)):
+            if match["unit"] == "A":
+                record.altimeter_inhg = int(match["value"]) / 100
+            else:
+                record.altimeter_inhg = round(
+                    int(match["value"]) * _HECTOPASCALS_TO_INHG, 2
+                )
+    if cloud_layers:
+        record.cloud_layers = tuple(cloud_layers)
+    return record
+
+
+def decode_awws_document(data_document: dict) -> MetarRecord:
+    """
+    Decodes a data document's encoded report, filling in measurements
+    it lacks (eg as the scraped encoded report is cut short) from the
+    document's plain-text fields.
+    """
+    record = decode_encoded_report(data_document.get("encodedreport", ""))
+    plain_text_values = None
+    for field in (
+        "wind_direction_deg",
+        "wind_speed_kt",
+        "wind_gust_kt",
+        "visibility_sm",
+        "temperature_c",
+        "dewpoint_c",
+        "altimeter_inhg",
+    ):
+        if getattr(record, field) is not None:
+            continue
+        if field == "wind_direction_deg" and record.wind_speed_kt is not None:
+            continue  # Variable wind.
+        if plain_text_values is None:
+            plain_text_values = export.decode_awws_document(data_document)
+        if not math.isnan(plain_text_values[field]):
+            setattr(record, field, plain_text_values[field])
+    if record.cloud_layers is None and data_document.get("cloudiness"):
+        cloud_layers = [
+            (_PLAIN_TEXT_COVERS[match["cover"]], int(match["height"]))
+            for layer in data_document["cloudiness"]
+            if (match := _PLAIN_TEXT_CLOUD_LAYER.match(layer))
+        ]
+        record.cloud_layers = tuple(cloud_layers) or None
+    return record
+
+
+def decode_awws_documents(data_documents: dict) -> dict:
+    """
+    Decodes a batch of data documents, eg a page from
+    parse_awws_pagesource(), keyed like the documents.
+    Documents without an encoded report are left out.
+    """
+    return {
+        document_number: decode_awws_document(data_document)
+        for document_number, data_document in data_documents.items()
+        if data_document.get("encodedreport")
+    }
+
+
+def attach_decoded_records(data_documents: dict) -> dict:
+    """
+    Decodes a batch of data documents and stores each record's
+    to_dict() under the document's "decoded" field, so the reports are
+    decoded once at ingestion. Returns the same (updated) documents.
+    """
+    for document_number, record in decode_awws_documents(data_documents).items():
+        data_documents[document_number]["decoded"] = record.to_dict()
+    return data_documents
+
+
+def records_to_array(records: list) -> np.ndarray:
+    """
+    Packs decoded records into a NumPy structured array of
+    METAR_RECORD_DTYPE, with NaN (or -1, or "") for missing measurements.
+    """
+    records_array = np.empty(len(records), dtype=METAR_RECORD_DTYPE)
+    for row, record in enumerate(records):
+        ceiling = record.ceiling_ft
+        records_array[row] = (
+            record.station or "",
+            record.report_kind or "",
+            _or_missing(record.day, -1),
+            _or_missing(record.hour, -1),
+            _or_missing(record.minute, -1),
+            _or_missing(record.wind_direction_deg, math.nan),
+            _or_missing(record.wind_speed_kt, math.nan),
+            _or_missing(record.wind_gust_kt, math.nan),
+            _or_missing(record.visibility_sm, math.nan),
+            record.visibility_bound or "",
+            _or_missing(ceiling, math.nan),
+            len(record.cloud_layers or ()),
+            _or_missing(record.temperature_c, math.nan),
+            _or_missing(record.dewpoint_c, math.nan),
+            _or_missing(record.altimeter_inhg, math.nan),
+        )
+    return records_array
+
+
+def _decode_temperature(temperature: Optional[str]) -> Optional[float]:
+    if not temperature:
+        return None
+    if temperature.startswith("M"):
+        return -float(temperature[1:])
+    return float(temperature)
+
+
+def _or_missing(value, missing):
+    return missing if value is None else value
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import collections
+import contextlib
+import datetime
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+
+import src.data.database as database
+from src import config
+
+if TYPE_CHECKING:
+    import boto3
+
+
+class ObservationCache:
+    """
+    A read-through cache of the latest AWWS documents per location,
+    in front of the DynamoDB table from config/data.yml.
+
+    Entries expire after the configured ttl, or sooner at the next
+    METAR issue time, so a new hourly report is never hidden for long.
+    Entries for a location are dropped as soon as documents for it are
+    written in this process, and an optional SQLite disk tier keeps
+    entries across restarts. The cache may be read from several threads:
+    as boto3 resources aren't thread safe, each thread other than the
+    creating one queries through its own resource, sharing db's client.
+
+    Parameters
+    ----------
+    db : boto3.resources.factory
+        A boto3 resource connection connecting to a DynamoDB
+        database, ideally created with dynamodb_connection().
+    ttl : float, optional
+        Longest time in seconds an entry is kept,
+        by default the observation-cache ttl in config/data.yml.
+    disk_path : str, optional
+        SQLite file for the disk tier, by default the disk-tier path in
+        config/data.yml if the disk tier is enabled there (else no disk tier).
+
+    Examples
+    --------
+    >> with database.dynamodb_connection() as db, ObservationCache(db) as cache:
+    >>     latest_metar = cache.latest("CYVR - VANCOUVER INTL/BC")
+    >>     cache.stats()
+    {"hits": 0, "disk-hits": 0, "misses": 1, "invalidations": 0, "entries": 1}
+    """
+
+    def __init__(
+        self,
+        db: boto3.resources.factory,
+        ttl: Optional[float] = None,
+        disk_path: Optional[str] = None,
+    ):
+        cache_config = config.load_config("config/data.yml")["dynamodb"][
+            "observation-cache"
+        ]
+        self.db = db
+        self.ttl = ttl or cache_config["ttl"]
+        self.issue_minute = cache_config["issue-minute"]
+        self.issue_delay = cache_config["issue-delay"]
+        self.max_entries = cache_config["max-entries"]
+        if disk_path is None and cache_config["disk-tier"]["enabled"]:
+            disk_path = cache_config["disk-tier"]["path"]
+        self.disk_path = disk_path
+
+        self._thread_dbs = threading.local()
+        self._thread_dbs.db = db
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by invalidate(), so reads racing a write aren't cached.
+        self._generation = 0
+        self._counters = dict.fromkeys(
+            ["hits", "disk-hits", "misses", "invalidations"], 0
+        )
+        self._disk = _open_disk_tier(disk_path) if disk_path else None
+        database.add_write_listener(self._on_documents_written)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        database.remove_write_listener(self._on_documents_written)
+        if self._disk:
+            self._disk.close()
+
+    def latest(
+        self, location: str, count: int = 1, report_type: str = "metar-taf"
+    ) -> list:
+        """
+        Returns the newest documents of a location, from the cache
+        if they are fresh, otherwise from the table.
+
+        Parameters
+        ----------
+        location : str
+            The partition key value, eg "CYVR - VANCOUVER INTL/BC".
+        count : int
+            Number of documents to return, by default 1.
+        report_type : str
+            The AWWS report table to read, by default "metar-taf".
+
+        Returns
+        -------
+        list
+            Up to count documents, newest first.
+        """
+        key = (report_type, location, count)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return list(entry[0])
+            disk_entry = self._read_disk_entry(key, now)
+            if disk_entry:
+                self._store_entry(key, disk_entry, to_disk=False)
+                self._counters["disk-hits"] += 1
+                return list(disk_entry[0])
+            self._counters["misses"] += 1
+            generation = self._generation
+
+        documents = list(
+            itertools.islice(
+                database.query_awws_documents(
+                    self._thread_db(),
+                    location,
+                    report_type=report_type,
+                    page_size=count,
+                    newest_first=True,
+                ),
+                count,
+            )
+        )
+        expires_at = observation_expiry(
+            now, self.ttl, self.issue_minute, self.issue_delay
+        )
+        with self._lock:
+            if generation == self._generation:
+                self._store_entry(key, (documents, expires_at), to_disk=True)
+        return list(documents)
+
+    def invalidate(self, locations: Optional[set] = None) -> None:
+        """Drops the entries of the locations, or every entry if None."""
+        with self._lock:
+            stale_keys = [
+                key for key in self._entries if locations is None or key[1] in locations
+            ]
+            for key in stale_keys:
+                del self._entries[key]
+            self._generation += 1
+            self._counters["invalidations"] += len(stale_keys)
+            if self._disk:
+                _delete_disk_entries(self._disk, locations)
+
+    def stats(self) -> dict:
+        """Returns the hit, disk hit, miss and invalidation counters."""
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries))
+
+    def _thread_db(self) -> boto3.resources.factory:
+        """Returns the calling thread's resource, created on first use."""
+        db = getattr(self._thread_dbs, "db", None)
+        if db is None:
+            # boto3 clients are thread safe, so the resources share one.
+            db = type(self.db)(client=self.db.meta.client)
+            self._thread_dbs.db = db
+        return db
+
+    def _on_documents_written(self, report_type: str, data_documents: dict) -> None:
+        partition_key = config.load_config("config/data.yml")["dynamodb"]["awws"][
+            report_type
+        ]["partition-key"]
+        self.invalidate(
+            {data_document[partition_key] for data_document in data_documents.values()}
+        )
+
+    def _store_entry(self, key: tuple, entry: tuple, to_disk: bool) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self._disk and to_disk:
+            with self._disk:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO entries "
+                    "(report_type, location, count, documents, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (*key, json.dumps(entry[0], default=float), entry[1]),
+                )
+
+    def _read_disk_entry(self, key: tuple, now: float) -> Optional[tuple]:
+        if not self._disk:
+            return None
+        row = self._disk.execute(
+            "SELECT documents, expires_at FROM entries "
+            "WHERE report_type = ? AND location = ? AND count = ? AND expires_at > ?",
+            (*key, now),
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+
+def observation_expiry(
+    now: float, ttl: float, issue_minute: int = 0, issue_delay: float = 0
+) -> float:
+    """
+    Returns when a cache entry read at now expires: after ttl seconds,
+    or at the next METAR issue time (issue_delay seconds past
+    issue_minute of the hour, UTC) if that comes first.
+    """
+    read_at = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+    next_issue = read_at.replace(
+        minute=issue_minute, second=0, microsecond=0
+    ) + datetime.timedelta(seconds=issue_delay)
+    while next_issue <= read_at:
+        next_issue += datetime.timedelta(hours=1)
+    return min(now + ttl, next_issue.timestamp())
+
+
+def invalidate_disk_tier(
+    report_type: str, data_documents: dict, path: Optional[str] = None
+) -> None:
+    """
+    Drops disk tier entries for the locations of written documents,
+    for writers running in another process than the cache.
+    A database write listener, see disk_tier_invalidation().
+    """
+    cache_config = config.load_config("config/data.yml")["dynamodb"]
+    path = path or cache_config["observation-cache"]["disk-tier"]["path"]
+    if not os.path.exists(path):
+        return
+    partition_key = cache_config["awws"][report_type]["partition-key"]
+    locations = {
+        data_document[partition_key] for data_document in data_documents.values()
+    }
+    disk = _open_disk_tier(path)
+    try:
+        _delete_disk_entries(disk, locations)
+    finally:
+        disk.close()
+
+
+@contextlib.contextmanager
+def disk_tier_invalidation():
+    """
+    Invalidates the observation cache's disk tier for every document
+    written inside the context, if the disk tier is enabled in
+    config/data.yml. Used by the ingestion pipelines.
+    """
+    cache_config = config.load_config("config/data.yml")["dynamodb"][
+        "observation-cache"
+    ]
+    if not cache_config["disk-tier"]["enabled"]:
+        yield
+        return
+    database.add_write_listener(invalidate_disk_tier)
+    try:
+        yield
+    finally:
+        database.remove_write_listener(invalidate_disk_tier)
+
+
+def _open_disk_tier(path: str) -> sqlite3.Connection:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Writers invalidate from their own threads.
+    disk = sqlite3.connect(path, check_same_thread=False)
+    with disk:
+        disk.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "report_type TEXT NOT NULL, location TEXT NOT NULL, "
+            "count INTEGER NOT NULL, documents TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, PRIMARY KEY (report_type, location, count))"
+        )
+    return disk
+
+
+def _delete_disk_entries(disk: sqlite3.Connection, locations: Optional[set]) -> None:
+    with disk:
+        if locations is None:
+            disk.execute("DELETE FROM entries")
+        else:
+            disk.executemany(
+                "DELETE FROM entries WHERE location = ?",
+                [(location,) for location in locations],
+            )
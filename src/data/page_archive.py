@@ -0,0 +1,251 @@
+import datetime
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Iterator, Optional
+
+from src import config
+from src.data.ingestion_index import REQUEST_TIMESTAMP_SPAN
+
+# zstandard is optional, gzip is used when it isn't installed.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Stands in for the request timestamp span in stored pages, which is
+# kept in the index instead so repeated fetches share one object.
+REQUEST_TIMESTAMP_PLACEHOLDER = "<!--propeller:request-timestamp-->"
+ARCHIVE_INDEX_FILENAME = "index.sqlite3"
+
+
+class PageArchive:
+    """
+    A local, content-addressed archive of raw AWWS page sources.
+
+    Each page is stored compressed under the hash of its content with
+    the request timestamp span removed, so a page fetched again with
+    unchanged reports is stored only once. A SQLite index records every
+    fetch by location and fetch time, along with its request timestamp,
+    so the exact original page source can be rebuilt for reprocessing.
+
+    Parameters
+    ----------
+    root : str, optional
+        Directory holding the objects and index,
+        by default the page-archive path in config/data.yml.
+    compression : str, optional
+        "gzip" or "zstd" (needs the zstandard package) for new objects,
+        by default the compression in config/data.yml.
+
+    Examples
+    --------
+    >> with PageArchive() as archive:
+    >>     archive.store(["vancouver"], page_source)
+    >>     for fetch in archive.iter_pages(location="vancouver"):
+    >>         ...
+    """
+
+    def __init__(self, root: Optional[str] = None, compression: Optional[str] = None):
+        archive_config = config.load_config("config/data.yml")["local"]["page-archive"]
+        self.root = root or archive_config["path"]
+        self.compression = compression or archive_config["compression"]
+        if self.compression == "zstd" and zstandard is None:
+            raise ImportError("zstd page archive compression needs zstandard.")
+        if self.compression not in ("gzip", "zstd"):
+            raise ValueError(f"Unknown page archive compression: {self.compression}.")
+
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        self.index_path = os.path.join(self.root, ARCHIVE_INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.index_path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS fetches ("
+                "fetch_id INTEGER PRIMARY KEY, fetched_at TEXT NOT NULL, "
+                "content_hash TEXT NOT NULL, object_path TEXT NOT NULL, "
+                "request_timestamp TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS fetch_locations ("
+                "fetch_id INTEGER NOT NULL REFERENCES fetches, location TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS fetches_by_time ON fetches (fetched_at)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS fetch_locations_by_location "
+                "ON fetch_locations (location, fetch_id)"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def store(
+        self,
+        locations: list,
+        page_source: str,
+        fetched_at: Optional[datetime.datetime] = None,
+    ) -> str:
+        """
+        Archives a fetched page source, writing its object only if
+        no page with the same content has been stored before.
+
+        Parameters
+        ----------
+        locations : list
+            The plain-language locations requested for the page.
+        page_source : str
+            The fetched HTML page source.
+        fetched_at : datetime.datetime, optional
+            When the page was fetched, by default now (UTC).
+
+        Returns
+        -------
+        str
+            The content hash the page is stored under.
+        """
+        fetched_at = fetched_at or datetime.datetime.now(datetime.timezone.utc)
+        timestamp_match = REQUEST_TIMESTAMP_SPAN.search(page_source)
+        request_timestamp = timestamp_match.group(0) if timestamp_match else ""
+        page_template = REQUEST_TIMESTAMP_SPAN.sub(
+            lambda _: REQUEST_TIMESTAMP_PLACEHOLDER, page_source, count=1
+        )
+        content_hash = hashlib.sha256(page_template.encode("utf-8")).hexdigest()
+
+        object_path = self._find_object(content_hash)
+        if object_path is None:
+            object_path = self._write_object(content_hash, page_template)
+        with self._lock, self._connection:
+            fetch_id = self._connection.execute(
+                "INSERT INTO fetches "
+                "(fetched_at, content_hash, object_path, request_timestamp) "
+                "VALUES (?, ?, ?, ?)",
+                (fetched_at.isoformat(), content_hash, object_path, request_timestamp),
+            ).lastrowid
+            self._connection.executemany(
+                "INSERT INTO fetch_locations (fetch_id, location) VALUES (?, ?)",
+                [(fetch_id, location) for location in locations],
+            )
+        return content_hash
+
+    def iter_pages(
+        self,
+        location: Optional[str] = None,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+    ) -> Iterator[dict]:
+        """
+        Streams archived fetches in fetch time order, decompressing one
+        page at a time so the archive is never loaded into memory.
+
+        Parameters
+        ----------
+        location : str, optional
+            Only yield fetches that requested this location.
+        start, end : datetime.datetime, optional
+            Only yield fetches at or after start and before end.
+
+        Yields
+        ------
+        dict
+            "locations", "fetched_at" (ISO string), "content_hash"
+            and the rebuilt "page_source" of each fetch.
+        """
+        conditions, parameters = [], []
+        if location is not None:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM fetch_locations AS requested "
+                "WHERE requested.fetch_id = fetches.fetch_id "
+                "AND requested.location = ?)"
+            )
+            parameters.append(location)
+        if start is not None:
+            conditions.append("fetched_at >= ?")
+            parameters.append(start.isoformat())
+        if end is not None:
+            conditions.append("fetched_at < ?")
+            parameters.append(end.isoformat())
+        where_clause = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+
+        # A separate read connection lets the cursor stream rows lazily
+        # while pages keep being stored through the main connection.
+        read_connection = sqlite3.connect(self.index_path)
+        try:
+            rows = read_connection.execute(
+                "SELECT fetched_at, content_hash, object_path, request_timestamp, "
+                "(SELECT group_concat(location) FROM fetch_locations "
+                "WHERE fetch_locations.fetch_id = fetches.fetch_id) "
+                f"FROM fetches {where_clause}ORDER BY fetched_at, fetch_id",
+                parameters,
+            )
+            for (
+                fetched_at,
+                content_hash,
+                object_path,
+                request_timestamp,
+                locations,
+            ) in rows:
+                page_template = self._read_object(object_path)
+                yield {
+                    "locations": locations.split(",") if locations else [],
+                    "fetched_at": fetched_at,
+                    "content_hash": content_hash,
+                    "page_source": page_template.replace(
+                        REQUEST_TIMESTAMP_PLACEHOLDER, request_timestamp, 1
+                    ),
+                }
+        finally:
+            read_connection.close()
+
+    def _find_object(self, content_hash: str) -> Optional[str]:
+        for suffix in (".gz", ".zst"):
+            object_path = self._object_path(content_hash, suffix)
+            if os.path.exists(os.path.join(self.root, object_path)):
+                return object_path
+        return None
+
+    def _object_path(self, content_hash: str, suffix: str) -> str:
+        return os.path.join("objects", content_hash[:2], content_hash + suffix)
+
+    def _write_object(self, content_hash: str, page_template: str) -> str:
+        page_bytes = page_template.encode("utf-8")
+        if self.compression == "zstd":
+            object_path = self._object_path(content_hash, ".zst")
+            object_bytes = zstandard.ZstdCompressor().compress(page_bytes)
+        else:
+            object_path = self._object_path(content_hash, ".gz")
+            object_bytes = gzip.compress(page_bytes)
+        full_path = os.path.join(self.root, object_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Write then rename, so a crash never leaves a partial object behind.
+        temporary_path = f"{full_path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(object_bytes)
+        os.replace(temporary_path, full_path)
+        return object_path
+
+    def _read_object(self, object_path: str) -> str:
+        full_path = os.path.join(self.root, object_path)
+        if object_path.endswith(".zst"):
+            if zstandard is None:
+                raise ImportError(f"Reading {object_path} needs zstandard.")
+            with open(full_path, "rb") as f:
+                with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                    return reader.read().decode("utf-8")
+        with gzip.open(full_path, "rb") as f:
+            return f.read().decode("utf-8")
+
+
+def is_page_archive(path: str) -> bool:
+    """Checks whether the path is the root of a PageArchive."""
+    return os.path.isfile(os.path.join(path, ARCHIVE_INDEX_FILENAME))
@@ -1,22 +1,60 @@
+import calendar
+import concurrent.futures
+import functools
+import io
 import logging
 import re
-from typing import Literal
+from typing import Literal, Optional, Union
 from datetime import datetime
-import pytz
 
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.core.utils import ChromeType
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-import selenium.webdriver.chrome as chrome
-from bs4 import BeautifulSoup
+from src import config, instrumentation
+from src.data import fetching
+from src.data.driver_pool import WebDriverPool, create_chrome_driver
 
-from src import config
+# selenium, requests, BeautifulSoup, lxml and pytz are imported by the
+# functions using them, so importing this module (eg for parse-only or
+# write-only jobs) doesn't pay for the dependencies a run never touches.
 
 
+_WHITESPACE_RUN = re.compile(r"\s+")
+# Whitespace BeautifulSoup treats as blank when collapsing strings.
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+AWWS_UTC_FORMAT = "%d %B %Y - %H%M %Z"
+_AWWS_UTC_PATTERN = re.compile(
+    r"\s*(?P<day>\d{1,2})\s+(?P<month>[A-Za-z]+)\s+(?P<year>\d{4})\s+-\s+"
+    r"(?P<hour>[01]\d|2[0-3])(?P<minute>[0-5]\d)\s+UTC\s*$"
+)
+_MONTH_NUMBERS = {
+    month_name.lower(): month_number
+    for month_number, month_name in enumerate(calendar.month_name)
+    if month_name
+}
+
+
+class PageSourceScrapeError(Exception):
+    """
+    Raised when some locations (or batches) of a concurrent scrape
+    failed, once the others are scraped.
+
+    Attributes
+    ----------
+    failed_locations : list
+        The locations (or tuples of batched locations) that failed.
+    page_sources : dict
+        The page sources that were scraped, keyed as on success.
+    """
+
+    def __init__(self, failed_locations: list, page_sources: dict):
+        super().__init__(f"Failed to scrape {failed_locations} Web Page Sources.")
+        self.failed_locations = failed_locations
+        self.page_sources = page_sources
+
+
+@instrumentation.timed("scrape")
 def scrape_awws_metar_pagesource(
-    location: Literal["vancouver", "abbotsford"] = "vancouver"
+    location: Union[Literal["vancouver", "abbotsford"], list] = "vancouver",
+    driver=None,
 ) -> str:
     """
     Connect to Aviation Weather Web Site to scrape the METAR - TAF forecasts
@@ -24,10 +62,16 @@ def scrape_awws_metar_pagesource(
 
     Parameters
     ----------
-    location : str, optional
+    location : str or list, optional
         The plain-language location for the airspace data you want to scrape.
         Currently 'vancouver' and 'abbotsford' are supported,
-        by default 'vancouver'.
+        by default 'vancouver'. A list of locations is submitted as a
+        single batched request, to be split with parse_awws_batch_pagesource().
+
+    driver : webdriver.Chrome, optional
+        A running WebDriver to scrape with, ideally leased from a
+        WebDriverPool. If not passed, a new driver is started for
+        this scrape and quit afterwards.
 
     Returns
     -------
@@ -37,27 +81,32 @@ def scrape_awws_metar_pagesource(
     """
     # Get URL from config.
     scraping_yaml_path = "config/scraping.yml"
-    scraping_config = config.read_yaml_from(scraping_yaml_path)
+    scraping_config = config.load_config(scraping_yaml_path)
     logging.debug(f"{scraping_config=}")
     awws_config = scraping_config["awws"]["metar-taf"]
-    location_config = awws_config["locations"][location]
-    location_code = location_config["code"]
-
-    # Setup Selenium Chrome Driver
-    chrome_options = chrome.options.Options()
-    chrome_options.add_argument("--headless")
-    chrome_service = chrome.service.Service(
-        ChromeDriverManager(
-            version="108.0.5359.71", chrome_type=ChromeType.CHROMIUM
-        ).install()
-    )
-    driver = webdriver.Chrome(
-        service=chrome_service,
-        options=chrome_options,
-    )
+    location_code = fetching.station_codes_for(location, awws_config)
+
+    # Setup Selenium Chrome Driver if one isn't lent to us.
+    if driver is None:
+        driver = create_chrome_driver()
+        try:
+            return _navigate_awws_metar_page(driver, awws_config["url"], location_code)
+        finally:
+            driver.quit()
+    return _navigate_awws_metar_page(driver, awws_config["url"], location_code)
+
+
+@instrumentation.timed("page-load")
+def _navigate_awws_metar_page(driver, url: str, location_code: str) -> str:
+    """
+    Drives the WebDriver through the AWWS manual entry form
+    for the station code and returns the report page source.
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
 
     # Navigate to report page.
-    driver.get(awws_config["url"])
+    driver.get(url)
     manual_page_button = driver.find_element(
         By.LINK_TEXT, "Manual Entry / Change Region"
     )
@@ -72,13 +121,223 @@ def scrape_awws_metar_pagesource(
     logging.debug("Navigated to Plain-Text Weather Report")
 
     # Scrape Report Data Page Source
-    return driver.page_source
+    page_source = driver.page_source
+    if instrumentation.is_enabled():
+        instrumentation.count("bytes-fetched", len(page_source.encode("utf-8")))
+    return page_source
+
+
+def get_awws_metar_pagesource(
+    location: Union[Literal["vancouver", "abbotsford"], list] = "vancouver",
+    pool: Optional[WebDriverPool] = None,
+) -> str:
+    """
+    Gets the METAR - TAF page source for the given location, fetching it
+    over plain HTTP when enabled in config/scraping.yml and falling back
+    to a Selenium scrape if the HTTP fetch fails.
+
+    Parameters
+    ----------
+    location : str or list, optional
+        The plain-language location for the airspace data you want to scrape.
+        Currently 'vancouver' and 'abbotsford' are supported,
+        by default 'vancouver'. A list of locations is fetched as one batch.
+
+    pool : WebDriverPool, optional
+        A pool to lease a driver from for the Selenium path. If not passed,
+        a new driver is started only when it is needed.
+
+    Returns
+    -------
+    str
+        A string representing the entire HTML webpage containing the scraped data.
+    """
+    http_config = config.load_config("config/scraping.yml")["http"]
+    if http_config["enabled"]:
+        import requests
+
+        try:
+            return fetching.fetch_awws_metar_pagesource(location)
+        except (requests.RequestException, ValueError):
+            if not http_config["fallback-to-selenium"]:
+                raise
+            logging.warning(
+                f"HTTP fetch failed for {location}, falling back to Selenium.",
+                exc_info=True,
+            )
+
+    if pool is None:
+        return scrape_awws_metar_pagesource(location)
+    with pool.lease() as driver:
+        return scrape_awws_metar_pagesource(location, driver=driver)
+
+
+def scrape_awws_metar_pagesources(
+    locations: Optional[list] = None,
+    max_workers: Optional[int] = None,
+    pool: Optional[WebDriverPool] = None,
+) -> dict:
+    """
+    Concurrently scrapes the METAR - TAF page source for many locations
+    with get_awws_metar_pagesource(), reusing warm drivers from a
+    WebDriverPool between locations when Selenium is needed.
+
+    Parameters
+    ----------
+    locations : list, optional
+        Plain-language locations from config/scraping.yml to scrape,
+        by default every configured location.
+
+    max_workers : int, optional
+        Number of locations to scrape at once,
+        by default the pool size in config/scraping.yml.
+
+    pool : WebDriverPool, optional
+        A pool to lease drivers from. If not passed, a pool is created
+        for this call and closed afterwards.
+
+    Returns
+    -------
+    dict
+        Page sources keyed by location.
+
+    Raises
+    ------
+    PageSourceScrapeError
+        If any location failed to scrape, with the failed locations
+        and the page sources of the others.
+    """
+    if locations is None:
+        locations = list(
+            config.load_config("config/scraping.yml")["awws"]["metar-taf"]["locations"]
+        )
+    return _get_pagesources_concurrently(locations, max_workers, pool)
+
+
+def scrape_awws_metar_batch_pagesources(
+    locations: Optional[list] = None,
+    batch_size: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    pool: Optional[WebDriverPool] = None,
+) -> dict:
+    """
+    Concurrently scrapes the METAR - TAF page source for many locations,
+    submitting several station codes per request to cut round-trips.
+
+    Parameters
+    ----------
+    locations : list, optional
+        Plain-language locations from config/scraping.yml to scrape,
+        by default every configured location.
+
+    batch_size : int, optional
+        Number of locations submitted per request,
+        by default the batch size in config/scraping.yml.
+
+    max_workers : int, optional
+        Number of batches to scrape at once,
+        by default the pool size in config/scraping.yml.
+
+    pool : WebDriverPool, optional
+        A pool to lease drivers from. If not passed, a pool is created
+        for this call and closed afterwards.
+
+    Returns
+    -------
+    dict
+        Combined page sources keyed by the tuple of locations in each batch,
+        to be split with parse_awws_batch_pagesource().
+
+    Raises
+    ------
+    PageSourceScrapeError
+        If any batch failed to scrape, with the failed batches
+        and the page sources of the others.
+    """
+    batches = batch_locations(locations, batch_size)
+    return _get_pagesources_concurrently(batches, max_workers, pool)
+
+
+def batch_locations(
+    locations: Optional[list] = None, batch_size: Optional[int] = None
+) -> list:
+    """
+    Splits locations into the batches submitted together in one page request.
+
+    Parameters
+    ----------
+    locations : list, optional
+        Plain-language locations from config/scraping.yml,
+        by default every configured location.
+
+    batch_size : int, optional
+        Number of locations per batch,
+        by default the batch size in config/scraping.yml.
+
+    Returns
+    -------
+    list
+        Tuples of locations, in their original order.
+    """
+    awws_config = config.load_config("config/scraping.yml")["awws"]["metar-taf"]
+    if locations is None:
+        locations = list(awws_config["locations"])
+    if batch_size is None:
+        batch_size = awws_config["batch-size"]
+    batches = []
+    for start in range(0, len(locations), batch_size):
+        stop = start + batch_size
+        batches.append(tuple(locations[start:stop]))
+    return batches
+
+
+def _get_pagesources_concurrently(
+    requested: list, max_workers: Optional[int], pool: Optional[WebDriverPool]
+) -> dict:
+    """
+    Runs get_awws_metar_pagesource() for each location (or tuple of
+    locations) on a thread pool, sharing one WebDriverPool between them,
+    raising PageSourceScrapeError once all are done if any failed.
+    """
+    if max_workers is None:
+        max_workers = config.load_config("config/scraping.yml")["selenium"]["pool-size"]
+
+    owns_pool = pool is None
+    if owns_pool:
+        pool = WebDriverPool(size=max_workers)
+
+    page_sources = {}
+    failed_locations = []
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    get_awws_metar_pagesource,
+                    list(location) if isinstance(location, tuple) else location,
+                    pool,
+                ): location
+                for location in requested
+            }
+            for future in concurrent.futures.as_completed(futures):
+                location = futures[future]
+                try:
+                    page_sources[location] = future.result()
+                    logging.info(f"Scraped {location} Web Page Source.")
+                except Exception:
+                    logging.exception(f"Failed to scrape {location} Web Page Source.")
+                    failed_locations.append(location)
+    finally:
+        if owns_pool:
+            pool.close()
+    if failed_locations:
+        raise PageSourceScrapeError(failed_locations, page_sources)
+    return page_sources
 
 
 def format_utc_datetime(
     utc_string: str,
     target_timezone: str = None,
-    format_string: str = "%d %B %Y - %H%M %Z",
+    format_string: str = AWWS_UTC_FORMAT,
 ) -> str:
     """
     Transforms the string representation of a UTC datetime
@@ -118,10 +377,96 @@ def format_utc_datetime(
     2022-10-27 20:00 PDT
 
     """
-    new_datetime = datetime.strptime(utc_string, format_string)
+    # Converted strings are memoized, as the same report times repeat
+    # across the tables of a page and across hourly reruns.
+    return _convert_utc_datetime(utc_string, target_timezone, format_string)
+
+
+def sort_key_utc_datetime(
+    sort_key_datetime: str, target_timezone: str = "America/Vancouver"
+) -> Optional[datetime]:
+    """
+    Reverses format_utc_datetime(), turning a document's sort key
+    datetime in the target timezone back into an aware UTC datetime.
+
+    Parameters
+    ----------
+    sort_key_datetime : str
+        A datetime string in the format "YYYY-MM-DD HH:MM Z",
+        eg "2022-10-19 21:00 PDT".
+
+    target_timezone : str
+        The timezone the string was formatted in,
+        by default "America/Vancouver" as for document sort keys.
+
+    Returns
+    -------
+    datetime, optional
+        The UTC datetime, or None if the zone name doesn't
+        belong to the timezone at that time.
+    """
+    import pytz
+
+    local_time, _, zone_name = sort_key_datetime.rpartition(" ")
+    naive_datetime = datetime.strptime(local_time, "%Y-%m-%d %H:%M")
+    local_tz = _get_timezone(target_timezone)
+    # The zone name tells apart the hour repeated when DST ends.
+    for is_dst in (True, False):
+        aware_datetime = local_tz.localize(naive_datetime, is_dst=is_dst)
+        if aware_datetime.strftime("%Z") == zone_name:
+            return aware_datetime.astimezone(pytz.utc)
+    return None
+
+
+def format_utc_datetimes(
+    utc_strings: list,
+    target_timezone: str = None,
+    format_string: str = AWWS_UTC_FORMAT,
+) -> list:
+    """
+    Transforms many string representations of UTC datetimes at once,
+    converting each distinct string only once. Useful for backfills.
+
+    Parameters
+    ----------
+    utc_strings : list
+        String representations of UTC datetimes,
+        similar to those scraped from the AWWS pagesource.
+
+    target_timezone : str
+        A string representing a timezone from the pytz package,
+        by default None (UTC). See format_utc_datetime().
+
+    format_string : str
+        The format of the expected UTC strings to read,
+        by default the AWWS weather report format.
+
+    Returns
+    -------
+    list
+        The datetime strings in the format "YYYY-MM-DD HH:MM Z",
+        in the same order as utc_strings.
+    """
+    converted_strings = {
+        utc_string: _convert_utc_datetime(utc_string, target_timezone, format_string)
+        for utc_string in set(utc_strings)
+    }
+    return [converted_strings[utc_string] for utc_string in utc_strings]
+
+
+@functools.lru_cache(maxsize=4096)
+def _convert_utc_datetime(
+    utc_string: str, target_timezone: Optional[str], format_string: str
+) -> str:
+    if format_string == AWWS_UTC_FORMAT:
+        new_datetime = _parse_awws_utc_string(utc_string)
+    else:
+        new_datetime = datetime.strptime(utc_string, format_string)
+    import pytz
+
     aware_datetime = pytz.utc.localize(new_datetime)
     if target_timezone:
-        local_tz = pytz.timezone(target_timezone)
+        local_tz = _get_timezone(target_timezone)
         aware_datetime = local_tz.normalize(
             aware_datetime.replace(tzinfo=pytz.utc).astimezone(tz=local_tz)
         )
@@ -129,8 +474,35 @@ def format_utc_datetime(
     return new_datetime_string
 
 
+@functools.lru_cache(maxsize=None)
+def _get_timezone(timezone_name: str):
+    import pytz
+
+    return pytz.timezone(timezone_name)
+
+
+def _parse_awws_utc_string(utc_string: str) -> datetime:
+    """
+    Parses the fixed AWWS "d MONTH YYYY - HHMM UTC" layout with a
+    precompiled pattern, falling back to strptime for anything else.
+    """
+    match = _AWWS_UTC_PATTERN.match(utc_string)
+    if match is None or match["month"].lower() not in _MONTH_NUMBERS:
+        return datetime.strptime(utc_string, AWWS_UTC_FORMAT)
+    return datetime(
+        int(match["year"]),
+        _MONTH_NUMBERS[match["month"].lower()],
+        int(match["day"]),
+        int(match["hour"]),
+        int(match["minute"]),
+    )
+
+
+@instrumentation.timed("parse")
 def parse_awws_pagesource(
-    source: str, awws_report: Literal["metar-taf"] = "metar-taf"
+    source: str,
+    awws_report: Literal["metar-taf"] = "metar-taf",
+    parser: Optional[Literal["streaming", "soup"]] = None,
 ) -> dict:
     """
     Parses the page source of expected METAR web page for data.
@@ -150,57 +522,141 @@ def parse_awws_pagesource(
         in the config files.
         "metar-taf" by default.
 
+    parser: Literal["streaming", "soup"], optional
+        "streaming" makes a single lxml iterparse pass over only the
+        report tables and timestamp span, "soup" builds the full
+        BeautifulSoup tree. Both produce identical documents.
+        By default the parser set in config/scraping.yml.
+
     Returns
     -------
     dict
         Organized dictionary of weather data from web page.
     """
-    known_fields = config.read_yaml_from("config/scraping.yml")["awws"][awws_report][
-        "known-fields"
+    if parser is None:
+        parser = config.load_config("config/scraping.yml")["awws"][awws_report][
+            "parser"
+        ]
+    if parser == "streaming":
+        timestamp, tables = _extract_awws_tables_streaming(source)
+    elif parser == "soup":
+        timestamp, tables = _extract_awws_tables_soup(source)
+    else:
+        raise ValueError(f"Unknown AWWS page parser: {parser}.")
+    return _build_awws_page_data(timestamp, tables, awws_report)
+
+
+def _extract_awws_tables_soup(source: str) -> tuple:
+    """
+    Extracts the request timestamp and the text of every cell of each
+    report table from a full BeautifulSoup tree of the page.
+    """
+    from bs4 import BeautifulSoup
+
+    page = BeautifulSoup(source, "lxml")
+    timestamp = page.find_all("span", class_="corps")[0].find("b").text
+    tables = [
+        [table_item.text for table_item in table.find_all("td")]
+        for table in page.find_all("table", {"width": "665"})
     ]
+    return timestamp, tables
+
+
+def _extract_awws_tables_streaming(source: str) -> tuple:
+    """
+    Extracts the request timestamp and the text of every cell of each
+    report table in a single lxml iterparse pass, clearing each report
+    table once read instead of keeping the whole tree.
+    """
+    from lxml import etree
+
+    timestamp = None
+    tables = []
+    page_events = etree.iterparse(
+        io.BytesIO(source.encode("utf-8")),
+        events=("end",),
+        tag=("span", "table"),
+        html=True,
+        encoding="utf-8",
+    )
+    for _, element in page_events:
+        if element.tag == "span":
+            if timestamp is None and "corps" in element.get("class", "").split():
+                timestamp = _soup_text(next(element.iter("b")))
+        elif element.get("width") == "665":
+            tables.append([_soup_text(table_item) for table_item in element.iter("td")])
+            if not any(
+                ancestor.get("width") == "665"
+                for ancestor in element.iterancestors("table")
+            ):
+                element.clear(keep_tail=True)
+    if timestamp is None:
+        raise IndexError("No request timestamp found in AWWS page source.")
+    return timestamp, tables
+
+
+def _soup_text(element) -> str:
+    """
+    Joins the text under an lxml element the way BeautifulSoup's .text
+    does, which collapses whitespace-only strings to a newline or space.
+    """
+    text_parts = []
+    for text in element.itertext():
+        if not text.strip(_ASCII_SPACES):
+            text = "\n" if "\n" in text else " "
+        text_parts.append(text)
+    return "".join(text_parts)
+
+
+def _build_awws_page_data(timestamp: str, tables: list, awws_report: str) -> dict:
+    """
+    Organizes the extracted cell text of each report table into
+    data documents, matching field labels against the known fields.
+    """
+    known_fields = config.known_fields(awws_report)
+    debug_logging = logging.getLogger().isEnabledFor(logging.DEBUG)
     page_data = {}
 
     # Get Timestamp to add to each table.
-    page = BeautifulSoup(source, "lxml")
-    timestamp = page.find_all("span", class_="corps")[0].find("b").text
     clean_timestamp = timestamp.replace("at ", "").replace(" UTC", "").strip()
 
     # Process each table on the Page and add to dictionary.
     # For each, parse the table values and match them
     # against passed in known fields.
-    tables = page.find_all("table", {"width": "665"})
-    for table_number, table in enumerate(tables):
+    for table_number, table_items in enumerate(tables):
         table_data = {}
         table_data["report_timestamp"] = clean_timestamp
         table_data["report"] = awws_report
 
-        table_items = table.find_all("td")
-        for item_number, table_item in enumerate(table_items):
+        for item_number, table_item_text in enumerate(table_items):
             # Clean values slightly while removing the first of the
             # text rows as the field label.
-            field_values = table_item.text.strip().replace("\xa0", " ").split("\n")
+            field_values = table_item_text.strip().replace("\xa0", " ").split("\n")
             field_item = field_values.pop(0).lower()
 
             # Handle full encoded report (always first item) as
             # proper encoded capital letters.
             if item_number == 0:
-                logging.debug(f"Encoded Report Matched: {field_item.upper()}.")
+                if debug_logging:
+                    logging.debug(f"Encoded Report Matched: {field_item.upper()}.")
                 table_data["encodedreport"] = field_item.upper().strip()
 
             # Match known field items,
             # and handle missing/messy field values.
             if field_item in known_fields:
-                logging.debug(f"Item Matched: {field_item}")
+                if debug_logging:
+                    logging.debug(f"Item Matched: {field_item}")
                 if field_values:
-                    logging.debug(f"Following Field Value: {field_values}")
+                    if debug_logging:
+                        logging.debug(f"Following Field Value: {field_values}")
                     cleaned_field_values = [
-                        re.sub(r"\s+", " ", value.strip())
+                        _WHITESPACE_RUN.sub(" ", value.strip())
                         for value in field_values
                         if value
                     ]
                     # Leaving as list, even for single elements.
                     table_data[field_item] = cleaned_field_values
-                else:
+                elif debug_logging:
                     logging.debug(f"No field value for {field_item}.")
 
         # Clean up the location for reports to use as Partition Key
@@ -214,6 +670,61 @@ def parse_awws_pagesource(
             table_data["datetime"] = format_utc_datetime(
                 table_data["date - time"][0], target_timezone="America/Vancouver"
             )
-            table_data["date - time"].pop
+            # Documents keep the "date - time" list too, compact
+            # DynamoDB items drop it (see item_codec.py).
         page_data[table_number] = table_data
     return page_data
+
+
+def parse_awws_batch_pagesource(
+    source: str, locations: list, awws_report: Literal["metar-taf"] = "metar-taf"
+) -> dict:
+    """
+    Parses the page source of a batched METAR web page (several station
+    codes submitted at once) and splits the tables back into per-location
+    documents.
+
+    Parameters
+    ----------
+    source : str
+        HTML page source string of the AWWS METAR page,
+        ideally generated with scrape_awws_metar_batch_pagesources().
+
+    locations : list
+        The plain-language locations from config/scraping.yml
+        that were submitted for this page.
+
+    awws_report: Literal["metar-taf"]
+        The type of AWWS report the page source is for.
+        "metar-taf" by default.
+
+    Returns
+    -------
+    dict
+        Dictionary keyed by location, where each value is organized
+        like the output of parse_awws_pagesource() for that location alone.
+    """
+    station_codes = config.station_codes(awws_report)
+    code_locations = {station_codes[location]: location for location in locations}
+    location_data = {location: {} for location in locations}
+
+    # Each table names its station in the location field ("CYVR - ...")
+    # and in the encoded report ("METAR CYVR ..."), so use either to
+    # find the location it belongs to.
+    for table_data in parse_awws_pagesource(source, awws_report).values():
+        station_tokens = table_data.get("encodedreport", "").split()
+        if "location" in table_data:
+            station_tokens.insert(0, table_data["location"].split(" - ")[0])
+        location = next(
+            (code_locations[code] for code in station_tokens if code in code_locations),
+            None,
+        )
+        if location is None:
+            logging.warning(
+                "AWWS table skipped because it matches none of the "
+                f"requested stations: {list(code_locations)}."
+            )
+            continue
+        page_data = location_data[location]
+        page_data[len(page_data)] = table_data
+    return location_data
@@ -0,0 +1,446 @@
+import atexit
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import src.data.database as database
+from src import config
+from src.data import observation_cache
+from src.data.ingestion_index import IngestionIndex
+
+
+SEALED_SUFFIX = ".jsonl"
+OPEN_SUFFIX = ".open"
+# A segment is created (and locked) under this suffix, then renamed open.
+CREATING_SUFFIX = ".creating"
+FLUSH_LOCK_FILENAME = "flush.lock"
+DEAD_LETTER_DIRNAME = "dead-letter"
+# DynamoDB error codes worth retrying a segment for indefinitely.
+_TRANSIENT_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "InternalServerError",
+    "ServiceUnavailable",
+}
+
+# The process-wide spool, see get_write_spool().
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def _forget_spool_in_child() -> None:
+    # The flusher thread doesn't survive a fork, and the parent keeps
+    # appending to its own open segment.
+    global _spool, _spool_lock
+    _spool = None
+    _spool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_spool_in_child)
+
+
+class WriteSpool:
+    """
+    A durable local write-behind log of AWWS documents waiting to be
+    written to DynamoDB, so ingestion never waits on (or loses documents
+    to) a slow, throttled or unreachable database.
+
+    Appended batches go to an open JSONL segment, fsynced once per
+    batch. Segments are sealed when they grow past segment_bytes or when
+    flushed, and a flusher writes sealed segments to DynamoDB in bulk,
+    oldest first, deleting each once all of its documents are written.
+    Unwritten segments stay on disk for the next flush, even across
+    crashes, and segments left open by a dead process are sealed on start
+    (a process holds a lock on its open segment, so a new process reusing
+    a dead one's PID can't mistake the segment for its own). A segment
+    DynamoDB keeps rejecting (not merely throttling or unreachable) is
+    moved to the dead-letter directory after max-attempts flushes, with
+    the error beside it, so later segments aren't stuck behind it, and
+    its documents are forgotten by the ingestion index so the next
+    ingestion run writes them again.
+    Several processes may share a spool directory, one flushing at a time.
+
+    Parameters
+    ----------
+    path : str, optional
+        Directory holding the segments,
+        by default the write-spool path in config/data.yml.
+    segment_bytes : int, optional
+        Size past which the open segment is sealed,
+        by default the segment-bytes in config/data.yml.
+    flush_interval : float, optional
+        Seconds between background flushes, by default the flush-interval
+        in config/data.yml. Failed flushes back off up to max-backoff.
+    ingestion_index_path : str, optional
+        Path of the IngestionIndex that forgets dead-lettered documents,
+        by default the ingestion-index path in config/data.yml.
+
+    Examples
+    --------
+    >> with WriteSpool() as spool:
+    >>     spool.start()
+    >>     spool.append(page_data)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        segment_bytes: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        ingestion_index_path: Optional[str] = None,
+    ):
+        local_config = config.load_config("config/data.yml")["local"]
+        spool_config = local_config["write-spool"]
+        self.path = path or spool_config["path"]
+        self.segment_bytes = segment_bytes or spool_config["segment-bytes"]
+        self.flush_interval = flush_interval or spool_config["flush-interval"]
+        self.max_backoff = spool_config["max-backoff"]
+        self.max_attempts = spool_config["max-attempts"]
+        self.dead_letter_path = os.path.join(self.path, DEAD_LETTER_DIRNAME)
+        self.ingestion_index_path = (
+            ingestion_index_path or local_config["ingestion-index"]
+        )
+        os.makedirs(self.path, exist_ok=True)
+
+        # Guards the open segment; _flush_lock allows one flush at a time.
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._segment = None
+        self._segment_path = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher = None
+        # Rejected flush attempts of each sealed segment, in this process.
+        self._failed_attempts = {}
+        self._seal_abandoned_segments()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, data_documents: dict, write_mode: Optional[str] = None) -> None:
+        """
+        Durably appends a batch of documents, returning once it is on disk.
+
+        Parameters
+        ----------
+        data_documents : dict
+            Documents to write, eg a location's page data.
+        write_mode : Literal["batch", "conditional"], optional
+            Writer the flusher uses for the batch, see
+            database.get_awws_document_writer(). By default the
+            write-mode in config/data.yml.
+        """
+        if not data_documents:
+            return
+        if write_mode is None:
+            write_mode = config.load_config("config/data.yml")["dynamodb"]["write-mode"]
+        line = json.dumps(
+            {"write-mode": write_mode, "documents": list(data_documents.values())},
+            default=float,
+        )
+        with self._lock:
+            if self._segment is None:
+                self._open_segment()
+            self._segment.write(line + "\n")
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            if self._segment.tell() >= self.segment_bytes:
+                self._seal_segment()
+                self._wake.set()
+
+    def pending_segments(self) -> list:
+        """Returns the paths of the sealed segments, oldest first."""
+        return sorted(
+            os.path.join(self.path, filename)
+            for filename in os.listdir(self.path)
+            if filename.endswith(SEALED_SUFFIX)
+        )
+
+    def flush(self) -> dict:
+        """
+        Seals the open segment and writes the sealed segments to DynamoDB,
+        oldest first, deleting each once all of its documents are written.
+        Stops at the first segment with unprocessed documents, leaving it
+        and later segments for the next flush. A segment rejected for the
+        max-attempts time is dead-lettered and the flush goes on.
+
+        Returns
+        -------
+        dict
+            Counts of "segments" and "documents" flushed, segments
+            "dead-lettered", and segments still "pending" (all of them
+            if another process is flushing).
+        """
+        flush_counts = {"segments": 0, "documents": 0, "dead-lettered": 0, "pending": 0}
+        with self._flush_lock, _flush_lock_file(self.path) as locked:
+            with self._lock:
+                self._seal_segment()
+            segment_paths = self.pending_segments()
+            if not locked:
+                flush_counts["pending"] = len(segment_paths)
+                return flush_counts
+            for segment_number, segment_path in enumerate(segment_paths):
+                try:
+                    document_count = self._write_segment(segment_path)
+                except Exception as error:
+                    if _is_transient_error(error) or not self._dead_letter(
+                        segment_path, error
+                    ):
+                        raise
+                    flush_counts["dead-lettered"] += 1
+                    continue
+                if document_count is None:
+                    flush_counts["pending"] = len(segment_paths) - segment_number
+                    break
+                os.remove(segment_path)
+                self._failed_attempts.pop(segment_path, None)
+                flush_counts["segments"] += 1
+                flush_counts["documents"] += document_count
+        if flush_counts["segments"] or flush_counts["dead-lettered"]:
+            logging.info(f"Flushed write spool to DynamoDB: {flush_counts}.")
+        return flush_counts
+
+    def start(self) -> None:
+        """Starts flushing in a background thread, if not already."""
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_continuously,
+                    name="write-spool-flusher",
+                    daemon=True,
+                )
+                self._flusher.start()
+
+    def close(self) -> None:
+        """
+        Stops the background flusher and makes a last flush. Documents
+        that can't be written yet stay in sealed segments on disk.
+        """
+        self._stopped.set()
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        try:
+            self.flush()
+        except Exception:
+            logging.exception("Final write spool flush failed, kept on disk.")
+        with self._lock:
+            self._seal_segment()
+
+    def _flush_continuously(self) -> None:
+        wait = self.flush_interval
+        while not self._stopped.is_set():
+            self._wake.wait(wait)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                flush_counts = self.flush()
+            except Exception:
+                logging.exception("Write spool flush failed, retrying later.")
+                flush_counts = None
+            if flush_counts is None or flush_counts["pending"]:
+                wait = min(wait * 2, self.max_backoff)
+            else:
+                wait = self.flush_interval
+
+    def _write_segment(self, segment_path: str) -> Optional[int]:
+        """
+        Writes a segment's documents, each run of batches with the same
+        write mode in one writer call. Returns the number of documents
+        written, or None if any were left unprocessed.
+        """
+        document_count = 0
+        with database.dynamodb_connection() as db, (
+            observation_cache.disk_tier_invalidation()
+        ):
+            for write_mode, documents in _read_segment(segment_path):
+                write_documents = database.get_awws_document_writer(write_mode)
+                write_counts = write_documents(db, dict(enumerate(documents)))
+                if write_counts and write_counts.get("unprocessed"):
+                    logging.warning(
+                        f"Write spool segment {segment_path} left unprocessed "
+                        f"documents: {write_counts}."
+                    )
+                    return None
+                document_count += len(documents)
+        return document_count
+
+    def _dead_letter(self, segment_path: str, error: Exception) -> bool:
+        """
+        Counts a rejected attempt to write a segment, moving it to the
+        dead-letter directory (with the error in a .error file beside
+        it) on the max-attempts one. Returns whether it was moved.
+        """
+        attempts = self._failed_attempts.get(segment_path, 0) + 1
+        self._failed_attempts[segment_path] = attempts
+        if attempts < self.max_attempts:
+            return False
+        # The pipeline marked the documents written when they were spooled.
+        with IngestionIndex(self.ingestion_index_path) as index:
+            for _, documents in _read_segment(segment_path):
+                index.forget_documents(dict(enumerate(documents)))
+        os.makedirs(self.dead_letter_path, exist_ok=True)
+        dead_letter_path = os.path.join(
+            self.dead_letter_path, os.path.basename(segment_path)
+        )
+        with open(dead_letter_path + ".error", "w") as f:
+            f.write(f"{error!r}\n")
+        os.replace(segment_path, dead_letter_path)
+        _fsync_directory(self.dead_letter_path)
+        _fsync_directory(self.path)
+        del self._failed_attempts[segment_path]
+        logging.error(
+            f"Moved write spool segment {segment_path} to {self.dead_letter_path} "
+            f"after {attempts} rejected attempts: {error!r}."
+        )
+        return True
+
+    def _open_segment(self) -> None:
+        # Named by creation time, then process, so names sort oldest first
+        # and never clash between processes sharing the spool. The segment
+        # is locked before it appears as open, and stays locked until
+        # sealed (or the process dies), marking it as in use.
+        segment_path = os.path.join(self.path, f"{time.time_ns():020d}-{os.getpid()}")
+        self._segment = open(segment_path + CREATING_SUFFIX, "a")
+        fcntl.flock(self._segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._segment_path = segment_path + OPEN_SUFFIX
+        os.replace(segment_path + CREATING_SUFFIX, self._segment_path)
+        _fsync_directory(self.path)
+
+    def _seal_segment(self) -> None:
+        if self._segment is None:
+            return
+        self._segment.close()
+        if os.path.getsize(self._segment_path):
+            os.replace(
+                self._segment_path,
+                self._segment_path[: -len(OPEN_SUFFIX)] + SEALED_SUFFIX,
+            )
+        else:
+            os.remove(self._segment_path)
+        _fsync_directory(self.path)
+        self._segment = None
+        self._segment_path = None
+
+    def _seal_abandoned_segments(self) -> None:
+        for filename in os.listdir(self.path):
+            if not filename.endswith((OPEN_SUFFIX, CREATING_SUFFIX)):
+                continue
+            segment_path = os.path.join(self.path, filename)
+            try:
+                segment = open(segment_path, "a")
+            except FileNotFoundError:
+                continue  # Sealed or renamed open meanwhile.
+            with segment:
+                try:
+                    fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # Still being appended to.
+                if not os.path.exists(segment_path):
+                    continue
+                if filename.endswith(CREATING_SUFFIX):
+                    # Left before anything was appended.
+                    os.remove(segment_path)
+                    continue
+                os.replace(
+                    segment_path, segment_path[: -len(OPEN_SUFFIX)] + SEALED_SUFFIX
+                )
+            logging.info(f"Sealed write spool segment {filename} left open.")
+        _fsync_directory(self.path)
+
+
+def get_write_spool() -> WriteSpool:
+    """
+    Returns the process-wide write spool, creating it and starting its
+    background flusher on first use. It is closed (with a last flush)
+    when the process exits.
+    """
+    global _spool
+    with _spool_lock:
+        if _spool is None:
+            _spool = WriteSpool()
+            _spool.start()
+            atexit.register(_spool.close)
+        return _spool
+
+
+def _read_segment(segment_path: str) -> list:
+    """
+    Reads a segment's batches, merging consecutive batches with the same
+    write mode, as [(write_mode, documents)]. A line torn by a crash
+    mid-append (only ever the last) is skipped.
+    """
+    batches = []
+    with open(segment_path) as f:
+        for line in f:
+            try:
+                batch = json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipped torn line in {segment_path}.")
+                continue
+            if batches and batches[-1][0] == batch["write-mode"]:
+                batches[-1][1].extend(batch["documents"])
+            else:
+                batches.append((batch["write-mode"], batch["documents"]))
+    return batches
+
+
+@contextlib.contextmanager
+def _flush_lock_file(path: str):
+    """Yields whether this process holds the spool's flush lock."""
+    with open(os.path.join(path, FLUSH_LOCK_FILENAME), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _is_transient_error(error: Exception) -> bool:
+    """
+    Checks whether a failed write is worth retrying indefinitely: an
+    unreachable or throttling DynamoDB, rather than a rejected request.
+    """
+    import botocore.exceptions
+
+    if isinstance(
+        error,
+        (
+            ConnectionError,
+            TimeoutError,
+            botocore.exceptions.ConnectionError,
+            botocore.exceptions.HTTPClientError,
+        ),
+    ):
+        return True
+    if isinstance(error, botocore.exceptions.ClientError):
+        error_response = error.response
+        return (
+            error_response.get("Error", {}).get("Code") in _TRANSIENT_ERROR_CODES
+            or error_response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+            >= 500
+        )
+    return False
+
+
+def _fsync_directory(path: str) -> None:
+    # Makes created, renamed and removed segments survive a crash.
+    directory = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
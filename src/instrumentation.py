@@ -0,0 +1,295 @@
+import bisect
+import contextlib
+import datetime
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from src import config
+
+
+# The metrics of the run being recorded, or None while disabled,
+# in which case every timer and counter returns straight away.
+_run_metrics = None
+_DISABLED_TIMER = contextlib.nullcontext()
+
+
+def _stop_recording_in_child() -> None:
+    # Forked worker processes (eg parsing pools) can't report back to
+    # the parent's metrics, and may have copied its lock while held.
+    global _run_metrics
+    _run_metrics = None
+
+
+os.register_at_fork(after_in_child=_stop_recording_in_child)
+
+
+class RunMetrics:
+    """
+    Stage latency histograms and counters recorded over one run.
+
+    Parameters
+    ----------
+    buckets : list, optional
+        Upper bounds (seconds) of the latency histogram buckets,
+        by default the buckets in config/ingestion.yml.
+    """
+
+    def __init__(self, buckets: Optional[list] = None):
+        instrumentation_config = config.load_config("config/ingestion.yml")[
+            "instrumentation"
+        ]
+        self.buckets = sorted(buckets or instrumentation_config["buckets"])
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self._started = time.perf_counter()
+        self._finished = None
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Records one stage latency."""
+        with self._lock:
+            stage_metrics = self._stages.get(stage)
+            if stage_metrics is None:
+                stage_metrics = self._stages[stage] = {
+                    "count": 0,
+                    "total-seconds": 0.0,
+                    "max-seconds": 0.0,
+                    # One count per bucket, plus the +Inf bucket.
+                    "bucket-counts": [0] * (len(self.buckets) + 1),
+                }
+            stage_metrics["count"] += 1
+            stage_metrics["total-seconds"] += seconds
+            stage_metrics["max-seconds"] = max(stage_metrics["max-seconds"], seconds)
+            stage_metrics["bucket-counts"][
+                bisect.bisect_left(self.buckets, seconds)
+            ] += 1
+
+    def count(self, counter: str, amount: float = 1) -> None:
+        """Adds to a counter, eg "bytes-fetched" or "db-retries"."""
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def finish(self) -> None:
+        """Stops the run's clock, for the throughput in report()."""
+        self._finished = time.perf_counter()
+
+    def report(self) -> dict:
+        """
+        Summarizes the run as a JSON-serializable dictionary.
+
+        Returns
+        -------
+        dict
+            "started-at", "duration-seconds", "counters", per-stage
+            "stages" (count, total, mean and max seconds, and cumulative
+            "buckets" keyed by upper bound) and "documents-per-second"
+            written over the run.
+        """
+        duration = (self._finished or time.perf_counter()) - self._started
+        with self._lock:
+            stages = {}
+            for stage, stage_metrics in self._stages.items():
+                cumulative_counts, running_count = {}, 0
+                bucket_bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+                for bound, bucket_count in zip(
+                    bucket_bounds, stage_metrics["bucket-counts"]
+                ):
+                    running_count += bucket_count
+                    cumulative_counts[bound] = running_count
+                stages[stage] = {
+                    "count": stage_metrics["count"],
+                    "total-seconds": stage_metrics["total-seconds"],
+                    "mean-seconds": stage_metrics["total-seconds"]
+                    / stage_metrics["count"],
+                    "max-seconds": stage_metrics["max-seconds"],
+                    "buckets": cumulative_counts,
+                }
+            counters = dict(self._counters)
+        return {
+            "started-at": self.started_at.isoformat(),
+            "duration-seconds": duration,
+            "documents-per-second": counters.get("documents-written", 0) / duration
+            if duration
+            else 0.0,
+            "counters": counters,
+            "stages": stages,
+        }
+
+    def write_json_report(self, path: str) -> None:
+        """Writes report() to a JSON file."""
+        _write_atomically(path, json.dumps(self.report(), indent=2))
+
+    def write_prometheus_textfile(self, path: str, prefix: str = "propeller") -> None:
+        """
+        Writes the run's metrics in the Prometheus text format, for the
+        node exporter's textfile collector. The file is replaced
+        atomically so the collector never reads half a file.
+        """
+        report = self.report()
+        lines = [
+            f"# TYPE {prefix}_run_duration_seconds gauge",
+            f"{prefix}_run_duration_seconds {report['duration-seconds']}",
+            f"# TYPE {prefix}_documents_per_second gauge",
+            f"{prefix}_documents_per_second {report['documents-per-second']}",
+        ]
+        for counter, value in report["counters"].items():
+            metric = f"{prefix}_{_metric_name(counter)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        if report["stages"]:
+            metric = f"{prefix}_stage_duration_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for stage, stage_report in report["stages"].items():
+                for bound, bucket_count in stage_report["buckets"].items():
+                    lines.append(
+                        f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {bucket_count}'
+                    )
+                lines.append(
+                    f'{metric}_sum{{stage="{stage}"}} {stage_report["total-seconds"]}'
+                )
+                lines.append(
+                    f'{metric}_count{{stage="{stage}"}} {stage_report["count"]}'
+                )
+        _write_atomically(path, "\n".join(lines) + "\n")
+
+
+def is_enabled() -> bool:
+    """Checks whether a run is being recorded."""
+    return _run_metrics is not None
+
+
+def stage_timer(stage: str):
+    """
+    Returns a context manager timing its block as one latency of the
+    stage, or a shared no-op context manager while disabled.
+
+    Examples
+    --------
+    >> with instrumentation.stage_timer("parse"):
+    >>     page_data = parse_awws_pagesource(source)
+    """
+    if _run_metrics is None:
+        return _DISABLED_TIMER
+    return _StageTimer(_run_metrics, stage)
+
+
+def timed(stage: str) -> Callable:
+    """
+    Decorator timing each call of the function as one latency of the
+    stage. While disabled, the only cost is one extra function call.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            run_metrics = _run_metrics
+            if run_metrics is None:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                run_metrics.observe(stage, time.perf_counter() - started)
+
+        return timed_function
+
+    return decorator
+
+
+def count(counter: str, amount: float = 1) -> None:
+    """Adds to a counter of the run being recorded, if any."""
+    run_metrics = _run_metrics
+    if run_metrics is not None:
+        run_metrics.count(counter, amount)
+
+
+@contextlib.contextmanager
+def recording(buckets: Optional[list] = None):
+    """
+    Records the timers and counters hit inside the context.
+    Nested recordings share the outer run's metrics.
+
+    Yields
+    ------
+    RunMetrics
+        The metrics being recorded.
+    """
+    global _run_metrics
+    if _run_metrics is not None:
+        yield _run_metrics
+        return
+    _run_metrics = RunMetrics(buckets)
+    try:
+        yield _run_metrics
+    finally:
+        _run_metrics.finish()
+        _run_metrics = None
+
+
+@contextlib.contextmanager
+def instrumented_run(run_name: str, enabled: Optional[bool] = None):
+    """
+    Records a pipeline run when instrumentation is enabled, then writes
+    its JSON report (and Prometheus textfile, if configured) to the paths
+    in config/ingestion.yml, with {run} replaced by the run name.
+
+    Parameters
+    ----------
+    run_name : str
+        Name of the run, eg "ingestion" or "backfill".
+    enabled : bool, optional
+        Whether to record, by default the setting in config/ingestion.yml.
+    """
+    instrumentation_config = config.load_config("config/ingestion.yml")[
+        "instrumentation"
+    ]
+    if enabled is None:
+        enabled = instrumentation_config["enabled"]
+    if not enabled or is_enabled():
+        yield
+        return
+    with recording() as run_metrics:
+        try:
+            yield
+        finally:
+            run_metrics.finish()
+            report_path = instrumentation_config["report-path"].format(run=run_name)
+            run_metrics.write_json_report(report_path)
+            logging.info(f"Wrote {run_name} run report to {report_path}.")
+            textfile_path = instrumentation_config["prometheus-textfile"]
+            if textfile_path:
+                run_metrics.write_prometheus_textfile(
+                    textfile_path.format(run=run_name)
+                )
+
+
+class _StageTimer:
+    __slots__ = ("run_metrics", "stage", "started")
+
+    def __init__(self, run_metrics: RunMetrics, stage: str):
+        self.run_metrics = run_metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.run_metrics.observe(self.stage, time.perf_counter() - self.started)
+
+
+def _metric_name(name: str) -> str:
+    return name.replace("-", "_").replace(" ", "_")
+
+
+def _write_atomically(path: str, content: str) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f:
+        f.write(content)
+    os.replace(temporary_path, path)
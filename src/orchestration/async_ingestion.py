@@ -0,0 +1,358 @@
+import asyncio
+import concurrent.futures
+import logging
+from typing import Literal, Optional
+
+import src.data.scraping as scraping
+import src.data.database as database
+from src import config, instrumentation
+from src.data import feature_store, metar_decoding, observation_cache
+from src.data.ingestion_index import IngestionIndex
+from src.data.page_archive import PageArchive
+
+
+# Marks the end of a stage's input on its queue.
+_STAGE_DONE = object()
+
+
+def run_awws_metar_async_ingestion_pipeline(**pipeline_kwargs) -> dict:
+    """
+    Runs awws_metar_async_ingestion_pipeline() to completion
+    in a new event loop, for use from synchronous code.
+
+    Returns
+    -------
+    dict
+        The run summary from awws_metar_async_ingestion_pipeline().
+    """
+    return asyncio.run(awws_metar_async_ingestion_pipeline(**pipeline_kwargs))
+
+
+async def awws_metar_async_ingestion_pipeline(
+    locations: Optional[list] = None,
+    batch_size: Optional[int] = None,
+    fetch_concurrency: Optional[int] = None,
+    parse_concurrency: Optional[int] = None,
+    write_concurrency: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    incremental: bool = True,
+    write_mode: Optional[Literal["batch", "conditional"]] = None,
+    archive_pages: Optional[bool] = None,
+    compute_features: Optional[bool] = None,
+) -> dict:
+    """
+    Scrapes (Extracts), parses (Transforms) and writes (Loads) AWWS
+    METAR-TAF data as three concurrent stages joined by bounded queues,
+    so a slow stage applies backpressure instead of blocking the others.
+
+    Fetching runs in a thread pool (network-bound), parsing in a process
+    pool (CPU-bound) and writing in a thread pool, each with its own
+    number of workers.
+
+    Parameters
+    ----------
+    locations : list, optional
+        Plain-language locations from config/scraping.yml to ingest,
+        by default every configured location.
+
+    batch_size : int, optional
+        Number of locations submitted per page request,
+        by default the batch size in config/scraping.yml.
+
+    fetch_concurrency, parse_concurrency, write_concurrency : int, optional
+        Number of workers for each stage,
+        by default the values in config/ingestion.yml.
+
+    queue_size : int, optional
+        Maximum items waiting between two stages,
+        by default the value in config/ingestion.yml.
+
+    incremental : bool
+        If True, pages and reports unchanged since the last run are
+        skipped, as in awws_metar_ingestion_pipeline(). By default True.
+
+    write_mode : Literal["batch", "conditional"], optional
+        Writer to use, by default the write-mode in config/data.yml.
+
+    archive_pages : bool, optional
+        If True, fetched page sources are stored in the local PageArchive
+        by the fetch stage. By default the page-archive enabled setting
+        in config/data.yml.
+
+    compute_features : bool, optional
+        If True, the parse stage updates the local FeatureStore with each
+        location's new reports. By default the feature-store enabled
+        setting in config/data.yml.
+
+    Returns
+    -------
+    dict
+        Run summary with counts of "pages" fetched, "pages-unchanged",
+        "fetch-failures", "documents" parsed and summed writer counts.
+    """
+    pipeline_config = config.load_config("config/ingestion.yml")["async-pipeline"]
+    fetch_concurrency = fetch_concurrency or pipeline_config["fetch-concurrency"]
+    parse_concurrency = parse_concurrency or pipeline_config["parse-concurrency"]
+    write_concurrency = write_concurrency or pipeline_config["write-concurrency"]
+    queue_size = queue_size or pipeline_config["queue-size"]
+    write_documents = database.get_awws_document_writer(write_mode)
+    if archive_pages is None:
+        archive_pages = config.load_config("config/data.yml")["local"]["page-archive"][
+            "enabled"
+        ]
+    if compute_features is None:
+        compute_features = config.load_config("config/data.yml")["local"][
+            "feature-store"
+        ]["enabled"]
+    store = feature_store.get_feature_store() if compute_features else None
+
+    batch_queue = asyncio.Queue()
+    for batch in scraping.batch_locations(locations, batch_size):
+        batch_queue.put_nowait(batch)
+    page_queue = asyncio.Queue(maxsize=queue_size)
+    document_queue = asyncio.Queue(maxsize=queue_size)
+    summary = {"pages": 0, "pages-unchanged": 0, "fetch-failures": 0, "documents": 0}
+    pending_pages = {}
+    stage_tasks = []
+
+    index = IngestionIndex() if incremental else None
+    archive = PageArchive() if archive_pages else None
+    fetch_executor = concurrent.futures.ThreadPoolExecutor(fetch_concurrency)
+    parse_executor = concurrent.futures.ProcessPoolExecutor(parse_concurrency)
+    write_executor = concurrent.futures.ThreadPoolExecutor(write_concurrency)
+    try:
+        fetch_workers = [
+            asyncio.create_task(
+                _fetch_stage(batch_queue, page_queue, fetch_executor, archive, summary)
+            )
+            for _ in range(fetch_concurrency)
+        ]
+        parse_workers = [
+            asyncio.create_task(
+                _parse_stage(
+                    page_queue,
+                    document_queue,
+                    parse_executor,
+                    index,
+                    store,
+                    pending_pages,
+                    summary,
+                )
+            )
+            for _ in range(parse_concurrency)
+        ]
+        write_workers = [
+            asyncio.create_task(
+                _write_stage(
+                    document_queue,
+                    write_executor,
+                    write_documents,
+                    index,
+                    pending_pages,
+                    summary,
+                )
+            )
+            for _ in range(write_concurrency)
+        ]
+        stage_tasks = fetch_workers + parse_workers + write_workers
+
+        async def finish_stages():
+            await _finish_stage(fetch_workers, page_queue, parse_concurrency)
+            await _finish_stage(parse_workers, document_queue, write_concurrency)
+
+        with instrumentation.instrumented_run("async-ingestion"), (
+            observation_cache.disk_tier_invalidation()
+        ):
+            stage_tasks.append(asyncio.create_task(finish_stages()))
+            await _supervise_stages(stage_tasks)
+    finally:
+        for task in stage_tasks:
+            task.cancel()
+        fetch_executor.shutdown(wait=False, cancel_futures=True)
+        parse_executor.shutdown(wait=False, cancel_futures=True)
+        write_executor.shutdown(wait=True)
+        if index:
+            index.close()
+        if archive:
+            archive.close()
+    logging.info(f"Async ingestion finished: {summary}.")
+    return summary
+
+
+async def _supervise_stages(stage_tasks: list) -> None:
+    """
+    Waits for every stage task, or until one fails. A failed task's
+    siblings are cancelled and its error re-raised, since the stages
+    feeding or reading from it would otherwise block on their queues.
+    """
+    done, pending = await asyncio.wait(stage_tasks, return_when=asyncio.FIRST_EXCEPTION)
+    failed_tasks = [task for task in done if not task.cancelled() and task.exception()]
+    if failed_tasks:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise failed_tasks[0].exception()
+
+
+async def _finish_stage(workers: list, next_queue: asyncio.Queue, next_workers: int):
+    """Waits for a stage's workers, then tells each next-stage worker to stop."""
+    await asyncio.gather(*workers)
+    for _ in range(next_workers):
+        await next_queue.put(_STAGE_DONE)
+
+
+async def _fetch_stage(
+    batch_queue: asyncio.Queue,
+    page_queue: asyncio.Queue,
+    executor: concurrent.futures.Executor,
+    archive: Optional[PageArchive],
+    summary: dict,
+) -> None:
+    loop = asyncio.get_running_loop()
+    while not batch_queue.empty():
+        batch = batch_queue.get_nowait()
+        try:
+            page_source = await loop.run_in_executor(
+                executor, scraping.get_awws_metar_pagesource, list(batch)
+            )
+        except Exception:
+            summary["fetch-failures"] += 1
+            logging.exception(f"Failed to scrape {batch} Web Page Source.")
+            continue
+        summary["pages"] += 1
+        logging.info(f"Scraped {batch} Web Page Source.")
+        if archive:
+            await loop.run_in_executor(
+                executor, archive.store, list(batch), page_source
+            )
+        # Blocks while the parse stage is behind.
+        await page_queue.put((batch, page_source))
+
+
+async def _parse_stage(
+    page_queue: asyncio.Queue,
+    document_queue: asyncio.Queue,
+    executor: concurrent.futures.Executor,
+    index: Optional[IngestionIndex],
+    store: Optional[feature_store.FeatureStore],
+    pending_pages: dict,
+    summary: dict,
+) -> None:
+    loop = asyncio.get_running_loop()
+    while (page := await page_queue.get()) is not _STAGE_DONE:
+        batch, page_source = page
+        page_key = ",".join(batch)
+        if index and index.page_unchanged(page_key, page_source):
+            summary["pages-unchanged"] += 1
+            logging.info(f"Skipped unchanged {page_key} Web Page Source.")
+            continue
+        try:
+            # Worker processes don't record, so time the parse from here.
+            with instrumentation.stage_timer("parse"):
+                batch_page_data = await loop.run_in_executor(
+                    executor,
+                    _parse_and_decode_batch_pagesource,
+                    page_source,
+                    list(batch),
+                )
+        except Exception:
+            logging.exception(f"Failed to parse {page_key} Web Page Source.")
+            continue
+        # The page is recorded in the index once every location on it
+        # has been written, see _write_stage().
+        pending_pages[page_key] = {
+            "source": page_source,
+            "remaining": len(batch_page_data),
+            "failed": False,
+        }
+        for location, location_page_data in batch_page_data.items():
+            if index:
+                location_page_data = index.filter_new_documents(location_page_data)
+            summary["documents"] += len(location_page_data)
+            logging.info(f"Parsed {location} Web Page Source.")
+            if store:
+                # Off the event loop, as it waits on other processes' updates.
+                await loop.run_in_executor(None, store.update, location_page_data)
+            # Blocks while the write stage is behind.
+            await document_queue.put((page_key, location_page_data))
+
+
+def _parse_and_decode_batch_pagesource(page_source: str, locations: list) -> dict:
+    """
+    Parses a batch page source and decodes its reports, storing the
+    records with the documents, in a parse stage worker process.
+    """
+    batch_page_data = scraping.parse_awws_batch_pagesource(page_source, locations)
+    for location_page_data in batch_page_data.values():
+        metar_decoding.attach_decoded_records(location_page_data)
+    return batch_page_data
+
+
+async def _write_stage(
+    document_queue: asyncio.Queue,
+    executor: concurrent.futures.Executor,
+    write_documents,
+    index: Optional[IngestionIndex],
+    pending_pages: dict,
+    summary: dict,
+) -> None:
+    loop = asyncio.get_running_loop()
+    # boto3 resources are not thread safe, so each writer keeps its own
+    # (sharing the environment's client and its connection pool).
+    db_connection = database.dynamodb_connection()
+    try:
+        db = await loop.run_in_executor(executor, db_connection.__enter__)
+    except Exception:
+        logging.exception("Failed to connect a writer to DynamoDB.")
+        raise
+    finished = False
+    try:
+        while not finished:
+            # Drain whatever is queued into one write, so documents from
+            # several locations share BatchWriteItem requests.
+            queued_items = []
+            item = await document_queue.get()
+            while True:
+                if item is _STAGE_DONE:
+                    finished = True
+                    break
+                queued_items.append(item)
+                if document_queue.empty():
+                    break
+                item = document_queue.get_nowait()
+            if not queued_items:
+                continue
+
+            documents = {}
+            for _, location_page_data in queued_items:
+                for data_document in location_page_data.values():
+                    documents[len(documents)] = data_document
+            write_failed = False
+            if documents:
+                try:
+                    write_counts = await loop.run_in_executor(
+                        executor, write_documents, db, documents
+                    )
+                except Exception:
+                    logging.exception("Failed to write data documents to DynamoDB.")
+                    write_counts = {"write-failures": 1}
+                logging.info(f"Wrote data documents: {write_counts}.")
+                for count_name, count in write_counts.items():
+                    summary[count_name] = summary.get(count_name, 0) + count
+                write_failed = bool(
+                    write_counts.get("unprocessed")
+                    or write_counts.get("write-failures")
+                )
+                if index and not write_failed:
+                    index.mark_documents_written(documents)
+
+            for page_key, _ in queued_items:
+                pending_page = pending_pages[page_key]
+                pending_page["remaining"] -= 1
+                pending_page["failed"] = pending_page["failed"] or write_failed
+                if pending_page["remaining"] == 0:
+                    del pending_pages[page_key]
+                    if index and not pending_page["failed"]:
+                        index.record_page(page_key, pending_page["source"])
+    finally:
+        db_connection.__exit__(None, None, None)
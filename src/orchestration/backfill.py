@@ -0,0 +1,228 @@
+import collections
+import concurrent.futures
+import gzip
+import itertools
+import json
+import logging
+import os
+import tarfile
+from typing import Iterator, Optional
+
+import src.data.scraping as scraping
+import src.data.database as database
+from src import config, instrumentation
+from src.data import metar_decoding, page_archive
+
+
+PAGESOURCE_SUFFIXES = (".html", ".htm", ".html.gz", ".htm.gz")
+
+
+def iter_archived_pagesources(archive_path: str) -> Iterator[tuple]:
+    """
+    Streams archived AWWS page sources one at a time from a PageArchive,
+    a directory (searched recursively, in sorted order) or a tarball.
+
+    Parameters
+    ----------
+    archive_path : str
+        Path to a PageArchive root, or to a directory or (optionally
+        compressed) tar file holding .html or .html.gz page source files.
+
+    Yields
+    ------
+    tuple
+        (name, page source) for each page, where name is the page's
+        path relative to the directory, its member name in the tarball,
+        or "<fetched_at>/<content_hash>" in a PageArchive.
+    """
+    if page_archive.is_page_archive(archive_path):
+        with page_archive.PageArchive(archive_path) as archive:
+            for fetch in archive.iter_pages():
+                name = f"{fetch['fetched_at']}/{fetch['content_hash']}"
+                yield name, fetch["page_source"]
+    elif os.path.isdir(archive_path):
+        for directory, subdirectories, filenames in os.walk(archive_path):
+            subdirectories.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith(PAGESOURCE_SUFFIXES):
+                    continue
+                path = os.path.join(directory, filename)
+                opener = gzip.open if filename.endswith(".gz") else open
+                with opener(path, "rb") as f:
+                    page_bytes = f.read()
+                yield os.path.relpath(path, archive_path), page_bytes.decode("utf-8")
+    else:
+        # Stream mode reads members in order without indexing the whole tarball.
+        with tarfile.open(archive_path, "r|*") as tarball:
+            for member in tarball:
+                if not member.isfile() or not member.name.endswith(PAGESOURCE_SUFFIXES):
+                    continue
+                page_bytes = tarball.extractfile(member).read()
+                if member.name.endswith(".gz"):
+                    page_bytes = gzip.decompress(page_bytes)
+                yield member.name, page_bytes.decode("utf-8")
+
+
+@instrumentation.instrumented_run("backfill")
+def awws_metar_backfill(
+    archive_path: str,
+    output_path: Optional[str] = None,
+    write_to_database: bool = False,
+    checkpoint_path: Optional[str] = None,
+    processes: Optional[int] = None,
+    pages_per_task: Optional[int] = None,
+) -> dict:
+    """
+    Re-parses archived AWWS page sources across a process pool, streaming
+    the resulting documents to a JSONL file and/or the batched DynamoDB
+    writer, and checkpointing finished pages so an interrupted backfill
+    resumes where it left off.
+
+    Parameters
+    ----------
+    archive_path : str
+        PageArchive root, directory or tarball of archived page sources,
+        see iter_archived_pagesources().
+
+    output_path : str, optional
+        JSONL file to append one data document per line to.
+
+    write_to_database : bool
+        If True, documents are written with
+        batch_write_data_documents_to_awws_database(). By default False.
+
+    checkpoint_path : str, optional
+        File listing the pages already backfilled, one name per line.
+        By default output_path (or archive_path) + ".checkpoint".
+
+    processes : int, optional
+        Number of parsing processes, by default the value in
+        config/ingestion.yml (or the CPU count if that is empty).
+
+    pages_per_task : int, optional
+        Number of pages sent to a process per task,
+        by default the value in config/ingestion.yml.
+
+    Returns
+    -------
+    dict
+        Counts of "pages" parsed, "pages-skipped" (already checkpointed),
+        "pages-failed" and "documents" produced.
+    """
+    if output_path is None and not write_to_database:
+        raise ValueError("Backfill needs an output_path and/or write_to_database.")
+    backfill_config = config.load_config("config/ingestion.yml")["backfill"]
+    processes = processes or backfill_config["processes"] or os.cpu_count()
+    pages_per_task = pages_per_task or backfill_config["pages-per-task"]
+    checkpoint_path = checkpoint_path or f"{output_path or archive_path}.checkpoint"
+
+    finished_pages = set()
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            finished_pages = {line.rstrip("\n") for line in f if line.strip()}
+        logging.info(f"Resuming backfill after {len(finished_pages)} pages.")
+
+    backfill_counts = {
+        "pages": 0,
+        "pages-skipped": 0,
+        "pages-failed": 0,
+        "documents": 0,
+    }
+
+    def unfinished_pages():
+        for name, page_source in iter_archived_pagesources(archive_path):
+            if name in finished_pages:
+                backfill_counts["pages-skipped"] += 1
+            else:
+                yield name, page_source
+
+    pages = unfinished_pages()
+    output_file = open(output_path, "a") if output_path else None
+    checkpoint_file = open(checkpoint_path, "a")
+    db_connection = database.dynamodb_connection() if write_to_database else None
+    db = db_connection.__enter__() if db_connection else None
+    try:
+        with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+            # Keep a bounded number of tasks in flight so page sources are
+            # read from the archive only as fast as they are parsed.
+            in_flight = collections.deque()
+            while True:
+                while len(in_flight) < processes * 2:
+                    task_pages = list(itertools.islice(pages, pages_per_task))
+                    if not task_pages:
+                        break
+                    in_flight.append(
+                        executor.submit(_parse_archived_pagesources, task_pages)
+                    )
+                if not in_flight:
+                    break
+                # Results are handled in submission order so the checkpoint
+                # only ever lists pages whose documents were all stored.
+                task_results = in_flight.popleft().result()
+                _store_backfill_results(
+                    task_results, output_file, db, checkpoint_file, backfill_counts
+                )
+    finally:
+        if db_connection:
+            db_connection.__exit__(None, None, None)
+        if output_file:
+            output_file.close()
+        checkpoint_file.close()
+    logging.info(f"Backfill finished: {backfill_counts}.")
+    return backfill_counts
+
+
+def _parse_archived_pagesources(task_pages: list) -> list:
+    """
+    Parses a task's worth of page sources in a worker process.
+    Returns (name, page data) per page, with None for failed pages.
+    """
+    task_results = []
+    for name, page_source in task_pages:
+        try:
+            page_data = scraping.parse_awws_pagesource(page_source)
+            metar_decoding.attach_decoded_records(page_data)
+            task_results.append((name, page_data))
+        except Exception:
+            logging.exception(f"Failed to parse archived page {name}.")
+            task_results.append((name, None))
+    return task_results
+
+
+def _store_backfill_results(
+    task_results: list, output_file, db, checkpoint_file, backfill_counts: dict
+) -> None:
+    """
+    Writes a task's documents out, then checkpoints its stored pages.
+    Failed pages are left out of the checkpoint, to be retried on resume.
+    """
+    task_documents = {}
+    stored_names = []
+    for name, page_data in task_results:
+        if page_data is None:
+            backfill_counts["pages-failed"] += 1
+            continue
+        backfill_counts["pages"] += 1
+        stored_names.append(name)
+        for data_document in page_data.values():
+            task_documents[len(task_documents)] = data_document
+    backfill_counts["documents"] += len(task_documents)
+
+    if output_file:
+        for data_document in task_documents.values():
+            output_file.write(json.dumps(data_document) + "\n")
+        output_file.flush()
+        os.fsync(output_file.fileno())
+    if db is not None and task_documents:
+        write_counts = database.batch_write_data_documents_to_awws_database(
+            db, task_documents
+        )
+        if write_counts["unprocessed"]:
+            raise RuntimeError(
+                f"{write_counts['unprocessed']} backfill documents were not written, "
+                "stopping before they are checkpointed."
+            )
+
+    checkpoint_file.writelines(f"{name}\n" for name in stored_names)
+    checkpoint_file.flush()
+    os.fsync(checkpoint_file.fileno())
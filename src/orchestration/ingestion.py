@@ -1,32 +1,168 @@
 import logging
+from typing import Literal, Optional
 
 import src.data.scraping as scraping
 import src.data.database as database
+from src import config, instrumentation
+from src.data import feature_store, metar_decoding, observation_cache, write_spool
+from src.data.driver_pool import WebDriverPool
+from src.data.ingestion_index import IngestionIndex
+from src.data.page_archive import PageArchive
 
 
-def awws_metar_ingestion_pipeline():
+@instrumentation.instrumented_run("ingestion")
+def awws_metar_ingestion_pipeline(
+    locations: Optional[list] = None,
+    max_workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    incremental: bool = True,
+    write_mode: Optional[Literal["batch", "conditional"]] = None,
+    archive_pages: Optional[bool] = None,
+    pool: Optional[WebDriverPool] = None,
+    write_behind: Optional[bool] = None,
+    compute_features: Optional[bool] = None,
+):
     """
-    Scrapes (Extracts) relevent data from Abbotsford and Vancouver
-    AWWS METAR-TAF, Transforms them into usable (parsable) info,
-    and writes (loads) to the project DynamoDB.
+    Scrapes (Extracts) relevent data from the configured AWWS METAR-TAF
+    locations (Abbotsford and Vancouver by default), Transforms them into
+    usable (parsable) info, and writes (loads) to the project DynamoDB.
+
+    Parameters
+    ----------
+    locations : list, optional
+        Plain-language locations from config/scraping.yml to ingest,
+        by default every configured location.
+
+    max_workers : int, optional
+        Number of batches to scrape concurrently,
+        by default the pool size in config/scraping.yml.
+
+    batch_size : int, optional
+        Number of locations submitted per page request,
+        by default the batch size in config/scraping.yml.
+
+    incremental : bool
+        If True, pages and reports unchanged since the last run (tracked
+        in the local ingestion index from config/data.yml) are skipped
+        instead of parsed and rewritten, by default True.
+
+    write_mode : Literal["batch", "conditional"], optional
+        "batch" writes with BatchWriteItem, "conditional" writes each item
+        idempotently with a ConditionExpression so unchanged items and
+        stale revisions are not written. By default the write-mode in
+        config/data.yml.
+
+    archive_pages : bool, optional
+        If True, every scraped page source is kept in the local
+        PageArchive for later reprocessing. By default the page-archive
+        enabled setting in config/data.yml.
+
+    pool : WebDriverPool, optional
+        A warm pool to lease drivers from (eg the scheduler's), by default
+        a pool created for this run.
+
+    write_behind : bool, optional
+        If True, documents are appended to the local write spool and
+        written to DynamoDB by its background flusher, so the run doesn't
+        wait on the database. By default the write-spool enabled setting
+        in config/data.yml.
+
+    compute_features : bool, optional
+        If True, the rolling-window features of the local FeatureStore
+        are updated with each location's new reports as they are parsed.
+        By default the feature-store enabled setting in config/data.yml.
+
+    Raises
+    ------
+    scraping.PageSourceScrapeError
+        If any batch of locations failed to scrape, once the
+        scraped batches are ingested.
     """
-    # Abbotsford Data
-    abbotsford_page_source = scraping.scrape_awws_metar_pagesource("abbotsford")
-    logging.info("Scraped Abbotsford Web Page Source.")
-    abbotsford_page_data = scraping.parse_awws_pagesource(abbotsford_page_source)
-    logging.info("Parsed Abbotsford Web Page Source.")
-    logging.debug(f"{abbotsford_page_data=}")
-
-    # Vancouver Data
-    vancouver_page_source = scraping.scrape_awws_metar_pagesource("vancouver")
-    logging.info("Scraped Vancouver Web Page Source.")
-    vancouver_page_data = scraping.parse_awws_pagesource(vancouver_page_source)
-    logging.info("Parsed Vancouver Web Page Source.")
-    logging.debug(f"{vancouver_page_data=}")
-
-    # Writing to DB
-    with database.dynamodb_connection() as db:
-        logging.info("Beginning to write data documents to DynamoDB.")
-        database.write_data_documents_to_awws_database(db, abbotsford_page_data)
-        database.write_data_documents_to_awws_database(db, vancouver_page_data)
-        logging.info("Finished writing data documents to DynamoDB.")
+    write_documents = database.get_awws_document_writer(write_mode)
+
+    # Scrape batches of locations concurrently with a shared driver pool.
+    # Failed batches are raised once the scraped ones are ingested.
+    scrape_error = None
+    try:
+        page_sources = scraping.scrape_awws_metar_batch_pagesources(
+            locations, batch_size=batch_size, max_workers=max_workers, pool=pool
+        )
+    except scraping.PageSourceScrapeError as error:
+        page_sources, scrape_error = error.page_sources, error
+    if archive_pages is None:
+        archive_pages = config.load_config("config/data.yml")["local"]["page-archive"][
+            "enabled"
+        ]
+    if archive_pages:
+        with PageArchive() as archive:
+            for batch_locations, page_source in page_sources.items():
+                archive.store(list(batch_locations), page_source)
+        logging.info(f"Archived {len(page_sources)} Web Page Sources.")
+
+    if compute_features is None:
+        compute_features = config.load_config("config/data.yml")["local"][
+            "feature-store"
+        ]["enabled"]
+    store = feature_store.get_feature_store() if compute_features else None
+
+    index = IngestionIndex() if incremental else None
+    try:
+        page_data = {}
+        for batch_locations, page_source in page_sources.items():
+            page_key = ",".join(batch_locations)
+            if index and index.page_unchanged(page_key, page_source):
+                logging.info(f"Skipped unchanged {page_key} Web Page Source.")
+                continue
+            batch_page_data = scraping.parse_awws_batch_pagesource(
+                page_source, list(batch_locations)
+            )
+            for location, location_page_data in batch_page_data.items():
+                if index:
+                    location_page_data = index.filter_new_documents(location_page_data)
+                # Decode reports once, storing the records with the documents.
+                page_data[location] = metar_decoding.attach_decoded_records(
+                    location_page_data
+                )
+                logging.info(f"Parsed {location} Web Page Source.")
+                if store:
+                    store.update(location_page_data)
+                logging.debug(f"{location} page data={location_page_data}")
+
+        if write_behind is None:
+            write_behind = config.load_config("config/data.yml")["local"][
+                "write-spool"
+            ]["enabled"]
+        unwritten_locations = set()
+        if write_behind:
+            # Spooled documents are on disk, so they count as written. If
+            # the spool dead-letters them, the index forgets them again.
+            spool = write_spool.get_write_spool()
+            for location, location_page_data in page_data.items():
+                spool.append(location_page_data, write_mode)
+                if index:
+                    index.mark_documents_written(location_page_data)
+            logging.info("Spooled data documents for writing to DynamoDB.")
+        else:
+            with database.dynamodb_connection() as db, (
+                observation_cache.disk_tier_invalidation()
+            ):
+                logging.info("Beginning to write data documents to DynamoDB.")
+                for location, location_page_data in page_data.items():
+                    write_counts = write_documents(db, location_page_data)
+                    logging.info(f"Wrote {location} data documents: {write_counts}.")
+                    if write_counts.get("unprocessed"):
+                        unwritten_locations.add(location)
+                    elif index:
+                        index.mark_documents_written(location_page_data)
+                logging.info("Finished writing data documents to DynamoDB.")
+
+        # Only remember pages once their documents are safely written.
+        if index:
+            for batch_locations, page_source in page_sources.items():
+                if unwritten_locations.isdisjoint(batch_locations):
+                    index.record_page(",".join(batch_locations), page_source)
+    finally:
+        if index:
+            index.close()
+    if scrape_error:
+        raise scrape_error
@@ -0,0 +1,164 @@
+import concurrent.futures
+import logging
+import random
+import signal
+import threading
+import time
+from typing import Callable, Optional
+
+from src import config
+from src.data.driver_pool import WebDriverPool
+from src.orchestration import ingestion
+
+
+class IngestionScheduler:
+    """
+    A resident scheduler polling AWWS stations on their own intervals,
+    keeping the config, HTTP session and WebDriver pool warm between
+    polls instead of paying for them on every cron tick.
+
+    Each schedule polls its locations every interval seconds, aligned
+    to offset seconds past the interval (eg a few minutes past the hour
+    for METARs), plus a random jitter. A poll whose previous run is
+    still going is skipped, as are locations another schedule is
+    already polling.
+
+    Parameters
+    ----------
+    schedules : dict, optional
+        Schedules keyed by name, each with an "interval" and "offset" in
+        seconds and the "locations" to poll (None for every location),
+        by default the schedules in config/ingestion.yml.
+    jitter : float, optional
+        Largest random delay in seconds added to each poll,
+        by default the jitter in config/ingestion.yml.
+    poll : Callable, optional
+        Called with (locations, pool) to poll, by default
+        running awws_metar_ingestion_pipeline().
+
+    Examples
+    --------
+    >> IngestionScheduler().run()  # Until SIGTERM or SIGINT.
+    """
+
+    def __init__(
+        self,
+        schedules: Optional[dict] = None,
+        jitter: Optional[float] = None,
+        poll: Optional[Callable] = None,
+    ):
+        scheduler_config = config.load_config("config/ingestion.yml")["scheduler"]
+        self.schedules = schedules or scheduler_config["schedules"]
+        self.jitter = scheduler_config["jitter"] if jitter is None else jitter
+        self.poll = poll or _poll_ingestion_pipeline
+        self.poll_counts = {"started": 0, "skipped": 0, "failed": 0}
+
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._running_schedules = set()
+        self._polling_locations = set()
+
+    def run(self, handle_signals: bool = True) -> None:
+        """
+        Polls on schedule until stop() is called (or, with handle_signals,
+        until SIGTERM or SIGINT), then waits for running polls to finish.
+
+        Parameters
+        ----------
+        handle_signals : bool
+            If True, SIGTERM and SIGINT stop the scheduler gracefully.
+            Only possible from the main thread. By default True.
+        """
+        previous_handlers = {}
+        if handle_signals:
+            for signal_number in (signal.SIGTERM, signal.SIGINT):
+                previous_handlers[signal_number] = signal.signal(
+                    signal_number, self._handle_stop_signal
+                )
+        executor = concurrent.futures.ThreadPoolExecutor(len(self.schedules))
+        pool = WebDriverPool()
+        try:
+            poll_times = {
+                name: self._next_poll_time(schedule, time.time())
+                for name, schedule in self.schedules.items()
+            }
+            logging.info(f"Scheduler started with schedules {list(self.schedules)}.")
+            while not self._stopped.is_set():
+                name = min(poll_times, key=poll_times.get)
+                if self._stopped.wait(max(0.0, poll_times[name] - time.time())):
+                    break
+                self._start_poll(name, executor, pool)
+                poll_times[name] = self._next_poll_time(
+                    self.schedules[name], time.time()
+                )
+        finally:
+            logging.info("Scheduler stopping, waiting for running polls.")
+            executor.shutdown(wait=True)
+            pool.close()
+            for signal_number, handler in previous_handlers.items():
+                signal.signal(signal_number, handler)
+            logging.info(f"Scheduler stopped: {self.poll_counts}.")
+
+    def stop(self) -> None:
+        """Stops the scheduler after its running polls finish."""
+        self._stopped.set()
+
+    def _handle_stop_signal(self, signal_number, frame) -> None:
+        logging.info(f"Received signal {signal_number}, stopping scheduler.")
+        self.stop()
+
+    def _next_poll_time(self, schedule: dict, now: float) -> float:
+        return next_poll_time(schedule, now) + random.uniform(0, self.jitter)
+
+    def _start_poll(
+        self, name: str, executor: concurrent.futures.Executor, pool: WebDriverPool
+    ) -> None:
+        locations = self.schedules[name]["locations"] or list(
+            config.station_codes("metar-taf")
+        )
+        with self._lock:
+            if name in self._running_schedules:
+                self.poll_counts["skipped"] += 1
+                logging.warning(f"Skipped {name} poll, the last one is still running.")
+                return
+            free_locations = [
+                location
+                for location in locations
+                if location not in self._polling_locations
+            ]
+            if not free_locations:
+                self.poll_counts["skipped"] += 1
+                logging.info(f"Skipped {name} poll, its locations are being polled.")
+                return
+            self._running_schedules.add(name)
+            self._polling_locations.update(free_locations)
+            self.poll_counts["started"] += 1
+        executor.submit(self._run_poll, name, free_locations, pool)
+
+    def _run_poll(self, name: str, locations: list, pool: WebDriverPool) -> None:
+        logging.info(f"Polling {locations} for {name}.")
+        try:
+            self.poll(locations, pool)
+        except Exception:
+            with self._lock:
+                self.poll_counts["failed"] += 1
+            logging.exception(f"{name} poll of {locations} failed.")
+        finally:
+            with self._lock:
+                self._running_schedules.discard(name)
+                self._polling_locations.difference_update(locations)
+
+
+def next_poll_time(schedule: dict, now: float) -> float:
+    """
+    Returns the first time after now that is offset seconds past
+    a multiple of the schedule's interval (in Unix time, so hourly
+    schedules line up with the hour).
+    """
+    interval, offset = schedule["interval"], schedule.get("offset", 0)
+    intervals_passed = (now - offset) // interval
+    return offset + (intervals_passed + 1) * interval
+
+
+def _poll_ingestion_pipeline(locations: list, pool: WebDriverPool) -> None:
+    ingestion.awws_metar_ingestion_pipeline(locations=locations, pool=pool)
@@ -0,0 +1,143 @@
+import asyncio
+import contextlib
+import functools
+
+import pytest
+
+import src.data.database as database
+import src.data.scraping as scraping
+from src.data import metar_decoding
+from src.data.ingestion_index import IngestionIndex
+from src.orchestration import async_ingestion
+
+
+KNOWN_SOURCE_PATHS = {
+    "vancouver": "test/known_awws_metar_van_source.html",
+    "abbotsford": "test/known_awws_metar_abbotsford_source.html",
+}
+
+
+def read_known_source(locations):
+    (location,) = locations
+    with open(KNOWN_SOURCE_PATHS[location]) as f:
+        return f.read()
+
+
+@pytest.fixture
+def written_documents(monkeypatch):
+    written_documents = []
+
+    def stand_in_writer(db, data_documents):
+        written_documents.extend(data_documents.values())
+        return {"written": len(data_documents)}
+
+    @contextlib.contextmanager
+    def stand_in_connection(**boto_client_kwargs):
+        yield None
+
+    monkeypatch.setattr(scraping, "get_awws_metar_pagesource", read_known_source)
+    monkeypatch.setattr(
+        database, "get_awws_document_writer", lambda write_mode=None: stand_in_writer
+    )
+    monkeypatch.setattr(database, "dynamodb_connection", stand_in_connection)
+    return written_documents
+
+
+def test_async_pipeline_writes_every_parsed_document(written_documents):
+    summary = async_ingestion.run_awws_metar_async_ingestion_pipeline(
+        locations=["vancouver", "abbotsford"],
+        batch_size=1,
+        fetch_concurrency=2,
+        parse_concurrency=1,
+        write_concurrency=1,
+        queue_size=1,
+        incremental=False,
+        archive_pages=False,
+        compute_features=False,
+    )
+    expected_documents = [
+        data_document
+        for location in ("vancouver", "abbotsford")
+        for data_document in metar_decoding.attach_decoded_records(
+            scraping.parse_awws_pagesource(read_known_source([location]))
+        ).values()
+    ]
+    assert summary["pages"] == 2
+    assert summary["documents"] == len(expected_documents)
+    assert sorted(written_documents, key=str) == sorted(expected_documents, key=str)
+
+
+def test_async_pipeline_skips_unchanged_pages_on_rerun(
+    written_documents, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(
+        async_ingestion,
+        "IngestionIndex",
+        functools.partial(IngestionIndex, str(tmp_path / "index.sqlite3")),
+    )
+    pipeline_kwargs = dict(
+        locations=["vancouver"],
+        batch_size=1,
+        parse_concurrency=1,
+        archive_pages=False,
+        compute_features=False,
+    )
+    first_summary = async_ingestion.run_awws_metar_async_ingestion_pipeline(
+        **pipeline_kwargs
+    )
+    second_summary = async_ingestion.run_awws_metar_async_ingestion_pipeline(
+        **pipeline_kwargs
+    )
+    assert first_summary["pages-unchanged"] == 0
+    assert second_summary["pages-unchanged"] == 1
+    assert second_summary["documents"] == 0
+
+
+def run_pipeline_with_timeout(**pipeline_kwargs):
+    async def run():
+        return await asyncio.wait_for(
+            async_ingestion.awws_metar_async_ingestion_pipeline(**pipeline_kwargs),
+            timeout=60,
+        )
+
+    return asyncio.run(run())
+
+
+def test_async_pipeline_raises_when_writer_fails(written_documents, monkeypatch):
+    def failing_connection(**boto_client_kwargs):
+        raise ConnectionError("DynamoDB unreachable")
+
+    monkeypatch.setattr(database, "dynamodb_connection", failing_connection)
+    with pytest.raises(ConnectionError):
+        run_pipeline_with_timeout(
+            locations=["vancouver", "abbotsford"],
+            batch_size=1,
+            parse_concurrency=1,
+            queue_size=1,
+            incremental=False,
+            archive_pages=False,
+            compute_features=False,
+        )
+
+
+def test_async_pipeline_raises_when_parse_stage_fails(written_documents, monkeypatch):
+    class FailingIndex:
+        def page_unchanged(self, page_key, source):
+            return False
+
+        def filter_new_documents(self, data_documents):
+            raise RuntimeError("Ingestion index unreadable")
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(async_ingestion, "IngestionIndex", FailingIndex)
+    with pytest.raises(RuntimeError):
+        run_pipeline_with_timeout(
+            locations=["vancouver", "abbotsford"],
+            batch_size=1,
+            parse_concurrency=1,
+            queue_size=1,
+            archive_pages=False,
+            compute_features=False,
+        )
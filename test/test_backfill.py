@@ -0,0 +1,102 @@
+import gzip
+import json
+import shutil
+import tarfile
+
+import pytest
+
+import src.data.scraping as scraping
+from src.data import metar_decoding
+from src.orchestration import backfill
+
+
+KNOWN_SOURCE_PATHS = [
+    "test/known_awws_metar_abbotsford_source.html",
+    "test/known_awws_metar_van_source.html",
+]
+
+
+@pytest.fixture
+def archive_directory(tmp_path):
+    archive_directory = tmp_path / "archive"
+    (archive_directory / "2022-10").mkdir(parents=True)
+    shutil.copy(KNOWN_SOURCE_PATHS[0], archive_directory / "2022-10" / "cyxx.html")
+    with open(KNOWN_SOURCE_PATHS[1], "rb") as source, gzip.open(
+        archive_directory / "2022-10" / "cyvr.html.gz", "wb"
+    ) as archived:
+        archived.write(source.read())
+    return archive_directory
+
+
+@pytest.fixture
+def expected_documents():
+    expected_documents = []
+    for path in KNOWN_SOURCE_PATHS:
+        with open(path) as f:
+            page_data = scraping.parse_awws_pagesource(f.read())
+            expected_documents.extend(
+                metar_decoding.attach_decoded_records(page_data).values()
+            )
+    return expected_documents
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_archived_pagesources_stream_from_directory_and_tarball(
+    archive_directory, tmp_path
+):
+    tarball_path = tmp_path / "archive.tar.gz"
+    with tarfile.open(tarball_path, "w:gz") as tarball:
+        tarball.add(archive_directory, arcname=".")
+    directory_pages = dict(backfill.iter_archived_pagesources(str(archive_directory)))
+    tarball_pages = dict(backfill.iter_archived_pagesources(str(tarball_path)))
+    assert sorted(directory_pages) == ["2022-10/cyvr.html.gz", "2022-10/cyxx.html"]
+    assert sorted(directory_pages.values()) == sorted(tarball_pages.values())
+
+
+def test_backfill_writes_documents_as_jsonl(
+    archive_directory, tmp_path, expected_documents
+):
+    output_path = tmp_path / "documents.jsonl"
+    counts = backfill.awws_metar_backfill(
+        str(archive_directory), output_path=str(output_path), processes=1
+    )
+    assert counts["pages"] == 2
+    assert counts["documents"] == len(expected_documents)
+    assert sorted(read_jsonl(output_path), key=str) == sorted(
+        expected_documents, key=str
+    )
+
+
+def test_backfill_resumes_from_checkpoint(archive_directory, tmp_path):
+    output_path = tmp_path / "documents.jsonl"
+    first_counts = backfill.awws_metar_backfill(
+        str(archive_directory),
+        output_path=str(output_path),
+        processes=1,
+        pages_per_task=1,
+    )
+    second_counts = backfill.awws_metar_backfill(
+        str(archive_directory), output_path=str(output_path), processes=1
+    )
+    assert second_counts["pages-skipped"] == 2
+    assert second_counts["pages"] == 0
+    assert len(read_jsonl(output_path)) == first_counts["documents"]
+
+
+def test_failed_pages_are_not_checkpointed(tmp_path):
+    backfill_counts = {"pages": 0, "pages-failed": 0, "documents": 0}
+    checkpoint_path = tmp_path / "checkpoint.txt"
+    with open(checkpoint_path, "a") as checkpoint_file:
+        backfill._store_backfill_results(
+            [("2022-10/cyvr.html.gz", {}), ("2022-10/cyxx.html", None)],
+            output_file=None,
+            db=None,
+            checkpoint_file=checkpoint_file,
+            backfill_counts=backfill_counts,
+        )
+    assert checkpoint_path.read_text() == "2022-10/cyvr.html.gz\n"
+    assert backfill_counts["pages-failed"] == 1
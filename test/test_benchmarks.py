@@ -0,0 +1,47 @@
+import contextlib
+from types import SimpleNamespace
+
+import botocore.exceptions
+
+from benchmarks import run_benchmarks
+
+
+def test_only_slowdowns_beyond_threshold_are_regressions():
+    baseline = {"parse:fixture-vancouver": 0.002, "write:batch-200": 0.1}
+    results = {
+        "parse:fixture-vancouver": 0.0024,
+        "write:batch-200": 0.13,
+        "parse:synthetic-10-stations": 0.5,
+    }
+    assert run_benchmarks.compare_to_baseline(results, baseline, threshold=0.25) == [
+        "write:batch-200"
+    ]
+
+
+def test_time_per_call_runs_the_benchmark():
+    calls = []
+    seconds = run_benchmarks.time_per_call(
+        lambda: calls.append(None), repeats=2, min_seconds=0.001
+    )
+    assert calls and seconds > 0
+
+
+def test_write_benchmarks_skip_only_an_unreachable_endpoint(monkeypatch):
+    environments = []
+
+    class UnreachableClient:
+        def list_tables(self):
+            raise botocore.exceptions.EndpointConnectionError(
+                endpoint_url="http://localhost:8000"
+            )
+
+    @contextlib.contextmanager
+    def stand_in_connection(environment=None):
+        environments.append(environment)
+        yield SimpleNamespace(meta=SimpleNamespace(client=UnreachableClient()))
+
+    monkeypatch.setattr(
+        run_benchmarks.database, "dynamodb_connection", stand_in_connection
+    )
+    assert run_benchmarks.write_benchmarks() == {}
+    assert environments == ["test"]
@@ -25,3 +25,36 @@ def test_reading_good_yaml_gives_expected_structure(good_yaml_at_path):
     assert type(document["b"]) == dict
     assert type(document["b"]["c"]) == dict
     assert document["b"]["e"]["f"] == 4
+
+
+def test_load_config_reuses_parse_until_file_changes(good_yaml_at_path):
+    first_document = config.load_config(good_yaml_at_path)
+    assert config.load_config(good_yaml_at_path) is first_document
+
+    with open(good_yaml_at_path, "w") as file:
+        yaml.dump({"a": 22, "b": {"c": {"d": 3}, "e": {"f": 4}}}, file)
+    changed_document = config.load_config(good_yaml_at_path)
+    assert changed_document is not first_document
+    assert changed_document["a"] == 22
+
+
+def test_config_view_is_computed_once_per_file_version(good_yaml_at_path):
+    view_calls = []
+
+    def top_level_keys(document):
+        view_calls.append(document)
+        return frozenset(document)
+
+    assert config.config_view(good_yaml_at_path, top_level_keys) == {"a", "b"}
+    assert config.config_view(good_yaml_at_path, top_level_keys) == {"a", "b"}
+    assert len(view_calls) == 1
+
+
+def test_scraping_config_views_match_yaml():
+    scraping_config = config.read_yaml_from("config/scraping.yml")
+    metar_taf_config = scraping_config["awws"]["metar-taf"]
+    assert config.known_fields() == set(metar_taf_config["known-fields"])
+    assert config.station_codes() == {
+        location: location_config["code"]
+        for location, location_config in metar_taf_config["locations"].items()
+    }
@@ -3,9 +3,13 @@ import os
 import subprocess
 import logging
 import json
+import types
+import datetime
 
 import botocore
 import boto3
+from botocore.stub import Stubber
+from boto3.dynamodb.types import TypeSerializer
 
 from src.data import database
 from src import config
@@ -76,10 +80,7 @@ def local_dynamo_db(data_config):
 @pytest.fixture
 def local_awws_metar_table_in_db(local_dynamo_db, data_config):
     # Get Table Info
-    metar_taf_config = data_config["dynamodb"]["awws"]["metar-taf"]
-    table_name = metar_taf_config["table-name"]
-    partition_key = metar_taf_config["partition-key"]
-    sort_key = metar_taf_config["sort-key"]
+    table_name = data_config["dynamodb"]["awws"]["metar-taf"]["table-name"]
 
     # Clear table if exists already.
     existing_tables = [table.table_name for table in local_dynamo_db.tables.all()]
@@ -88,23 +89,9 @@ def local_awws_metar_table_in_db(local_dynamo_db, data_config):
         table.delete()
         table.wait_until_not_exists()
 
-    # Create Table.
-    local_dynamo_db.create_table(
-        TableName=table_name,
-        KeySchema=[
-            {"AttributeName": partition_key, "KeyType": "HASH"},
-            {"AttributeName": sort_key, "KeyType": "RANGE"},
-        ],
-        AttributeDefinitions=[
-            {"AttributeName": partition_key, "AttributeType": "S"},
-            {"AttributeName": sort_key, "AttributeType": "S"},
-        ],
-        ProvisionedThroughput={"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
-    )
-    # Wait for the Async Table Creation Task to finish.
-    # Ideally, we should wait for the table status to be READY, not CREATING.
+    # Create Table, with its time index.
+    database.provision_awws_table(local_dynamo_db)
     table = local_dynamo_db.Table(table_name)
-    table.wait_until_exists()
     logging.debug("AWWS METAR table created in Local DB for testing.")
     yield local_dynamo_db
 
@@ -130,6 +117,56 @@ def test_dynamodb_context_manager_connects_to_local_db(
     assert table.table_status == "ACTIVE"
 
 
+def test_dynamodb_client_is_shared_per_environment(data_config, monkeypatch):
+    monkeypatch.setattr(database, "_dynamodb_clients", {})
+    test_client = database.dynamodb_client("test")
+    assert database.dynamodb_client("test") is test_client
+    assert database.dynamodb_client("production") is not test_client
+    assert test_client.meta.endpoint_url == (
+        data_config["dynamodb"]["test"]["endpoint-url"]
+    )
+    connection_config = data_config["dynamodb"]["connection"]
+    assert test_client.meta.config.max_pool_connections == (
+        connection_config["max-pool-connections"]
+    )
+    assert test_client.meta.config.retries["mode"] == connection_config["retry-mode"]
+
+
+def test_dynamodb_connections_share_environment_client(monkeypatch):
+    monkeypatch.setattr(database, "_dynamodb_clients", {})
+    with database.dynamodb_connection("test") as first_db, (
+        database.dynamodb_connection("test")
+    ) as second_db:
+        assert first_db is not second_db
+        assert first_db.meta.client is second_db.meta.client
+        assert first_db.meta.client is database.dynamodb_client("test")
+        assert first_db.Table("table").meta.client is first_db.meta.client
+
+
+def test_dynamodb_client_reads_python_values_before_and_after_connection(
+    monkeypatch,
+):
+    monkeypatch.setattr(database, "_dynamodb_clients", {})
+
+    def get_stubbed_item(client):
+        with Stubber(client) as stubber:
+            stubber.add_response(
+                "get_item",
+                {"Item": {"location": {"S": "CYVR"}}},
+                {"TableName": "table", "Key": {"location": "CYVR"}},
+            )
+            return client.get_item(TableName="table", Key={"location": "CYVR"})
+
+    client_before_connection = database.dynamodb_client("test")
+    item_before_connection = get_stubbed_item(client_before_connection)
+    with database.dynamodb_connection("test"):
+        pass
+    assert database.dynamodb_client("test") is client_before_connection
+    item_after_connection = get_stubbed_item(database.dynamodb_client("test"))
+    assert item_before_connection["Item"] == item_after_connection["Item"]
+    assert item_after_connection["Item"] == {"location": "CYVR"}
+
+
 @pytest.mark.slow
 def test_dynamodb_context_manager_errors_on_bad_endpoint():
     with pytest.raises(botocore.exceptions.EndpointConnectionError):
@@ -157,3 +194,525 @@ def test_write_data_document_writes_expected_amount_of_documents(
     table = local_awws_metar_table_in_db.Table(table_name)
     item_count = table.item_count
     assert item_count == expected_count
+
+
+@pytest.mark.local_db
+@pytest.mark.parametrize(
+    "data, expected_count",
+    [("known_awws_metar_van_data", 4), ("known_awws_metar_abbotsford_data", 4)],
+)
+def test_batch_write_data_document_writes_expected_amount_of_documents(
+    local_awws_metar_table_in_db, data_config, request, data, expected_count
+):
+    data = request.getfixturevalue(data)
+    write_counts = database.batch_write_data_documents_to_awws_database(
+        db=local_awws_metar_table_in_db,
+        data_documents=data,
+    )
+
+    table_name = data_config["dynamodb"]["awws"]["metar-taf"]["table-name"]
+    table = local_awws_metar_table_in_db.Table(table_name)
+    assert table.item_count == expected_count
+    assert write_counts["written"] == expected_count
+    assert write_counts["skipped"] == len(data) - expected_count
+
+
+@pytest.mark.local_db
+def test_batch_write_data_document_skips_duplicate_keys(
+    local_awws_metar_table_in_db, known_awws_metar_van_data
+):
+    duplicated_data = dict(known_awws_metar_van_data)
+    duplicated_data[len(duplicated_data)] = dict(known_awws_metar_van_data[0])
+    write_counts = database.batch_write_data_documents_to_awws_database(
+        db=local_awws_metar_table_in_db,
+        data_documents=duplicated_data,
+    )
+    assert write_counts["written"] == 4
+    assert write_counts["skipped"] == 2
+
+
+def test_batch_write_retries_unprocessed_items(known_awws_metar_van_data):
+    batch_requests = []
+
+    def batch_write_item(RequestItems):
+        batch_requests.append(RequestItems)
+        # Throttle the first document of the first request only.
+        if len(batch_requests) == 1:
+            table_name, put_requests = next(iter(RequestItems.items()))
+            return {"UnprocessedItems": {table_name: put_requests[:1]}}
+        return {"UnprocessedItems": {}}
+
+    stand_in_db = types.SimpleNamespace(
+        meta=types.SimpleNamespace(
+            client=types.SimpleNamespace(batch_write_item=batch_write_item)
+        )
+    )
+    write_counts = database.batch_write_data_documents_to_awws_database(
+        db=stand_in_db, data_documents=known_awws_metar_van_data
+    )
+    assert len(batch_requests) == 2
+    assert write_counts == {
+        "written": 4,
+        "skipped": 1,
+        "throttled": 1,
+        "unprocessed": 0,
+    }
+
+
+def test_batch_write_counts_and_notifies_each_document_once(
+    monkeypatch, known_awws_metar_van_data
+):
+    monkeypatch.setattr(database, "_sleep_with_backoff", lambda *args: None)
+
+    def batch_write_item(RequestItems):
+        # Throttle the first document on every attempt.
+        table_name, put_requests = next(iter(RequestItems.items()))
+        return {"UnprocessedItems": {table_name: put_requests[:1]}}
+
+    stand_in_db = types.SimpleNamespace(
+        meta=types.SimpleNamespace(
+            client=types.SimpleNamespace(batch_write_item=batch_write_item)
+        )
+    )
+    notified_documents = []
+
+    def listener(report_type, written_documents):
+        notified_documents.extend(written_documents.values())
+
+    database.add_write_listener(listener)
+    try:
+        write_counts = database.batch_write_data_documents_to_awws_database(
+            db=stand_in_db, data_documents=known_awws_metar_van_data
+        )
+    finally:
+        database.remove_write_listener(listener)
+
+    assert write_counts == {
+        "written": 3,
+        "skipped": 1,
+        "throttled": 1,
+        "unprocessed": 1,
+    }
+    notified_keys = [document["datetime"] for document in notified_documents]
+    assert len(notified_keys) == 3
+    assert known_awws_metar_van_data[0]["datetime"] not in notified_keys
+
+
+@pytest.mark.local_db
+def test_conditional_write_does_not_rewrite_unchanged_documents(
+    local_awws_metar_table_in_db, known_awws_metar_van_data
+):
+    first_counts = database.conditionally_write_data_documents_to_awws_database(
+        db=local_awws_metar_table_in_db, data_documents=known_awws_metar_van_data
+    )
+    second_counts = database.conditionally_write_data_documents_to_awws_database(
+        db=local_awws_metar_table_in_db, data_documents=known_awws_metar_van_data
+    )
+    assert first_counts == {"written": 4, "skipped": 1, "conditional-check-failed": 0}
+    assert second_counts == {"written": 0, "skipped": 1, "conditional-check-failed": 4}
+
+
+@pytest.mark.local_db
+def test_conditional_write_keeps_newer_revision(
+    local_awws_metar_table_in_db, data_config, known_awws_metar_van_data
+):
+    newer_document = dict(known_awws_metar_van_data[0])
+    newer_document["report_timestamp"] = "10/20/2022 06:03:30"
+    newer_document["encodedreport"] += " AMD"
+    stale_document = dict(known_awws_metar_van_data[0])
+    for document in (newer_document, stale_document):
+        database.conditionally_write_data_documents_to_awws_database(
+            db=local_awws_metar_table_in_db, data_documents={0: document}
+        )
+
+    table_name = data_config["dynamodb"]["awws"]["metar-taf"]["table-name"]
+    table = local_awws_metar_table_in_db.Table(table_name)
+    stored_item = table.get_item(
+        Key={
+            "location": newer_document["location"],
+            "datetime": newer_document["datetime"],
+        }
+    )["Item"]
+    stored_document = database._read_document(
+        stored_item,
+        "metar-taf",
+        None,
+        data_config["dynamodb"]["awws"]["metar-taf"],
+    )
+    assert stored_document["encodedreport"] == newer_document["encodedreport"]
+
+
+@pytest.mark.local_db
+def test_conditional_write_replaces_batch_written_document(
+    local_awws_metar_table_in_db, data_config, known_awws_metar_van_data
+):
+    database.batch_write_data_documents_to_awws_database(
+        db=local_awws_metar_table_in_db, data_documents=known_awws_metar_van_data
+    )
+    amended_document = dict(known_awws_metar_van_data[0])
+    amended_document["encodedreport"] += " AMD"
+    write_counts = database.conditionally_write_data_documents_to_awws_database(
+        db=local_awws_metar_table_in_db, data_documents={0: amended_document}
+    )
+    assert write_counts["written"] == 1
+
+
+def test_conditional_write_skips_unreadable_report_timestamp(
+    known_awws_metar_van_data,
+):
+    put_requests = []
+    stand_in_db = types.SimpleNamespace(
+        Table=lambda table_name: types.SimpleNamespace(
+            put_item=lambda **request: put_requests.append(request)
+        )
+    )
+    unreadable_document = dict(known_awws_metar_van_data[1])
+    unreadable_document["report_timestamp"] = "2022-10-20 06:03"
+    write_counts = database.conditionally_write_data_documents_to_awws_database(
+        db=stand_in_db,
+        data_documents={0: known_awws_metar_van_data[0], 1: unreadable_document},
+    )
+    assert write_counts == {"written": 1, "skipped": 1, "conditional-check-failed": 0}
+    assert "attribute_not_exists(revision)" in put_requests[0]["ConditionExpression"]
+
+
+def test_content_hash_ignores_request_timestamp(known_awws_metar_van_data):
+    refetched_document = dict(known_awws_metar_van_data[0])
+    refetched_document["report_timestamp"] = "10/20/2022 06:03:30"
+    assert database.document_content_hash(
+        refetched_document
+    ) == database.document_content_hash(known_awws_metar_van_data[0])
+    assert database.document_revision(refetched_document) == "2022-10-20T06:03:30"
+
+
+@pytest.mark.local_db
+def test_query_reads_location_over_datetime_range(
+    local_awws_metar_table_in_db, known_awws_metar_van_data
+):
+    database.batch_write_data_documents_to_awws_database(
+        db=local_awws_metar_table_in_db, data_documents=known_awws_metar_van_data
+    )
+    documents = list(
+        database.query_awws_documents(
+            local_awws_metar_table_in_db,
+            "CYVR - VANCOUVER INTL/BC",
+            start="2022-10-19 19:29",
+            end="2022-10-19 20:59",
+            projection=["datetime", "temp / dewpoint"],
+            page_size=1,
+        )
+    )
+    assert [document["datetime"] for document in documents] == [
+        "2022-10-19 19:29 PDT",
+        "2022-10-19 20:00 PDT",
+    ]
+    assert set(documents[0]) == {"datetime", "temp / dewpoint"}
+
+
+@pytest.mark.local_db
+def test_segmented_scan_reads_every_document(
+    local_awws_metar_table_in_db,
+    known_awws_metar_van_data,
+    known_awws_metar_abbotsford_data,
+):
+    for data in (known_awws_metar_van_data, known_awws_metar_abbotsford_data):
+        database.batch_write_data_documents_to_awws_database(
+            db=local_awws_metar_table_in_db, data_documents=data
+        )
+    documents = list(
+        database.scan_awws_documents(
+            local_awws_metar_table_in_db, segments=3, page_size=1
+        )
+    )
+    assert len(documents) == 8
+
+
+@pytest.fixture
+def stubbed_scan_db():
+    db = boto3.resource(
+        "dynamodb",
+        region_name="us-west-1",
+        aws_access_key_id="stand-in",
+        aws_secret_access_key="stand-in",
+    )
+    scan_requests = []
+
+    def record_scan_request(params, **kwargs):
+        scan_requests.append(dict(params))
+
+    db.meta.client.meta.events.register(
+        "before-parameter-build.dynamodb.Scan", record_scan_request
+    )
+    with Stubber(db.meta.client) as stubber:
+        yield db, stubber, scan_requests
+
+
+def scan_response_items(data_documents, data_config):
+    serializer = TypeSerializer()
+    return [
+        {
+            attribute: serializer.serialize(value)
+            for attribute, value in database._storage_item(
+                data_document, data_config
+            ).items()
+        }
+        for data_document in data_documents
+    ]
+
+
+def test_segmented_scan_follows_segment_pages(
+    stubbed_scan_db, known_awws_metar_van_data, data_config
+):
+    db, stubber, _ = stubbed_scan_db
+    data_documents = [
+        document
+        for document in known_awws_metar_van_data.values()
+        if document.get("datetime")
+    ]
+    items = scan_response_items(data_documents, data_config)
+    table_name = data_config["dynamodb"]["awws"]["metar-taf"]["table-name"]
+    request_kwargs = {
+        "TableName": table_name,
+        "TotalSegments": 1,
+        "Segment": 0,
+        "Limit": 1,
+    }
+    for item_number, item in enumerate(items):
+        response = {"Items": [item]}
+        if item_number + 1 < len(items):
+            response["LastEvaluatedKey"] = {
+                "location": item["location"],
+                "datetime": item["datetime"],
+            }
+        expected_params = dict(request_kwargs)
+        if item_number:
+            expected_params["ExclusiveStartKey"] = {
+                "location": data_documents[item_number - 1]["location"],
+                "datetime": data_documents[item_number - 1]["datetime"],
+            }
+        stubber.add_response("scan", response, expected_params)
+
+    documents = list(database.scan_awws_documents(db, segments=1, page_size=1))
+    assert documents == data_documents
+    stubber.assert_no_pending_responses()
+
+
+def test_segmented_scan_reads_each_segment_with_projection(
+    stubbed_scan_db, known_awws_metar_van_data, data_config
+):
+    db, stubber, scan_requests = stubbed_scan_db
+    data_documents = [
+        document
+        for document in known_awws_metar_van_data.values()
+        if document.get("datetime")
+    ]
+    items = scan_response_items(data_documents, data_config)
+    for segment_items in (items[0::2], items[1::2]):
+        stubber.add_response("scan", {"Items": segment_items})
+
+    documents = list(
+        database.scan_awws_documents(db, segments=2, projection=["datetime"])
+    )
+    assert sorted(document["datetime"] for document in documents) == sorted(
+        document["datetime"] for document in data_documents
+    )
+    assert {request["Segment"] for request in scan_requests} == {0, 1}
+    assert all(
+        request["ExpressionAttributeNames"] == {"#field0": "datetime", "#field1": "v"}
+        for request in scan_requests
+    )
+
+
+def test_segmented_scan_stops_when_closed_early(
+    stubbed_scan_db, known_awws_metar_van_data, data_config
+):
+    db, stubber, scan_requests = stubbed_scan_db
+    (item,) = scan_response_items([known_awws_metar_van_data[0]], data_config)
+    for _ in range(100):
+        stubber.add_response(
+            "scan",
+            {
+                "Items": [item],
+                "LastEvaluatedKey": {
+                    "location": item["location"],
+                    "datetime": item["datetime"],
+                },
+            },
+        )
+    documents = database.scan_awws_documents(db, segments=2)
+    next(documents)
+    documents.close()
+    assert len(scan_requests) < 100
+
+
+@pytest.mark.parametrize(
+    "hour, expected_bucket",
+    [
+        ("2022-10-19 21:00 PDT", "2022-10-20T04"),
+        ("2022-10-19 19:29 PDT", "2022-10-20T02"),
+        # The hour repeated when daylight saving time ends.
+        ("2022-11-06 01:30 PDT", "2022-11-06T08"),
+        ("2022-11-06 01:30 PST", "2022-11-06T09"),
+        (datetime.datetime(2022, 10, 20, 4, 59), "2022-10-20T04"),
+        (
+            datetime.datetime(
+                2022,
+                10,
+                19,
+                21,
+                30,
+                tzinfo=datetime.timezone(datetime.timedelta(hours=-7)),
+            ),
+            "2022-10-20T04",
+        ),
+    ],
+)
+def test_hour_bucket_is_utc_hour(hour, expected_bucket):
+    assert database.hour_bucket(hour) == expected_bucket
+
+
+def test_stored_items_carry_hour_bucket(known_awws_metar_van_data, data_config):
+    stored_item = database._storage_item(known_awws_metar_van_data[0], data_config)
+    assert stored_item["hour_bucket"] == "2022-10-20T04"
+    table_config = data_config["dynamodb"]["awws"]["metar-taf"]
+    assert (
+        database._read_document(stored_item, "metar-taf", None, table_config)
+        == known_awws_metar_van_data[0]
+    )
+
+
+@pytest.mark.parametrize("item_encoding", ["plain", "compact"])
+def test_items_read_back_under_either_encoding(
+    item_encoding, known_awws_metar_van_data, data_config
+):
+    assert data_config["dynamodb"]["item-encoding"] == "plain"
+    data_config["dynamodb"]["item-encoding"] = item_encoding
+    stored_item = database._storage_item(known_awws_metar_van_data[0], data_config)
+    assert ("v" in stored_item) == (item_encoding == "compact")
+    table_config = data_config["dynamodb"]["awws"]["metar-taf"]
+    assert (
+        database._read_document(stored_item, "metar-taf", None, table_config)
+        == known_awws_metar_van_data[0]
+    )
+
+
+def test_time_slice_query_follows_index_pages(known_awws_metar_van_data, data_config):
+    items = [
+        database._storage_item(document, data_config)
+        for document in known_awws_metar_van_data.values()
+        if document.get("datetime")
+    ]
+    query_requests = []
+
+    def query(**request_kwargs):
+        query_requests.append(request_kwargs)
+        start = request_kwargs.get("ExclusiveStartKey", {}).get("offset", 0)
+        response = {"Items": [dict(items[start])]}
+        if start + 1 < len(items):
+            response["LastEvaluatedKey"] = {"offset": start + 1}
+        return response
+
+    stand_in_db = types.SimpleNamespace(
+        Table=lambda table_name: types.SimpleNamespace(query=query)
+    )
+    documents = list(
+        database.query_awws_time_slice(stand_in_db, "2022-10-19 21:00 PDT")
+    )
+    assert len(documents) == len(items) == len(query_requests)
+    assert all(
+        request["IndexName"] == "hour-bucket-index" for request in query_requests
+    )
+    assert all("hour_bucket" not in document for document in documents)
+
+
+@pytest.mark.local_db
+def test_time_slice_query_reads_every_station_at_hour(
+    local_awws_metar_table_in_db, known_awws_metar_van_data
+):
+    data_documents = dict(known_awws_metar_van_data)
+    for document_number, document in known_awws_metar_van_data.items():
+        data_documents[document_number + 100] = dict(
+            document, location="CYXX - ABBOTSFORD/BC"
+        )
+    database.batch_write_data_documents_to_awws_database(
+        db=local_awws_metar_table_in_db, data_documents=data_documents
+    )
+    documents = list(
+        database.query_awws_time_slice(
+            local_awws_metar_table_in_db, "2022-10-19 19:00 PDT", page_size=1
+        )
+    )
+    assert sorted(
+        (document["location"], document["datetime"]) for document in documents
+    ) == [
+        ("CYVR - VANCOUVER INTL/BC", "2022-10-19 19:00 PDT"),
+        ("CYVR - VANCOUVER INTL/BC", "2022-10-19 19:29 PDT"),
+        ("CYXX - ABBOTSFORD/BC", "2022-10-19 19:00 PDT"),
+        ("CYXX - ABBOTSFORD/BC", "2022-10-19 19:29 PDT"),
+    ]
+
+
+@pytest.mark.local_db
+def test_provisioning_adds_time_index_to_existing_table(local_dynamo_db, data_config):
+    table_config = data_config["dynamodb"]["awws"]["metar-taf"]
+    table_name = table_config["table-name"]
+    if table_name in local_dynamo_db.meta.client.list_tables()["TableNames"]:
+        local_dynamo_db.Table(table_name).delete()
+        local_dynamo_db.Table(table_name).wait_until_not_exists()
+    local_dynamo_db.create_table(
+        TableName=table_name,
+        KeySchema=[
+            {"AttributeName": table_config["partition-key"], "KeyType": "HASH"},
+            {"AttributeName": table_config["sort-key"], "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": table_config["partition-key"], "AttributeType": "S"},
+            {"AttributeName": table_config["sort-key"], "AttributeType": "S"},
+        ],
+        ProvisionedThroughput={"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
+    )
+    local_dynamo_db.Table(table_name).wait_until_exists()
+    try:
+        assert database.provision_awws_table(local_dynamo_db) == {
+            "table": False,
+            "time-index": True,
+        }
+        assert database.provision_awws_table(local_dynamo_db) == {
+            "table": False,
+            "time-index": False,
+        }
+    finally:
+        local_dynamo_db.Table(table_name).delete()
+
+
+def test_wait_for_index_polls_until_index_is_listed_and_active(monkeypatch):
+    monkeypatch.setattr(database.time, "sleep", lambda seconds: None)
+    table_descriptions = [{}]
+    for index_status in ("CREATING", "ACTIVE"):
+        table_descriptions.append(
+            {
+                "GlobalSecondaryIndexes": [
+                    {"IndexName": "hour-bucket-index", "IndexStatus": index_status}
+                ]
+            }
+        )
+    describe_calls = []
+
+    def describe_table(TableName):
+        describe_calls.append(TableName)
+        return {"Table": table_descriptions[len(describe_calls) - 1]}
+
+    stand_in_client = types.SimpleNamespace(describe_table=describe_table)
+    database._wait_for_index(stand_in_client, "awws", "hour-bucket-index")
+    assert len(describe_calls) == 3
+
+
+def test_wait_for_index_times_out_when_index_never_listed(monkeypatch):
+    monkeypatch.setattr(database.time, "sleep", lambda seconds: None)
+    stand_in_client = types.SimpleNamespace(
+        describe_table=lambda TableName: {"Table": {}}
+    )
+    with pytest.raises(TimeoutError):
+        database._wait_for_index(
+            stand_in_client, "awws", "hour-bucket-index", timeout=0
+        )
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+import webdriver_manager.chrome
+from selenium.common.exceptions import WebDriverException
+
+from src.data import driver_pool
+from src.data.driver_pool import WebDriverPool
+
+
+class StandInDriver:
+    """Records the calls the pool makes without starting a browser."""
+
+    def __init__(self):
+        self.visited = []
+        self.quit_called = False
+
+    def delete_all_cookies(self):
+        pass
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def stand_in_pool():
+    created_drivers = []
+
+    def driver_factory():
+        driver = StandInDriver()
+        created_drivers.append(driver)
+        return driver
+
+    pool = WebDriverPool(size=2, max_uses=3, driver_factory=driver_factory)
+    yield pool, created_drivers
+    pool.close()
+
+
+def test_pool_reuses_and_resets_warm_driver(stand_in_pool):
+    pool, created_drivers = stand_in_pool
+    with pool.lease() as first_driver:
+        pass
+    with pool.lease() as second_driver:
+        pass
+    assert first_driver is second_driver
+    assert len(created_drivers) == 1
+    assert first_driver.visited == ["about:blank", "about:blank"]
+
+
+def test_pool_recycles_crashed_driver(stand_in_pool):
+    pool, created_drivers = stand_in_pool
+    with pytest.raises(WebDriverException):
+        with pool.lease() as crashed_driver:
+            raise WebDriverException("chrome not reachable")
+    assert crashed_driver.quit_called
+    with pool.lease() as new_driver:
+        assert new_driver is not crashed_driver
+    assert len(created_drivers) == 2
+
+
+def test_pool_recycles_driver_after_max_uses(stand_in_pool):
+    pool, created_drivers = stand_in_pool
+    for _ in range(3):
+        with pool.lease():
+            pass
+    assert created_drivers[0].quit_called
+    with pool.lease() as driver:
+        assert driver is not created_drivers[0]
+
+
+def test_pool_lease_times_out_when_exhausted():
+    pool = WebDriverPool(size=1, lease_timeout=0.01, driver_factory=StandInDriver)
+    with pool.lease():
+        with pytest.raises(TimeoutError):
+            with pool.lease():
+                pass
+    pool.close()
+
+
+def test_pool_close_quits_idle_drivers(stand_in_pool):
+    pool, created_drivers = stand_in_pool
+    with pool.lease():
+        pass
+    pool.close()
+    assert created_drivers[0].quit_called
+    with pytest.raises(RuntimeError):
+        with pool.lease():
+            pass
+
+
+def test_chromedriver_path_installs_once_and_caches_on_disk(tmp_path, monkeypatch):
+    driver_binary = tmp_path / "chromedriver"
+    driver_binary.write_text("")
+    installs = []
+
+    class StandInDriverManager:
+        def __init__(self, version, chrome_type):
+            self.version = version
+
+        def install(self):
+            installs.append(self.version)
+            return str(driver_binary)
+
+    monkeypatch.setattr(
+        webdriver_manager.chrome, "ChromeDriverManager", StandInDriverManager
+    )
+    monkeypatch.setattr(driver_pool, "_chromedriver_paths", {})
+    cache_path = str(tmp_path / "chromedriver_path.json")
+
+    assert driver_pool.chromedriver_path("108", cache_path) == str(driver_binary)
+    assert driver_pool.chromedriver_path("108", cache_path) == str(driver_binary)
+    with open(cache_path) as f:
+        assert json.load(f) == {"108": str(driver_binary)}
+
+    # A new process reads the path from disk instead of installing.
+    monkeypatch.setattr(driver_pool, "_chromedriver_paths", {})
+    assert driver_pool.chromedriver_path("108", cache_path) == str(driver_binary)
+    assert installs == ["108"]
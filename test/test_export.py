@@ -0,0 +1,99 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from src.data import export
+
+
+@pytest.fixture
+def known_awws_metar_documents():
+    documents = []
+    for path in [
+        "test/known_awws_metar_van_data.json",
+        "test/known_awws_metar_abbotsford_data.json",
+    ]:
+        with open(path) as f:
+            documents.extend(json.load(f).values())
+    return documents
+
+
+def test_decode_known_document(known_awws_metar_documents):
+    decoded = export.decode_awws_document(known_awws_metar_documents[5])
+    assert decoded == {
+        "wind_direction_deg": 200.0,
+        "wind_speed_kt": 7.0,
+        "wind_gust_kt": 0.0,
+        "visibility_sm": 5.0,
+        "ceiling_ft": 4700.0,
+        "temperature_c": 11.0,
+        "dewpoint_c": 10.0,
+        "altimeter_inhg": 29.91,
+    }
+
+
+@pytest.mark.parametrize(
+    "data_document, column, expected_value",
+    [
+        ({"wind": ["CALM"]}, "wind_speed_kt", 0.0),
+        ({"wind": ["VRB @ 2 KNOTS"]}, "wind_direction_deg", math.nan),
+        (
+            {"wind": ["250 TRUE @ 15 KNOTS GUSTING TO 25 KNOTS"]},
+            "wind_gust_kt",
+            25.0,
+        ),
+        ({"visibility": ["1 1/2 STAT. MILES"]}, "visibility_sm", 1.5),
+        ({"visibility": ["3/4 STAT. MILES"]}, "visibility_sm", 0.75),
+        ({"cloudiness": ["FEW CLOUDS (1/8 - 2/8) 12000 FT"]}, "ceiling_ft", math.inf),
+        ({"temp / dewpoint": ["-2 C /", "-5 C"]}, "dewpoint_c", -5.0),
+        ({}, "altimeter_inhg", math.nan),
+    ],
+)
+def test_decode_measurement_variants(data_document, column, expected_value):
+    decoded_value = export.decode_awws_document(data_document)[column]
+    if math.isnan(expected_value):
+        assert math.isnan(decoded_value)
+    else:
+        assert decoded_value == expected_value
+
+
+def test_documents_to_columns_are_typed(known_awws_metar_documents):
+    columns = export.awws_documents_to_columns(known_awws_metar_documents)
+    assert columns["observed_at"].dtype == np.dtype("datetime64[s]")
+    assert columns["observed_at"][0] == np.datetime64("2022-10-20T04:00:00")
+    assert columns["ceiling_ft"].dtype == np.float32
+    observation_count = sum(
+        1 for document in known_awws_metar_documents if document.get("date - time")
+    )
+    assert len(columns["location"]) == observation_count
+    assert not np.isnat(columns["observed_at"]).any()
+
+
+def test_documents_to_columns_can_keep_tafs(known_awws_metar_documents):
+    columns = export.awws_documents_to_columns(
+        known_awws_metar_documents, observations_only=False
+    )
+    assert len(columns["location"]) == len(known_awws_metar_documents)
+    assert np.isnat(columns["observed_at"]).any()
+
+
+@pytest.mark.parametrize("suffix", [".npz", ".parquet", ".arrow"])
+def test_export_round_trip(known_awws_metar_documents, tmp_path, suffix):
+    if suffix != ".npz":
+        pytest.importorskip("pyarrow")
+    path = str(tmp_path / f"metar{suffix}")
+    row_count = export.export_awws_documents(
+        known_awws_metar_documents, path, chunk_size=3
+    )
+    expected_columns = export.awws_documents_to_columns(known_awws_metar_documents)
+    exported_columns = export.read_awws_columns(path)
+    assert row_count == len(expected_columns["location"])
+    assert exported_columns.keys() == expected_columns.keys()
+    for column, expected_values in expected_columns.items():
+        np.testing.assert_array_equal(exported_columns[column], expected_values)
+
+
+def test_export_rejects_unknown_format(known_awws_metar_documents, tmp_path):
+    with pytest.raises(ValueError):
+        export.export_awws_documents(known_awws_metar_documents, str(tmp_path / "x"))
@@ -0,0 +1,171 @@
+import math
+import os
+
+import numpy as np
+import pytest
+
+import src.data.scraping as scraping
+from src.data import feature_store, metar_decoding
+from src.data.feature_store import FeatureStore
+
+
+VANCOUVER = "CYVR - VANCOUVER INTL/BC"
+
+
+def make_document(sort_key_datetime, visibility, gust, ceiling, spread, **decoded):
+    cloud_layers = [] if ceiling is None else [{"cover": "BKN", "height_ft": ceiling}]
+    return {
+        "report": "metar-taf",
+        "location": VANCOUVER,
+        "datetime": sort_key_datetime,
+        "decoded": {
+            "report_kind": "METAR",
+            "wind_speed_kt": 10.0,
+            "wind_gust_kt": gust,
+            "visibility_sm": visibility,
+            "cloud_layers": cloud_layers,
+            "temperature_c": 10.0,
+            "dewpoint_c": 10.0 - spread,
+            **decoded,
+        },
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FeatureStore(path=str(tmp_path / "features"))
+
+
+@pytest.fixture
+def hourly_documents():
+    return dict(
+        enumerate(
+            [
+                make_document("2022-10-19 10:00 PDT", 15.0, 0.0, 5000, 6.0),
+                make_document("2022-10-19 18:00 PDT", 3.0, 25.0, 3000, 2.0),
+                make_document("2022-10-19 19:00 PDT", 6.0, 18.0, 2500, 3.0),
+                make_document("2022-10-19 19:29 PDT", 5.0, 0.0, 2000, 1.0),
+                make_document("2022-10-19 21:00 PDT", 9.0, 0.0, 1500, 4.0),
+            ]
+        )
+    )
+
+
+def test_features_aggregate_rolling_windows(store, hourly_documents):
+    assert store.update(hourly_documents) == len(hourly_documents)
+    features = store.features(VANCOUVER)
+    # 3h: 19:00 - 21:59, 6h: 16:00 - 21:59, 24h: every report.
+    assert features["visibility_min_sm_3h"] == 5.0
+    assert features["visibility_min_sm_6h"] == 3.0
+    assert features["peak_wind_max_kt_3h"] == 18.0
+    assert features["peak_wind_max_kt_6h"] == 25.0
+    assert features["peak_wind_max_kt_24h"] == 25.0
+    assert features["ceiling_trend_ft_3h"] == 1500 - 2500
+    assert features["ceiling_trend_ft_6h"] == 1500 - 3000
+    assert features["ceiling_trend_ft_24h"] == 1500 - 5000
+    assert features["spread_min_c_3h"] == 1.0
+    assert features["spread_min_c_24h"] == 1.0
+    assert features["visibility_sm"] == 9.0
+    assert features["ceiling_ft"] == 1500
+    assert features["spread_c"] == 4.0
+    assert features["report_time"] == (
+        scraping.sort_key_utc_datetime("2022-10-19 21:00 PDT").timestamp()
+    )
+
+
+def test_incremental_updates_match_one_batch(tmp_path, store, hourly_documents):
+    store.update(hourly_documents)
+    incremental_store = FeatureStore(path=str(tmp_path / "incremental"))
+    # Newest first, as pages list them, and with repeats.
+    for document_number in [4, 3, 2, 1, 0, 3, 4]:
+        incremental_store.update({0: hourly_documents[document_number]})
+    np.testing.assert_array_equal(
+        incremental_store.feature_row(VANCOUVER), store.feature_row(VANCOUVER)
+    )
+
+
+def test_reports_past_longest_window_are_dropped(store, hourly_documents):
+    store.update(hourly_documents)
+    late_document = make_document("2022-10-20 20:00 PDT", 2.0, 40.0, 800, 0.0)
+    assert store.update({0: late_document}) == 1
+    assert store.update({0: hourly_documents[0]}) == 0
+    features = store.features(VANCOUVER)
+    # Only the 21:00 report is left within 24 hours of the late one.
+    assert features["visibility_min_sm_24h"] == 2.0
+    assert features["ceiling_trend_ft_24h"] == 800 - 1500
+    assert features["visibility_min_sm_3h"] == 2.0
+    assert features["ceiling_trend_ft_3h"] == 0
+
+
+def test_unknown_measurements_and_tafs_are_skipped(store):
+    data_documents = {
+        0: make_document("2022-10-19 21:00 PDT", 9.0, 0.0, None, 4.0),
+        1: make_document("2022-10-19 21:30 PDT", math.nan, 0.0, 1500, 4.0),
+        2: make_document("2022-10-19 22:00 PDT", 1.0, 0.0, 800, 0.0, report_kind="TAF"),
+        3: {"report": "metar-taf", "location": VANCOUVER},
+    }
+    assert store.update(data_documents) == 2
+    features = store.features(VANCOUVER)
+    assert features["visibility_min_sm_3h"] == 9.0
+    assert math.isnan(features["visibility_sm"])
+    # A clear sky counts as the unlimited ceiling.
+    assert features["ceiling_trend_ft_3h"] == 1500 - 12000
+    assert store.features("CYXX - ABBOTSFORD/BC") is None
+
+
+def test_store_persists_and_reloads(tmp_path, store, hourly_documents):
+    store.update(hourly_documents)
+    reopened_store = FeatureStore(path=store.path)
+    assert reopened_store.stations() == [VANCOUVER]
+    np.testing.assert_array_equal(
+        reopened_store.feature_row(VANCOUVER), store.feature_row(VANCOUVER)
+    )
+    # Updates from another store sharing the file are picked up.
+    reopened_store.update(
+        {0: make_document("2022-10-19 22:00 PDT", 1.0, 0.0, 800, 0.0)}
+    )
+    assert store.features(VANCOUVER)["visibility_min_sm_3h"] == 1.0
+
+
+def test_updates_write_station_rows_in_place(store, hourly_documents):
+    store.update({0: hourly_documents[0]})
+    slots_path = os.path.join(store.path, feature_store.SLOTS_FILENAME)
+    index_path = os.path.join(store.path, feature_store.INDEX_FILENAME)
+    stored_files = (os.stat(slots_path).st_ino, os.stat(index_path).st_mtime_ns)
+
+    store.update({1: hourly_documents[1]})
+    assert (os.stat(slots_path).st_ino, os.stat(index_path).st_mtime_ns) == (
+        stored_files
+    )
+    assert FeatureStore(path=store.path).features(VANCOUVER)["visibility_sm"] == 3.0
+
+    # A new station rewrites the arrays, which other stores pick up.
+    abbotsford_document = dict(hourly_documents[1], location="CYXX - ABBOTSFORD/BC")
+    FeatureStore(path=store.path).update({0: abbotsford_document})
+    assert os.stat(slots_path).st_ino != stored_files[0]
+    assert store.stations() == [VANCOUVER, "CYXX - ABBOTSFORD/BC"]
+    store.update({2: hourly_documents[2]})
+    assert FeatureStore(path=store.path).features(VANCOUVER)["visibility_sm"] == 6.0
+
+
+def test_known_documents_update_store(store):
+    with open("test/known_awws_metar_van_source.html") as f:
+        page_data = metar_decoding.attach_decoded_records(
+            scraping.parse_awws_pagesource(f.read())
+        )
+    assert store.update(page_data) == sum(
+        1 for data_document in page_data.values() if data_document.get("datetime")
+    )
+    features = store.features(VANCOUVER)
+    assert set(features) == set(store.feature_names)
+    assert not math.isnan(features["visibility_min_sm_24h"])
+
+
+def test_get_feature_store_is_shared(monkeypatch, tmp_path):
+    monkeypatch.setattr(feature_store, "_store", None)
+    monkeypatch.setattr(
+        feature_store,
+        "FeatureStore",
+        lambda: FeatureStore(path=str(tmp_path / "features")),
+    )
+    assert feature_store.get_feature_store() is feature_store.get_feature_store()
@@ -0,0 +1,103 @@
+import http.server
+import threading
+import urllib.parse
+
+import pytest
+import requests
+
+from src.data import fetching
+import src.data.scraping as scraping
+
+
+class StandInAWWSHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the saved AWWS page for the posted station code."""
+
+    fixture_paths = {
+        "CYVR": "test/known_awws_metar_van_source.html",
+        "CYXX": "test/known_awws_metar_abbotsford_source.html",
+    }
+    received_forms = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        form = dict(urllib.parse.parse_qsl(body))
+        self.received_forms.append(form)
+        if self.path.endswith("Missing.pl"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.path.endswith("Landing.pl"):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"<html><body>Landing page.</body></html>")
+            return
+        fixture_path = self.fixture_paths[form["Stations"]]
+        with open(fixture_path, "rb") as f:
+            page = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_awws_url():
+    server = http.server.ThreadingHTTPServer(("localhost", 0), StandInAWWSHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StandInAWWSHandler.received_forms.clear()
+    yield f"http://localhost:{server.server_address[1]}/cgi-bin/CreePage.pl"
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_posts_station_code_and_decoded_format(stand_in_awws_url):
+    fetching.fetch_awws_metar_pagesource("vancouver", url=stand_in_awws_url)
+    form = StandInAWWSHandler.received_forms[0]
+    assert form["Stations"] == "CYVR"
+    assert form["Format"] == "dcd"
+
+
+@pytest.mark.parametrize(
+    "location, known_source_path",
+    [
+        ("vancouver", "test/known_awws_metar_van_source.html"),
+        ("abbotsford", "test/known_awws_metar_abbotsford_source.html"),
+    ],
+)
+def test_fetched_source_parses_like_scraped_source(
+    stand_in_awws_url, location, known_source_path
+):
+    page_source = fetching.fetch_awws_metar_pagesource(location, url=stand_in_awws_url)
+    with open(known_source_path) as f:
+        known_page_source = f.read()
+    assert scraping.parse_awws_pagesource(page_source) == (
+        scraping.parse_awws_pagesource(known_page_source)
+    )
+
+
+def test_fetch_raises_when_page_is_not_a_report(stand_in_awws_url):
+    landing_page_url = stand_in_awws_url.replace("CreePage.pl", "Landing.pl")
+    with pytest.raises(ValueError):
+        fetching.fetch_awws_metar_pagesource("vancouver", url=landing_page_url)
+
+
+def test_fetch_raises_on_error_status(stand_in_awws_url):
+    missing_page_url = stand_in_awws_url.replace("CreePage.pl", "Missing.pl")
+    with pytest.raises(requests.HTTPError):
+        fetching.fetch_awws_metar_pagesource(
+            "vancouver", session=requests.Session(), url=missing_page_url
+        )
+
+
+def test_fetch_posts_batched_station_codes_together(stand_in_awws_url):
+    landing_page_url = stand_in_awws_url.replace("CreePage.pl", "Landing.pl")
+    with pytest.raises(ValueError):
+        fetching.fetch_awws_metar_pagesource(
+            ["vancouver", "abbotsford"], url=landing_page_url
+        )
+    assert StandInAWWSHandler.received_forms[0]["Stations"] == "CYVR CYXX"
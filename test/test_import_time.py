@@ -0,0 +1,58 @@
+import subprocess
+import sys
+
+import pytest
+
+
+# Cumulative import time budgets (microseconds, from -X importtime),
+# generous enough for slow CI machines but far below eager imports.
+IMPORT_BUDGETS_US = {
+    "src.data.scraping": 250_000,
+    "src.data.database": 250_000,
+    "src.data.driver_pool": 250_000,
+}
+# Dependencies only the Selenium, HTTP, soup parser or DynamoDB paths need.
+LAZY_DEPENDENCIES = [
+    "selenium",
+    "webdriver_manager",
+    "bs4",
+    "lxml",
+    "pytz",
+    "requests",
+    "boto3",
+    "botocore",
+    "pyarrow",
+]
+
+
+def import_times(module: str) -> dict:
+    """
+    Imports the module in a fresh interpreter, returning -X importtime's
+    cumulative microseconds per imported module.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", IMPORT_BUDGETS_US)
+def test_module_imports_within_budget(module):
+    times = import_times(module)
+    assert times[module] < IMPORT_BUDGETS_US[module]
+
+
+@pytest.mark.parametrize("module", IMPORT_BUDGETS_US)
+def test_module_leaves_heavy_dependencies_unimported(module):
+    imported_packages = {name.split(".")[0] for name in import_times(module)}
+    assert not imported_packages.intersection(LAZY_DEPENDENCIES)
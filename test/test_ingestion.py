@@ -0,0 +1,156 @@
+import contextlib
+import functools
+
+import pytest
+from botocore.exceptions import ClientError
+
+import src.data.database as database
+import src.data.scraping as scraping
+from src.data import metar_decoding, write_spool
+from src.data.ingestion_index import IngestionIndex
+from src.data.write_spool import WriteSpool
+from src.orchestration import ingestion
+
+
+KNOWN_SOURCE_PATHS = {
+    "vancouver": "test/known_awws_metar_van_source.html",
+    "abbotsford": "test/known_awws_metar_abbotsford_source.html",
+}
+
+
+def scrape_known_sources(locations=None, **scraping_kwargs):
+    page_sources = {}
+    for location in locations:
+        with open(KNOWN_SOURCE_PATHS[location]) as f:
+            page_sources[(location,)] = f.read()
+    return page_sources
+
+
+@pytest.fixture
+def index_path(monkeypatch, tmp_path):
+    index_path = str(tmp_path / "index.sqlite3")
+
+    @contextlib.contextmanager
+    def stand_in_connection(environment=None, **boto_client_kwargs):
+        yield None
+
+    monkeypatch.setattr(database, "dynamodb_connection", stand_in_connection)
+    monkeypatch.setattr(
+        scraping, "scrape_awws_metar_batch_pagesources", scrape_known_sources
+    )
+    monkeypatch.setattr(
+        ingestion, "IngestionIndex", functools.partial(IngestionIndex, index_path)
+    )
+    return index_path
+
+
+@pytest.fixture
+def written_documents(monkeypatch):
+    written_documents = []
+
+    def stand_in_writer(db, data_documents):
+        written_documents.extend(data_documents.values())
+        return {"written": len(data_documents), "unprocessed": 0}
+
+    monkeypatch.setattr(
+        database, "get_awws_document_writer", lambda write_mode=None: stand_in_writer
+    )
+    return written_documents
+
+
+def test_pipeline_writes_documents_and_skips_unchanged_page_on_rerun(
+    index_path, written_documents
+):
+    pipeline_kwargs = dict(
+        locations=["vancouver", "abbotsford"],
+        archive_pages=False,
+        write_behind=False,
+        compute_features=False,
+    )
+    ingestion.awws_metar_ingestion_pipeline(**pipeline_kwargs)
+    expected_documents = [
+        data_document
+        for location in ("vancouver", "abbotsford")
+        for data_document in metar_decoding.attach_decoded_records(
+            scraping.parse_awws_pagesource(
+                scrape_known_sources([location])[(location,)]
+            )
+        ).values()
+    ]
+    assert sorted(written_documents, key=str) == sorted(expected_documents, key=str)
+
+    written_documents.clear()
+    ingestion.awws_metar_ingestion_pipeline(**pipeline_kwargs)
+    assert written_documents == []
+
+
+def test_pipeline_ingests_scraped_batches_before_raising_failed_ones(
+    index_path, written_documents, monkeypatch
+):
+    def partly_failing_scrape(locations=None, **scraping_kwargs):
+        raise scraping.PageSourceScrapeError(
+            [("abbotsford",)], scrape_known_sources(["vancouver"])
+        )
+
+    monkeypatch.setattr(
+        scraping, "scrape_awws_metar_batch_pagesources", partly_failing_scrape
+    )
+    with pytest.raises(scraping.PageSourceScrapeError):
+        ingestion.awws_metar_ingestion_pipeline(
+            locations=["vancouver", "abbotsford"],
+            archive_pages=False,
+            write_behind=False,
+            compute_features=False,
+        )
+    assert written_documents
+    assert {document["location"] for document in written_documents} == {
+        "CYVR - VANCOUVER INTL/BC"
+    }
+
+
+def test_dead_lettered_documents_are_respooled_on_rerun(
+    index_path, monkeypatch, tmp_path
+):
+    written_documents = []
+
+    def rejecting_writer(db, data_documents):
+        raise ClientError(
+            {"Error": {"Code": "ValidationException", "Message": "Rejected"}},
+            "BatchWriteItem",
+        )
+
+    def stand_in_writer(db, data_documents):
+        written_documents.extend(data_documents.values())
+        return {"written": len(data_documents), "unprocessed": 0}
+
+    spool = WriteSpool(path=str(tmp_path / "spool"), ingestion_index_path=index_path)
+    monkeypatch.setattr(write_spool, "get_write_spool", lambda: spool)
+    pipeline_kwargs = dict(
+        locations=["vancouver"],
+        archive_pages=False,
+        write_behind=True,
+        compute_features=False,
+    )
+    with spool:
+        ingestion.awws_metar_ingestion_pipeline(**pipeline_kwargs)
+        monkeypatch.setattr(
+            database,
+            "get_awws_document_writer",
+            lambda write_mode=None: rejecting_writer,
+        )
+        for _ in range(spool.max_attempts - 1):
+            with pytest.raises(ClientError):
+                spool.flush()
+        assert spool.flush()["dead-lettered"] == 1
+
+        ingestion.awws_metar_ingestion_pipeline(**pipeline_kwargs)
+        monkeypatch.setattr(
+            database,
+            "get_awws_document_writer",
+            lambda write_mode=None: stand_in_writer,
+        )
+        flush_counts = spool.flush()
+    assert flush_counts["documents"] == len(written_documents) > 0
+    assert {document["location"] for document in written_documents} == {
+        "CYVR - VANCOUVER INTL/BC"
+    }
@@ -0,0 +1,72 @@
+import copy
+import json
+
+import pytest
+
+from src.data.ingestion_index import IngestionIndex
+
+
+@pytest.fixture
+def known_awws_metar_van_data():
+    with open("test/known_awws_metar_van_data.json") as f:
+        data = json.load(f)
+    # Update JSON (string) keys to the integers we create during scraping.
+    return {int(table_num): table_data for table_num, table_data in data.items()}
+
+
+@pytest.fixture
+def known_awws_metar_van_source():
+    with open("test/known_awws_metar_van_source.html") as f:
+        return f.read()
+
+
+@pytest.fixture
+def ingestion_index(tmp_path):
+    with IngestionIndex(str(tmp_path / "index.sqlite3")) as index:
+        yield index
+
+
+def test_written_documents_are_filtered_on_next_run(
+    ingestion_index, known_awws_metar_van_data
+):
+    first_run = ingestion_index.filter_new_documents(known_awws_metar_van_data)
+    assert len(first_run) == len(known_awws_metar_van_data)
+    ingestion_index.mark_documents_written(first_run)
+
+    # Only the TAF table (no datetime, never indexed) comes back.
+    second_run = ingestion_index.filter_new_documents(known_awws_metar_van_data)
+    assert list(second_run) == [0]
+    assert "datetime" not in second_run[0]
+
+
+def test_amended_report_is_treated_as_changed(
+    ingestion_index, known_awws_metar_van_data
+):
+    ingestion_index.mark_documents_written(known_awws_metar_van_data)
+    amended_data = copy.deepcopy(known_awws_metar_van_data)
+    amended_data[1]["encodedreport"] += " AMD"
+    new_documents = ingestion_index.filter_new_documents(amended_data)
+    assert amended_data[1] in new_documents.values()
+    assert amended_data[0] not in new_documents.values()
+
+
+def test_page_unchanged_ignores_request_timestamp(
+    ingestion_index, known_awws_metar_van_source
+):
+    page_key = "vancouver"
+    assert not ingestion_index.page_unchanged(page_key, known_awws_metar_van_source)
+    ingestion_index.record_page(page_key, known_awws_metar_van_source)
+
+    refetched_source = known_awws_metar_van_source.replace("05:03:30", "05:13:30")
+    assert ingestion_index.page_unchanged(page_key, refetched_source)
+
+    changed_source = known_awws_metar_van_source.replace("A3022", "A3021")
+    assert not ingestion_index.page_unchanged(page_key, changed_source)
+
+
+def test_index_persists_between_runs(tmp_path, known_awws_metar_van_data):
+    index_path = str(tmp_path / "index.sqlite3")
+    with IngestionIndex(index_path) as index:
+        index.mark_documents_written(known_awws_metar_van_data)
+    with IngestionIndex(index_path) as index:
+        assert len(index.filter_new_documents(known_awws_metar_van_data)) == 1
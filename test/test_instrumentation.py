@@ -0,0 +1,86 @@
+import contextlib
+import json
+
+import pytest
+
+import src.data.scraping as scraping
+from src import config, instrumentation
+
+
+@instrumentation.timed("stand-in")
+def stand_in_stage(value):
+    instrumentation.count("stand-in-calls")
+    return value
+
+
+def test_timers_do_nothing_while_disabled():
+    assert not instrumentation.is_enabled()
+    assert stand_in_stage(3) == 3
+    assert isinstance(instrumentation.stage_timer("parse"), contextlib.nullcontext)
+
+
+def test_recording_collects_stage_latencies_and_counters():
+    with instrumentation.recording(buckets=[0.5, 1]) as run_metrics:
+        stand_in_stage(1)
+        stand_in_stage(2)
+        with instrumentation.stage_timer("parse"):
+            with open("test/known_awws_metar_van_source.html") as f:
+                scraping.parse_awws_pagesource(f.read())
+        instrumentation.count("documents-written", 5)
+    assert not instrumentation.is_enabled()
+
+    report = run_metrics.report()
+    assert report["counters"] == {"stand-in-calls": 2, "documents-written": 5}
+    assert report["stages"]["stand-in"]["count"] == 2
+    assert report["stages"]["stand-in"]["buckets"] == {"0.5": 2, "1": 2, "+Inf": 2}
+    # The timed parse_awws_pagesource() call and the stage timer around it.
+    assert report["stages"]["parse"]["count"] == 2
+    assert report["documents-per-second"] > 0
+
+
+def test_prometheus_textfile(tmp_path):
+    with instrumentation.recording(buckets=[1]) as run_metrics:
+        stand_in_stage(1)
+    textfile_path = tmp_path / "propeller.prom"
+    run_metrics.write_prometheus_textfile(str(textfile_path))
+    lines = textfile_path.read_text().splitlines()
+    assert "propeller_stand_in_calls_total 1" in lines
+    assert 'propeller_stage_duration_seconds_count{stage="stand-in"} 1' in lines
+    assert 'propeller_stage_duration_seconds_bucket{stage="stand-in",le="+Inf"} 1' in (
+        lines
+    )
+
+
+@pytest.fixture
+def instrumentation_config(monkeypatch, tmp_path):
+    ingestion_config = json.loads(
+        json.dumps(config.load_config("config/ingestion.yml"))
+    )
+    ingestion_config["instrumentation"].update(
+        {
+            "enabled": True,
+            "report-path": str(tmp_path / "{run}.json"),
+            "prometheus-textfile": str(tmp_path / "{run}.prom"),
+        }
+    )
+    load_config = config.load_config
+    monkeypatch.setattr(
+        config,
+        "load_config",
+        lambda filepath: ingestion_config
+        if filepath == "config/ingestion.yml"
+        else load_config(filepath),
+    )
+    return ingestion_config
+
+
+def test_instrumented_run_writes_reports(instrumentation_config, tmp_path):
+    @instrumentation.instrumented_run("stand-in-run")
+    def stand_in_run():
+        stand_in_stage(1)
+
+    stand_in_run()
+    with open(tmp_path / "stand-in-run.json") as f:
+        report = json.load(f)
+    assert report["stages"]["stand-in"]["count"] == 1
+    assert (tmp_path / "stand-in-run.prom").exists()
@@ -0,0 +1,118 @@
+import json
+
+import pytest
+from boto3.dynamodb.types import Binary
+
+import src.data.scraping as scraping
+from src import config
+from src.data import item_codec, metar_decoding
+
+
+KNOWN_SOURCE_PATHS = [
+    "test/known_awws_metar_abbotsford_source.html",
+    "test/known_awws_metar_van_source.html",
+]
+
+
+@pytest.fixture
+def table_config():
+    return config.load_config("config/data.yml")["dynamodb"]["awws"]["metar-taf"]
+
+
+@pytest.fixture(params=KNOWN_SOURCE_PATHS)
+def known_documents(request):
+    with open(request.param) as f:
+        page_data = scraping.parse_awws_pagesource(f.read())
+    return list(metar_decoding.attach_decoded_records(page_data).values())
+
+
+def test_item_decodes_to_original_document(known_documents, table_config):
+    for data_document in known_documents:
+        item = item_codec.encode_awws_item(data_document, table_config)
+        assert item_codec.decode_awws_item(item) == data_document
+
+
+def test_item_decodes_from_boto3_binary(known_documents, table_config):
+    item = item_codec.encode_awws_item(known_documents[0], table_config)
+    item[item_codec.FIELDS_ATTRIBUTE] = Binary(item[item_codec.FIELDS_ATTRIBUTE])
+    assert item_codec.decode_awws_item(item) == known_documents[0]
+
+
+def test_item_is_smaller_than_document(known_documents, table_config):
+    for data_document in known_documents:
+        item = item_codec.encode_awws_item(data_document, table_config)
+        item_size = sum(
+            len(attribute) + len(value) if isinstance(value, (str, bytes)) else 1
+            for attribute, value in item.items()
+        )
+        assert item_size < len(json.dumps(data_document)) * 0.6
+
+
+def test_item_keeps_keys_and_drops_redundant_fields(known_documents, table_config):
+    data_document = known_documents[0]
+    item = item_codec.encode_awws_item(data_document, table_config)
+    assert item["location"] == data_document["location"]
+    assert item["datetime"] == data_document["datetime"]
+    assert item["v"] == item_codec.ITEM_CODEC_VERSION
+    assert "report" not in item
+    packed_fields = json.loads(item_codec._decompress(item["f"]))
+    assert "dt" not in packed_fields
+    assert "w" in packed_fields
+
+
+def test_item_keeps_date_time_not_matching_sort_key(table_config):
+    data_document = {
+        "report": "metar-taf",
+        "location": "CYVR - VANCOUVER INTL/BC",
+        "datetime": "2022-10-19 21:00 PDT",
+        "date - time": ["20 OCT 2022 - 0400 UTC"],
+    }
+    item = item_codec.encode_awws_item(data_document, table_config)
+    assert json.loads(item_codec._decompress(item["f"])) == {
+        "dt": ["20 OCT 2022 - 0400 UTC"]
+    }
+    assert item_codec.decode_awws_item(item) == data_document
+
+
+@pytest.mark.parametrize(
+    "sort_key_datetime, expected",
+    [
+        ("2022-10-19 21:00 PDT", ["20 OCTOBER 2022 - 0400 UTC"]),
+        # The hour repeated when daylight saving time ends.
+        ("2022-11-06 01:30 PDT", ["06 NOVEMBER 2022 - 0830 UTC"]),
+        ("2022-11-06 01:30 PST", ["06 NOVEMBER 2022 - 0930 UTC"]),
+        ("2022-10-19 21:00 UTC", None),
+    ],
+)
+def test_rebuild_date_time_from_sort_key(sort_key_datetime, expected):
+    assert item_codec._rebuild_date_time(sort_key_datetime) == expected
+
+
+def test_plain_item_decodes_unchanged(known_documents):
+    assert item_codec.decode_awws_item(dict(known_documents[0])) == known_documents[0]
+
+
+def test_unknown_item_version_raises():
+    with pytest.raises(ValueError):
+        item_codec.decode_awws_item({"v": 99, "location": "CYVR"})
+
+
+def test_projection_reads_compact_and_plain_attributes(known_documents, table_config):
+    projection = ["location", "wind", "encodedreport"]
+    assert item_codec.item_projection(projection, table_config) == [
+        "encodedreport",
+        "er",
+        "f",
+        "location",
+        "v",
+        "wind",
+    ]
+    item = item_codec.encode_awws_item(known_documents[0], table_config)
+    projected_item = {
+        attribute: value
+        for attribute, value in item.items()
+        if attribute in item_codec.item_projection(projection, table_config)
+    }
+    assert item_codec.project_document(
+        item_codec.decode_awws_item(projected_item), projection
+    ) == {field: known_documents[0][field] for field in projection}
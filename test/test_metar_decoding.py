@@ -0,0 +1,102 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from src.data import database, export, metar_decoding
+from src.data.metar_decoding import MetarRecord
+
+
+@pytest.fixture
+def known_awws_metar_abbotsford_data():
+    with open("test/known_awws_metar_abbotsford_data.json") as f:
+        data = json.load(f)
+    return {int(table_num): table_data for table_num, table_data in data.items()}
+
+
+def test_decode_encoded_metar():
+    record = metar_decoding.decode_encoded_report(
+        "METAR CYXX 280500Z 16005KT 5SM -RA SCT038 BKN054 OVC066 10/10 A2989 RMK SC3"
+    )
+    assert record == MetarRecord(
+        station="CYXX",
+        report_kind="METAR",
+        day=28,
+        hour=5,
+        minute=0,
+        wind_direction_deg=160.0,
+        wind_speed_kt=5.0,
+        wind_gust_kt=0.0,
+        visibility_sm=5.0,
+        cloud_layers=(("SCT", 3800), ("BKN", 5400), ("OVC", 6600)),
+        temperature_c=10.0,
+        dewpoint_c=10.0,
+        altimeter_inhg=29.89,
+    )
+    assert record.ceiling_ft == 5400
+
+
+@pytest.mark.parametrize(
+    "encoded_report, field, expected_value",
+    [
+        ("TAF CYXX 272340Z 2800/2824 19022G32KT P6SM", "wind_gust_kt", 32.0),
+        ("METAR CYVR 200400Z VRB02KT 15SM", "wind_direction_deg", None),
+        ("METAR CYUL 011200Z 27015KT 1 1/2SM", "visibility_sm", 1.5),
+        ("METAR CYUL 011200Z 27015KT 1/4SM", "visibility_sm", 0.25),
+        ("METAR CYUL 011200Z 27015KT 1/4SM", "visibility_bound", None),
+        ("TAF CYXX 272340Z 2800/2824 19022G32KT P6SM", "visibility_sm", 6.0),
+        ("TAF CYXX 272340Z 2800/2824 19022G32KT P6SM", "visibility_bound", "above"),
+        ("METAR KJFK 011200Z 27015KT M1/4SM", "visibility_sm", 0.25),
+        ("METAR KJFK 011200Z 27015KT M1/4SM", "visibility_bound", "below"),
+        ("METAR CYUL 011200Z 27015KT 9SM M02/M05", "dewpoint_c", -5.0),
+        ("METAR EGLL 011200Z 27010KT 9999 Q1013", "altimeter_inhg", 29.91),
+        ("METAR CYVR 200400Z 00000KT 15SM CLR", "cloud_layers", ()),
+        ("METAR CYVR 200400Z 00000KT 15SM RMK FEW120", "cloud_layers", None),
+    ],
+)
+def test_decode_encoded_report_groups(encoded_report, field, expected_value):
+    record = metar_decoding.decode_encoded_report(encoded_report)
+    assert getattr(record, field) == expected_value
+
+
+def test_cut_short_reports_are_filled_from_plain_text(
+    known_awws_metar_abbotsford_data,
+):
+    document = dict(known_awws_metar_abbotsford_data[0])
+    document["encodedreport"] = "SPECI CYXX 280514Z 20007KT 5SM RA"
+    record = metar_decoding.decode_awws_document(document)
+    assert record.cloud_layers == (("SCT", 3500), ("BKN", 4700), ("OVC", 6000))
+    assert record.temperature_c == 11.0
+    assert record.altimeter_inhg == 29.91
+
+
+def test_attached_records_match_plain_text_export(known_awws_metar_abbotsford_data):
+    # The TAF (last document) has no plain-text fields to compare with.
+    metar_data = dict(list(known_awws_metar_abbotsford_data.items())[:-1])
+    plain_text_columns = export.awws_documents_to_columns(metar_data)
+    decoded_data = metar_decoding.attach_decoded_records(metar_data)
+    assert all("decoded" in document for document in decoded_data.values())
+    decoded_columns = export.awws_documents_to_columns(decoded_data)
+    for column in export.NUMERIC_COLUMNS:
+        np.testing.assert_array_equal(
+            decoded_columns[column], plain_text_columns[column]
+        )
+
+
+def test_records_round_trip_through_dynamodb_items(known_awws_metar_abbotsford_data):
+    records = metar_decoding.decode_awws_documents(known_awws_metar_abbotsford_data)
+    for record in records.values():
+        # Floats are written as Decimals and read back as Decimals.
+        stored_dict = database._dynamodb_item(record.to_dict())
+        assert MetarRecord.from_dict(stored_dict) == record
+
+
+def test_records_to_array(known_awws_metar_abbotsford_data):
+    records = list(
+        metar_decoding.decode_awws_documents(known_awws_metar_abbotsford_data).values()
+    )
+    records_array = metar_decoding.records_to_array(records)
+    assert records_array.dtype == metar_decoding.METAR_RECORD_DTYPE
+    assert list(records_array["ceiling_ft"]) == [4700, 5400, 3200, 5000, 5000]
+    assert math.isnan(records_array["temperature_c"][-1])
@@ -0,0 +1,144 @@
+import datetime
+import json
+import threading
+import types
+
+import boto3
+import pytest
+
+from src.data import database
+from src.data.observation_cache import ObservationCache, observation_expiry
+
+
+VANCOUVER = "CYVR - VANCOUVER INTL/BC"
+
+
+@pytest.fixture
+def known_awws_metar_van_data():
+    with open("test/known_awws_metar_van_data.json") as f:
+        data = json.load(f)
+    return {int(table_num): table_data for table_num, table_data in data.items()}
+
+
+@pytest.fixture
+def stand_in_db(known_awws_metar_van_data):
+    queries = []
+    stored_documents = [
+        document
+        for document in known_awws_metar_van_data.values()
+        if document.get("datetime")
+    ]
+
+    def query(**request_kwargs):
+        queries.append(request_kwargs)
+        newest_first = sorted(
+            stored_documents, key=lambda document: document["datetime"], reverse=True
+        )
+        return {"Items": newest_first[: request_kwargs["Limit"]]}
+
+    def batch_write_item(RequestItems):
+        return {"UnprocessedItems": {}}
+
+    return types.SimpleNamespace(
+        queries=queries,
+        Table=lambda table_name: types.SimpleNamespace(query=query),
+        meta=types.SimpleNamespace(
+            client=types.SimpleNamespace(batch_write_item=batch_write_item)
+        ),
+    )
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(
+        now=datetime.datetime(2022, 10, 20, 4, 10).timestamp()
+    )
+    monkeypatch.setattr("src.data.observation_cache.time.time", lambda: clock.now)
+    return clock
+
+
+def test_repeated_reads_are_served_from_cache(stand_in_db, clock):
+    with ObservationCache(stand_in_db) as cache:
+        first_read = cache.latest(VANCOUVER)
+        second_read = cache.latest(VANCOUVER)
+        assert first_read == second_read
+        assert first_read[0]["datetime"] == "2022-10-19 21:00 PDT"
+        assert len(stand_in_db.queries) == 1
+        assert stand_in_db.queries[0]["ScanIndexForward"] is False
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+
+def test_entries_expire_after_ttl(stand_in_db, clock):
+    with ObservationCache(stand_in_db, ttl=60) as cache:
+        cache.latest(VANCOUVER)
+        clock.now += 61
+        cache.latest(VANCOUVER)
+    assert len(stand_in_db.queries) == 2
+
+
+def test_entries_expire_at_next_metar_issue():
+    read_at = datetime.datetime(2022, 10, 20, 4, 50, tzinfo=datetime.timezone.utc)
+    expires_at = observation_expiry(
+        read_at.timestamp(), ttl=3600, issue_minute=0, issue_delay=300
+    )
+    assert (
+        expires_at
+        == datetime.datetime(
+            2022, 10, 20, 5, 5, tzinfo=datetime.timezone.utc
+        ).timestamp()
+    )
+
+
+def test_writes_invalidate_written_locations(
+    stand_in_db, clock, known_awws_metar_van_data
+):
+    with ObservationCache(stand_in_db) as cache:
+        cache.latest(VANCOUVER)
+        database.batch_write_data_documents_to_awws_database(
+            stand_in_db, known_awws_metar_van_data
+        )
+        cache.latest(VANCOUVER)
+        assert cache.stats()["invalidations"] == 1
+    assert len(stand_in_db.queries) == 2
+
+
+def test_disk_tier_survives_restart(stand_in_db, clock, tmp_path):
+    disk_path = str(tmp_path / "observation_cache.sqlite3")
+    with ObservationCache(stand_in_db, disk_path=disk_path) as cache:
+        first_read = cache.latest(VANCOUVER, count=2)
+    with ObservationCache(stand_in_db, disk_path=disk_path) as restarted_cache:
+        assert restarted_cache.latest(VANCOUVER, count=2) == first_read
+        assert restarted_cache.stats()["disk-hits"] == 1
+    assert len(stand_in_db.queries) == 1
+
+
+def test_each_thread_queries_through_its_own_resource(monkeypatch, clock):
+    db = boto3.resource(
+        "dynamodb",
+        region_name="us-west-1",
+        aws_access_key_id="stand-in",
+        aws_secret_access_key="stand-in",
+    )
+    query_dbs = []
+
+    def query_awws_documents(db, location, **query_kwargs):
+        query_dbs.append(db)
+        return iter([])
+
+    monkeypatch.setattr(database, "query_awws_documents", query_awws_documents)
+    with ObservationCache(db, ttl=60) as cache:
+        cache.latest(VANCOUVER, count=1)
+        reader = threading.Thread(
+            target=lambda: [
+                cache.latest(VANCOUVER, count=2),
+                cache.latest(VANCOUVER, count=3),
+            ]
+        )
+        reader.start()
+        reader.join()
+    creating_thread_db, reader_db, reader_db_again = query_dbs
+    assert creating_thread_db is db
+    assert reader_db is reader_db_again
+    assert reader_db is not db
+    assert reader_db.meta.client is db.meta.client
@@ -0,0 +1,79 @@
+import datetime
+import os
+
+import pytest
+
+from src.data.page_archive import PageArchive
+from src.orchestration import backfill
+
+
+@pytest.fixture
+def known_awws_metar_van_source():
+    with open("test/known_awws_metar_van_source.html") as f:
+        return f.read()
+
+
+@pytest.fixture
+def page_archive(tmp_path):
+    with PageArchive(str(tmp_path / "archive")) as archive:
+        yield archive
+
+
+def count_objects(archive):
+    return sum(
+        len(filenames)
+        for _, _, filenames in os.walk(os.path.join(archive.root, "objects"))
+    )
+
+
+def test_refetched_page_is_stored_once_and_rebuilt_exactly(
+    page_archive, known_awws_metar_van_source
+):
+    refetched_source = known_awws_metar_van_source.replace("05:03:30", "05:13:30")
+    first_hash = page_archive.store(["vancouver"], known_awws_metar_van_source)
+    second_hash = page_archive.store(["vancouver"], refetched_source)
+
+    assert first_hash == second_hash
+    assert count_objects(page_archive) == 1
+    page_sources = [fetch["page_source"] for fetch in page_archive.iter_pages()]
+    assert page_sources == [known_awws_metar_van_source, refetched_source]
+
+
+def test_changed_page_gets_its_own_object(page_archive, known_awws_metar_van_source):
+    page_archive.store(["vancouver"], known_awws_metar_van_source)
+    page_archive.store(
+        ["vancouver"], known_awws_metar_van_source.replace("A3022", "A3021")
+    )
+    assert count_objects(page_archive) == 2
+
+
+def test_pages_are_indexed_by_station_and_fetch_time(
+    page_archive, known_awws_metar_van_source
+):
+    fetch_times = [
+        datetime.datetime(2022, 10, 20, hour, tzinfo=datetime.timezone.utc)
+        for hour in (4, 5, 6)
+    ]
+    page_archive.store(["vancouver"], known_awws_metar_van_source, fetch_times[0])
+    page_archive.store(
+        ["vancouver", "abbotsford"], known_awws_metar_van_source, fetch_times[1]
+    )
+    page_archive.store(["abbotsford"], known_awws_metar_van_source, fetch_times[2])
+
+    abbotsford_fetches = list(page_archive.iter_pages(location="abbotsford"))
+    assert [fetch["locations"] for fetch in abbotsford_fetches] == [
+        ["vancouver", "abbotsford"],
+        ["abbotsford"],
+    ]
+    windowed_fetches = list(
+        page_archive.iter_pages(start=fetch_times[1], end=fetch_times[2])
+    )
+    assert len(windowed_fetches) == 1
+
+
+def test_backfill_reads_from_page_archive(page_archive, known_awws_metar_van_source):
+    page_archive.store(["vancouver"], known_awws_metar_van_source)
+    archived_pages = list(backfill.iter_archived_pagesources(page_archive.root))
+    assert [page_source for _, page_source in archived_pages] == [
+        known_awws_metar_van_source
+    ]
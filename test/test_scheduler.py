@@ -0,0 +1,155 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from src import config
+from src.orchestration import scheduler
+from src.orchestration.scheduler import IngestionScheduler
+
+
+def run_in_thread(ingestion_scheduler: IngestionScheduler) -> threading.Thread:
+    thread = threading.Thread(
+        target=ingestion_scheduler.run, kwargs={"handle_signals": False}
+    )
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize(
+    "now, expected",
+    [
+        (3600 * 5 + 100, 3600 * 5 + 240),
+        (3600 * 5 + 240, 3600 * 6 + 240),
+        (3600 * 5 + 300, 3600 * 6 + 240),
+    ],
+)
+def test_next_poll_time_aligns_to_offset_past_interval(now, expected):
+    schedule = {"interval": 3600, "offset": 240, "locations": None}
+    assert scheduler.next_poll_time(schedule, now) == expected
+
+
+def test_scheduler_adds_jitter_within_bound():
+    schedule = {"interval": 60, "offset": 0, "locations": None}
+    ingestion_scheduler = IngestionScheduler({"metar": schedule}, jitter=5)
+    poll_times = [ingestion_scheduler._next_poll_time(schedule, 0) for _ in range(50)]
+    assert all(60 <= poll_time <= 65 for poll_time in poll_times)
+    assert len(set(poll_times)) > 1
+
+
+def test_scheduler_polls_each_schedule_with_its_locations():
+    polls = []
+    ingestion_scheduler = IngestionScheduler(
+        {
+            "fast": {"interval": 0.05, "offset": 0, "locations": ["vancouver"]},
+            "slow": {"interval": 3600, "offset": 0, "locations": ["abbotsford"]},
+        },
+        jitter=0,
+        poll=lambda locations, pool: polls.append(locations),
+    )
+    thread = run_in_thread(ingestion_scheduler)
+    time.sleep(0.3)
+    ingestion_scheduler.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert len(polls) >= 2
+    assert all(locations == ["vancouver"] for locations in polls)
+
+
+def test_scheduler_skips_poll_still_running():
+    release = threading.Event()
+    polls = []
+
+    def slow_poll(locations, pool):
+        polls.append(locations)
+        release.wait(5)
+
+    ingestion_scheduler = IngestionScheduler(
+        {"metar": {"interval": 0.05, "offset": 0, "locations": ["vancouver"]}},
+        jitter=0,
+        poll=slow_poll,
+    )
+    thread = run_in_thread(ingestion_scheduler)
+    time.sleep(0.3)
+    ingestion_scheduler.stop()
+    release.set()
+    thread.join(timeout=5)
+    assert len(polls) == 1
+    assert ingestion_scheduler.poll_counts["skipped"] >= 1
+
+
+def test_scheduler_skips_locations_polled_by_other_schedule():
+    release = threading.Event()
+    polls = []
+
+    def slow_poll(locations, pool):
+        polls.append(locations)
+        release.wait(5)
+
+    ingestion_scheduler = IngestionScheduler(
+        {
+            "metar": {
+                "interval": 0.05,
+                "offset": 0,
+                "locations": ["vancouver", "abbotsford"],
+            },
+            "speci-taf": {"interval": 0.05, "offset": 0, "locations": ["vancouver"]},
+        },
+        jitter=0,
+        poll=slow_poll,
+    )
+    thread = run_in_thread(ingestion_scheduler)
+    time.sleep(0.3)
+    ingestion_scheduler.stop()
+    release.set()
+    thread.join(timeout=5)
+    assert polls == [["vancouver", "abbotsford"]] or polls == [
+        ["vancouver"],
+        ["abbotsford"],
+    ]
+
+
+def test_scheduler_survives_failed_poll():
+    def failing_poll(locations, pool):
+        raise RuntimeError("AWWS unavailable")
+
+    ingestion_scheduler = IngestionScheduler(
+        {"metar": {"interval": 0.05, "offset": 0, "locations": ["vancouver"]}},
+        jitter=0,
+        poll=failing_poll,
+    )
+    thread = run_in_thread(ingestion_scheduler)
+    time.sleep(0.3)
+    ingestion_scheduler.stop()
+    thread.join(timeout=5)
+    assert ingestion_scheduler.poll_counts["failed"] >= 2
+
+
+def test_scheduler_stops_on_sigterm_after_running_poll():
+    finished_polls = []
+
+    def poll(locations, pool):
+        time.sleep(0.2)
+        finished_polls.append(locations)
+
+    ingestion_scheduler = IngestionScheduler(
+        {"metar": {"interval": 0.05, "offset": 0, "locations": ["vancouver"]}},
+        jitter=0,
+        poll=poll,
+    )
+    previous_handler = signal.getsignal(signal.SIGTERM)
+    threading.Timer(0.1, os.kill, (os.getpid(), signal.SIGTERM)).start()
+    ingestion_scheduler.run()
+    assert finished_polls == [["vancouver"]]
+    assert signal.getsignal(signal.SIGTERM) is previous_handler
+
+
+def test_default_schedules_poll_separate_locations():
+    default_scheduler = IngestionScheduler()
+    polled_locations = [
+        set(schedule["locations"] or config.station_codes("metar-taf"))
+        for schedule in default_scheduler.schedules.values()
+    ]
+    assert sum(map(len, polled_locations)) == len(set().union(*polled_locations))
@@ -32,6 +32,22 @@ def known_awws_metar_abbotsford_soup(known_awws_metar_abbotsford_source):
     return known_page_soup
 
 
+@pytest.fixture
+def known_awws_metar_batch_source(
+    known_awws_metar_van_source, known_awws_metar_abbotsford_source
+):
+    # Mimic a batched "CYVR CYXX" request by appending the Abbotsford
+    # station section to the Vancouver page.
+    abbotsford_start = known_awws_metar_abbotsford_source.index("<h2")
+    abbotsford_end = known_awws_metar_abbotsford_source.index("</body>")
+    abbotsford_section = known_awws_metar_abbotsford_source[
+        abbotsford_start:abbotsford_end
+    ]
+    return known_awws_metar_van_source.replace(
+        "</body>", abbotsford_section + "</body>"
+    )
+
+
 class TestAWWSScraping:
     @pytest.mark.slow()
     @pytest.mark.online()
@@ -124,6 +140,52 @@ class TestAWWSScraping:
             )
             assert type(report_datetime) is datetime.datetime
 
+    def test_awws_metar_batch_source_splits_to_per_location_dicts(
+        self,
+        known_awws_metar_batch_source,
+        known_awws_metar_van_source,
+        known_awws_metar_abbotsford_source,
+    ):
+        batch_dict = scraping.parse_awws_batch_pagesource(
+            known_awws_metar_batch_source, ["vancouver", "abbotsford"]
+        )
+        van_dict = scraping.parse_awws_pagesource(known_awws_metar_van_source)
+        abbotsford_dict = scraping.parse_awws_pagesource(
+            known_awws_metar_abbotsford_source
+        )
+        assert batch_dict["vancouver"] == van_dict
+        # The batched page carries a single request timestamp.
+        assert batch_dict["abbotsford"].keys() == abbotsford_dict.keys()
+        for table_number, table_data in abbotsford_dict.items():
+            table_data["report_timestamp"] = van_dict[0]["report_timestamp"]
+            assert batch_dict["abbotsford"][table_number] == table_data
+
+    def test_awws_metar_batch_source_drops_unrequested_stations(
+        self, known_awws_metar_batch_source
+    ):
+        batch_dict = scraping.parse_awws_batch_pagesource(
+            known_awws_metar_batch_source, ["abbotsford"]
+        )
+        assert list(batch_dict) == ["abbotsford"]
+        for table_data in batch_dict["abbotsford"].values():
+            assert table_data["location"].startswith("CYXX")
+
+    @pytest.mark.parametrize(
+        "source",
+        [
+            "known_awws_metar_van_source",
+            "known_awws_metar_abbotsford_source",
+            "known_awws_metar_batch_source",
+        ],
+    )
+    def test_awws_streaming_parser_matches_soup_parser(self, request, source):
+        source = request.getfixturevalue(source)
+        streaming_dict = scraping.parse_awws_pagesource(source, parser="streaming")
+        soup_dict = scraping.parse_awws_pagesource(source, parser="soup")
+        assert streaming_dict == soup_dict
+        for table_number, table_data in soup_dict.items():
+            assert list(streaming_dict[table_number]) == list(table_data)
+
 
 def test_known_utc_string_parses_correctly_to_utc():
     awws_utc_datetime_string = "28 OCTOBER 2022 - 0300 UTC"
@@ -143,3 +205,66 @@ def test_known_utc_string_parses_correctly_to_pst():
         )
         == expected_awws_pst_datetime_string
     )
+
+
+@pytest.mark.parametrize(
+    "awws_utc_datetime_string",
+    [
+        "1 JANUARY 2023 - 0000 UTC",
+        "29 FEBRUARY 2024 - 2359 UTC",
+        "12 march 2023 - 1000 UTC",
+        "5 NOVEMBER 2023 - 0930 UTC",
+        "31   DECEMBER 2022  - 1505 UTC",
+    ],
+)
+def test_fast_utc_string_parse_matches_strptime(awws_utc_datetime_string):
+    assert scraping._parse_awws_utc_string(
+        awws_utc_datetime_string
+    ) == datetime.datetime.strptime(awws_utc_datetime_string, "%d %B %Y - %H%M %Z")
+
+
+def test_fast_utc_string_parse_rejects_invalid_dates():
+    with pytest.raises(ValueError):
+        scraping._parse_awws_utc_string("30 FEBRUARY 2023 - 0300 UTC")
+
+
+def test_batch_utc_strings_match_single_conversions():
+    awws_utc_datetime_strings = [
+        "28 OCTOBER 2022 - 0300 UTC",
+        "6 NOVEMBER 2022 - 0930 UTC",
+        "28 OCTOBER 2022 - 0300 UTC",
+    ]
+    assert scraping.format_utc_datetimes(
+        awws_utc_datetime_strings, target_timezone="America/Vancouver"
+    ) == [
+        scraping.format_utc_datetime(
+            awws_utc_datetime_string, target_timezone="America/Vancouver"
+        )
+        for awws_utc_datetime_string in awws_utc_datetime_strings
+    ]
+
+
+def test_custom_format_string_still_parses_with_strptime():
+    assert (
+        scraping.format_utc_datetime("2022/10/28 03:00", format_string="%Y/%m/%d %H:%M")
+        == "2022-10-28 03:00 UTC"
+    )
+
+
+def test_failed_batch_scrapes_are_raised_with_scraped_pages(monkeypatch):
+    def get_awws_metar_pagesource(locations, pool=None):
+        if locations == ["abbotsford"]:
+            raise TimeoutError("AWWS page timed out")
+        return f"<html>{locations}</html>"
+
+    monkeypatch.setattr(
+        scraping, "get_awws_metar_pagesource", get_awws_metar_pagesource
+    )
+    with pytest.raises(scraping.PageSourceScrapeError) as error_info:
+        scraping.scrape_awws_metar_batch_pagesources(
+            ["vancouver", "abbotsford"], batch_size=1, max_workers=2, pool=object()
+        )
+    assert error_info.value.failed_locations == [("abbotsford",)]
+    assert error_info.value.page_sources == {
+        ("vancouver",): "<html>['vancouver']</html>"
+    }
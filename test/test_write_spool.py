@@ -0,0 +1,217 @@
+import contextlib
+import os
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+import src.data.database as database
+from src.data import write_spool
+from src.data.ingestion_index import IngestionIndex
+from src.data.write_spool import WriteSpool
+
+
+def make_documents(location: str, count: int) -> dict:
+    return {
+        document_number: {
+            "report": "metar-taf",
+            "location": location,
+            "datetime": f"2022-10-28 {document_number:02d}:00 UTC",
+        }
+        for document_number in range(count)
+    }
+
+
+class StandInWriter:
+    """Records each writer call instead of writing to DynamoDB."""
+
+    def __init__(self):
+        self.batches = []
+        self.unprocessed_calls = 0
+
+    def __call__(self, db, data_documents):
+        if self.unprocessed_calls:
+            self.unprocessed_calls -= 1
+            return {"written": 0, "unprocessed": len(data_documents)}
+        self.batches.append(list(data_documents.values()))
+        return {"written": len(data_documents), "unprocessed": 0}
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    writer = StandInWriter()
+
+    @contextlib.contextmanager
+    def stand_in_connection(environment=None, **boto_client_kwargs):
+        yield None
+
+    monkeypatch.setattr(
+        database, "get_awws_document_writer", lambda write_mode=None: writer
+    )
+    monkeypatch.setattr(database, "dynamodb_connection", stand_in_connection)
+    return writer
+
+
+@pytest.fixture
+def spool(tmp_path, writer):
+    with WriteSpool(path=str(tmp_path / "spool")) as spool:
+        yield spool
+
+
+def test_flush_writes_spooled_documents_in_bulk(spool, writer):
+    spool.append(make_documents("CYVR", 3), "batch")
+    spool.append(make_documents("CYXX", 2), "batch")
+    assert not writer.batches
+
+    flush_counts = spool.flush()
+    assert flush_counts == {
+        "segments": 1,
+        "documents": 5,
+        "dead-lettered": 0,
+        "pending": 0,
+    }
+    assert writer.batches == [
+        list(make_documents("CYVR", 3).values())
+        + list(make_documents("CYXX", 2).values())
+    ]
+    assert spool.pending_segments() == []
+
+
+def test_flush_keeps_segment_with_unprocessed_documents(spool, writer):
+    spool.append(make_documents("CYVR", 3), "batch")
+    writer.unprocessed_calls = 1
+
+    assert spool.flush()["pending"] == 1
+    assert len(spool.pending_segments()) == 1
+    assert spool.flush() == {
+        "segments": 1,
+        "documents": 3,
+        "dead-lettered": 0,
+        "pending": 0,
+    }
+    assert writer.batches == [list(make_documents("CYVR", 3).values())]
+
+
+def test_flush_keeps_segment_when_writer_fails(spool, monkeypatch):
+    def failing_writer(db, data_documents):
+        raise ConnectionError("DynamoDB unreachable")
+
+    monkeypatch.setattr(
+        database, "get_awws_document_writer", lambda write_mode=None: failing_writer
+    )
+    spool.append(make_documents("CYVR", 3), "batch")
+    with pytest.raises(ConnectionError):
+        spool.flush()
+    assert len(spool.pending_segments()) == 1
+
+
+def test_spool_seals_segments_past_segment_bytes(tmp_path, writer):
+    with WriteSpool(path=str(tmp_path / "spool"), segment_bytes=1) as spool:
+        spool.append(make_documents("CYVR", 1), "batch")
+        spool.append(make_documents("CYXX", 1), "conditional")
+        assert len(spool.pending_segments()) == 2
+        assert spool.flush()["segments"] == 2
+    assert len(writer.batches) == 2
+
+
+def test_spool_recovers_segments_of_dead_process(tmp_path, writer):
+    spool_path = tmp_path / "spool"
+    with WriteSpool(path=str(spool_path)) as spool:
+        spool.append(make_documents("CYVR", 2), "batch")
+        # Leave the segment open, as a crashed process would. Its name
+        # keeps this (live) process's PID, as when a restarted container
+        # process reuses the crashed one's.
+        open_segment_path = spool._segment_path
+        spool._segment.close()
+        spool._segment = None
+        with open(open_segment_path, "a") as f:
+            f.write('{"write-mode": "batch", "documents": [{"torn')
+
+    with WriteSpool(path=str(spool_path)) as recovered_spool:
+        assert len(recovered_spool.pending_segments()) == 1
+        assert recovered_spool.flush()["documents"] == 2
+    assert writer.batches == [list(make_documents("CYVR", 2).values())]
+
+
+def test_spool_leaves_segments_in_use_open(tmp_path, writer):
+    spool_path = tmp_path / "spool"
+    with WriteSpool(path=str(spool_path)) as spool:
+        spool.append(make_documents("CYVR", 2), "batch")
+        with WriteSpool(path=str(spool_path)) as other_spool:
+            assert other_spool.pending_segments() == []
+        assert os.path.exists(spool._segment_path)
+
+
+def test_spool_dead_letters_rejected_segment(tmp_path, writer, monkeypatch):
+    rejected_documents = make_documents("CYVR", 1)
+
+    def rejecting_writer(db, data_documents):
+        if list(data_documents.values()) == list(rejected_documents.values()):
+            raise ClientError(
+                {"Error": {"Code": "ValidationException", "Message": "Rejected"}},
+                "BatchWriteItem",
+            )
+        return writer(db, data_documents)
+
+    monkeypatch.setattr(
+        database, "get_awws_document_writer", lambda write_mode=None: rejecting_writer
+    )
+    index_path = str(tmp_path / "index.sqlite3")
+    with IngestionIndex(index_path) as index:
+        index.mark_documents_written(rejected_documents)
+    with WriteSpool(
+        path=str(tmp_path / "spool"), segment_bytes=1, ingestion_index_path=index_path
+    ) as spool:
+        spool.append(rejected_documents, "batch")
+        spool.append(make_documents("CYXX", 2), "batch")
+        for _ in range(spool.max_attempts - 1):
+            with pytest.raises(ClientError):
+                spool.flush()
+        assert len(spool.pending_segments()) == 2
+        flush_counts = spool.flush()
+        assert flush_counts["dead-lettered"] == 1
+        assert flush_counts["documents"] == 2
+        dead_letter_files = sorted(os.listdir(spool.dead_letter_path))
+    assert len(dead_letter_files) == 2
+    assert dead_letter_files[1].endswith(".jsonl.error")
+    assert writer.batches == [list(make_documents("CYXX", 2).values())]
+    with IngestionIndex(index_path) as index:
+        assert index.filter_new_documents(rejected_documents) == rejected_documents
+
+
+def test_spool_never_dead_letters_unreachable_database(spool, monkeypatch):
+    def failing_writer(db, data_documents):
+        raise ConnectionError("DynamoDB unreachable")
+
+    monkeypatch.setattr(
+        database, "get_awws_document_writer", lambda write_mode=None: failing_writer
+    )
+    spool.append(make_documents("CYVR", 1), "batch")
+    for _ in range(spool.max_attempts + 1):
+        with pytest.raises(ConnectionError):
+            spool.flush()
+    assert len(spool.pending_segments()) == 1
+
+
+def test_background_flusher_drains_spool(spool, writer):
+    spool.flush_interval = 0.05
+    spool.start()
+    spool.append(make_documents("CYVR", 2), "batch")
+    deadline = time.monotonic() + 5
+    while not writer.batches and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert writer.batches == [list(make_documents("CYVR", 2).values())]
+
+
+def test_get_write_spool_is_shared(monkeypatch, tmp_path):
+    monkeypatch.setattr(write_spool, "_spool", None)
+    monkeypatch.setattr(
+        write_spool,
+        "WriteSpool",
+        lambda: WriteSpool(path=str(tmp_path / "spool")),
+    )
+    shared_spool = write_spool.get_write_spool()
+    try:
+        assert write_spool.get_write_spool() is shared_spool
+    finally:
+        shared_spool.close()